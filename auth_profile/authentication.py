@@ -1,29 +1,302 @@
 # import libraries
+import copy
+import time
+import uuid
+import hashlib
+import inspect
+from functools import wraps
+from typing import Optional, Tuple
 from jose import jwt, JWTError
+from ninja.errors import AuthenticationError
 from ninja.security import HttpBearer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.contrib.auth import get_user_model
 # import files
 from pharmace.settings import SECRET_KEY
+from pharmace.metrics import register_cache
+from pharmace.utlize.custom_classes import Error, TTLCache
+from pharmace.utlize.constant import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from pharmace.utlize.utlize import aget_user_profile, get_user_profile, normalize_email
+from .models import RefreshToken
+
+
+User = get_user_model()
+
+# token -> (email, profile, generation, expires, profile version), skips
+# the jwt decode and the user/profile query for tokens seen recently
+auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+register_cache("auth", auth_cache)
+
+GENERATION_PREFIX = "token-generation"
+PROFILE_VERSION_PREFIX = "profile-version"
 
 
 # customizing the HttpBearer class
 class CustomAuth(HttpBearer):
+    """
+    Authenticate the bearer token and resolve the user profile once,
+    `request.auth` is the user email and `request.profile` is
+    the Profile, or an Error if the user has no profile.
+    Expired and revoked access tokens are refused, the revocation
+    check reads the user's token generation from the cache, with the
+    version of the profile the other processes may have changed.
+    """
     def authenticate(self, request, token):
-        try:
-            payload = jwt.decode(
-                token, SECRET_KEY, algorithms=["HS256"]
-            )
-            username = payload.get("username")
-        except JWTError:
+        cached = auth_cache.get(token)
+        claims = token_claims(token, "access") if cached is None else cached_claims(cached)
+        if claims is None:
             return None
-        if username is None:
+
+        generation, version = cached_state(claims[0])
+        if cached is None or cached[4] != version:
+            cached = remember(token, claims, get_user_profile(claims[0]), version)
+        if generation is None:
+            # remember() cached it unless the user has no profile
+            generation = current_generation(claims[0])
+        if not is_current(cached, generation):
             return None
-        return str(username)
+        return attach_profile(request, cached)
 
 
-# generate token for the user
-def create_token(user):
-    payload = {"username": str(user.email)}
-    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-    return {"access": str(token)}
+class AsyncCustomAuth(CustomAuth):
+    """
+    CustomAuth for the async views, the profile is loaded with the async ORM.
+    ninja runs `auth=` callbacks synchronously, use it through @async_auth.
+    """
+    async def authenticate(self, request, token):
+        cached = auth_cache.get(token)
+        claims = token_claims(token, "access") if cached is None else cached_claims(cached)
+        if claims is None:
+            return None
+
+        generation, version = await acached_state(claims[0])
+        if cached is None or cached[4] != version:
+            cached = await aremember(token, claims, await aget_user_profile(claims[0]), version)
+        if generation is None:
+            generation = await acurrent_generation(claims[0])
+        if not is_current(cached, generation):
+            return None
+        return attach_profile(request, cached)
+
+
+def async_auth(view):
+    """
+    authenticate an async view with AsyncCustomAuth, sets `request.auth`
+    and `request.profile` like `auth=CustomAuth()` or answers 401.
+    """
+    auth = AsyncCustomAuth()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # None when the header is missing, else the authenticate coroutine
+        email = auth(request)
+        if inspect.isawaitable(email):
+            email = await email
+        if not email:
+            raise AuthenticationError()
+        request.auth = email
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _decode(token, kind) -> Optional[dict]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"],
+                             options={"require_exp": True})
+    except JWTError:
+        return None
+    # the tokens from before the expiry and generations are refused too
+    if (payload.get("type") != kind or payload.get("username") is None
+            or not isinstance(payload.get("gen"), int)):
+        return None
+    return payload
+
+
+def token_claims(token, kind) -> Optional[Tuple[str, int, int]]:
+    """
+    (email, generation, expires) of a valid, unexpired token of the
+    kind ("access" or "refresh"), None for any other token.
+    """
+    payload = _decode(token, kind)
+    if payload is None:
+        return None
+    return normalize_email(str(payload["username"])), payload["gen"], payload["exp"]
+
+
+def cached_claims(cached) -> Tuple[str, int, int]:
+    email, _, generation, expires, _ = cached
+    return email, generation, expires
+
+
+def remember(token, claims, profile, version):
+    email, generation, expires = claims
+    cached = (email, profile, generation, expires, version)
+    # users without a profile yet are not cached so create_profile sees them
+    if not isinstance(profile, Error):
+        auth_cache.set(token, cached)
+        # the user row came with the profile
+        cache.set(generation_key(email), profile.user.token_generation,
+                  settings.TOKEN_GENERATION_TTL)
+    return cached
+
+
+async def aremember(token, claims, profile, version):
+    email, generation, expires = claims
+    cached = (email, profile, generation, expires, version)
+    if not isinstance(profile, Error):
+        auth_cache.set(token, cached)
+        await cache.aset(generation_key(email), profile.user.token_generation,
+                         settings.TOKEN_GENERATION_TTL)
+    return cached
+
+
+def attach_profile(request, cached):
+    email, profile = cached[:2]
+    # every request gets its own copy of the cached profile
+    request.profile = profile if isinstance(profile, Error) else copy.copy(profile)
+    return email
+
 
+def is_current(cached, generation) -> bool:
+    """
+    whether the token is unexpired and of the user's current generation.
+    """
+    _, _, token_generation, expires, _ = cached
+    return expires > time.time() and token_generation == generation
 
+
+""" Token generations """
+
+
+def generation_key(email: str) -> str:
+    return f"{GENERATION_PREFIX}:{hashlib.md5(email.encode()).hexdigest()}"
+
+
+def current_generation(email: str) -> Optional[int]:
+    """
+    the token generation of the user, from the cache for
+    settings.TOKEN_GENERATION_TTL seconds, None for unknown users.
+    """
+    key = generation_key(email)
+    generation = cache.get(key)
+    if generation is None:
+        generation = (User.objects.filter(email=email)
+                      .values_list("token_generation", flat=True).first())
+        if generation is not None:
+            cache.set(key, generation, settings.TOKEN_GENERATION_TTL)
+    return generation
+
+
+def profile_version_key(email: str) -> str:
+    return f"{PROFILE_VERSION_PREFIX}:{hashlib.md5(email.encode()).hexdigest()}"
+
+
+def _version() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def cached_state(email: str) -> Tuple[Optional[int], str]:
+    """
+    the token generation of the user if cached, None if not, and the
+    version of their profile, replaced by invalidate_profile(), in one
+    cache read. A missing (evicted) version is replaced by a new one, the
+    profiles remembered under the old one are loaded again.
+    """
+    generation_at, version_at = generation_key(email), profile_version_key(email)
+    found = cache.get_many([generation_at, version_at])
+    version = found.get(version_at)
+    if version is None:
+        version = _version()
+        # another process may have set it first
+        if not cache.add(version_at, version, None):
+            version = cache.get(version_at, version)
+    return found.get(generation_at), version
+
+
+async def acached_state(email: str) -> Tuple[Optional[int], str]:
+    generation_at, version_at = generation_key(email), profile_version_key(email)
+    found = await cache.aget_many([generation_at, version_at])
+    version = found.get(version_at)
+    if version is None:
+        version = _version()
+        if not await cache.aadd(version_at, version, None):
+            version = await cache.aget(version_at, version)
+    return found.get(generation_at), version
+
+
+async def acurrent_generation(email: str) -> Optional[int]:
+    key = generation_key(email)
+    generation = await cache.aget(key)
+    if generation is None:
+        generation = await (User.objects.filter(email=email)
+                            .values_list("token_generation", flat=True).afirst())
+        if generation is not None:
+            await cache.aset(key, generation, settings.TOKEN_GENERATION_TTL)
+    return generation
+
+
+def revoke_tokens(email: str):
+    """
+    end every session of the user: the access and refresh tokens issued so
+    far stop working, at once where the cache is shared (Redis, CACHE_DIR),
+    within settings.TOKEN_GENERATION_TTL seconds in processes with their own.
+    """
+    email = normalize_email(email)
+    User.objects.filter(email=email).update(token_generation=F("token_generation") + 1)
+    RefreshToken.objects.filter(user_id=email).delete()
+    cache.delete(generation_key(email))
+    invalidate_profile(email)
+
+
+def refresh_user(token):
+    """
+    the user of a valid refresh token of their current generation, or None.
+    Each refresh token works once: it is used up here, a copy replayed
+    after the owner refreshed is refused.
+    """
+    payload = _decode(token, "refresh")
+    if payload is None or not isinstance(payload.get("jti"), str):
+        return None
+    email = normalize_email(str(payload["username"]))
+    # the database decides, refreshing is not on the hot path; of two
+    # requests with the same token only one deletes the row
+    used, _ = RefreshToken.objects.filter(jti=payload["jti"], user_id=email).delete()
+    if not used:
+        return None
+    # with the user's expired ones, never refreshed
+    RefreshToken.objects.filter(user_id=email, expires__lte=int(time.time())).delete()
+    return User.objects.filter(email=email, token_generation=payload["gen"]).first()
+
+
+def invalidate_profile(email):
+    """
+    drop the cached profile of the user, called when the profile changes.
+    The other processes load it again on their next request of the user,
+    they find a new profile version in the shared cache.
+    """
+    email = normalize_email(email)
+    cache.set(profile_version_key(email), _version(), None)
+    return auth_cache.discard(lambda token, cached: cached[0] == email)
+
+
+def _encode(user, kind, lifetime, now, **claims):
+    payload = {"username": str(user.email), "type": kind, "gen": user.token_generation,
+               "iat": now, "exp": now + lifetime, **claims}
+    return str(jwt.encode(payload, SECRET_KEY, algorithm="HS256"))
+
+
+# generate the tokens for the user
+def create_token(user):
+    """
+    a short-lived access token and a refresh token to get the next ones
+    once, both end with the user's token generation, see revoke_tokens.
+    """
+    now = int(time.time())
+    refresh = RefreshToken.objects.create(jti=uuid.uuid4().hex, user_id=user.email,
+                                          expires=now + settings.REFRESH_TOKEN_LIFETIME)
+    return {"access": _encode(user, "access", settings.ACCESS_TOKEN_LIFETIME, now),
+            "refresh": _encode(user, "refresh", settings.REFRESH_TOKEN_LIFETIME, now,
+                               jti=refresh.jti)}
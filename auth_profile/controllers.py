@@ -1,17 +1,22 @@
-import os
 from uuid import uuid4
 from typing import List
 from rest_framework import status
 from ninja import Body, File, Router, UploadedFile
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from phonenumber_field.validators import validate_international_phonenumber
 # local models
 from .models import Profile
 from core.models import Cart
+from auth_profile import profile_images
+from pharmace.utlize import uploads
+from pharmace.utlize.ratelimit import rate_limit
 from pharmace.utlize.custom_classes import Error
-from auth_profile.authentication import CustomAuth, create_token
-from pharmace.utlize.utlize import get_user_profile, password_validator, normalize_email
-from .schemas import AuthOut, MessageOut, ProfileIn, ProfileOut, SigninIn, SigninUpIn, SigninUpOut
+from auth_profile.authentication import (CustomAuth, create_token, invalidate_profile, refresh_user,
+                                         revoke_tokens)
+from pharmace.utlize.utlize import password_validator, normalize_email
+from .schemas import (AuthOut, MessageOut, ProfileIn, ProfileOut, RefreshIn, SigninIn, SigninUpIn,
+                      SigninUpOut, TokenOut)
 
 
 # Create your views here.
@@ -21,15 +26,27 @@ auth_controller = Router()
 profile_controller = Router()
 
 
+def image_error(request, img):
+    if uploads.rejected(request, "img"):
+        return f"img is larger than {uploads.max_size_mb()} MB."
+    return profile_images.check(img) if img else None
+
+
 """ Authentication End-points """
 
 
+def signin_account(request, acount_in, **kwargs):
+    return normalize_email(acount_in.email)
+
+
 @auth_controller.post("signup", 
                       response={
                         201: SigninUpOut,
                         400: MessageOut,
+                        429: MessageOut,
                       }
 )
+@rate_limit("auth")
 def signup(request, acount_in: SigninUpIn):
     """
     passwor must contain at least:
@@ -46,18 +63,21 @@ def signup(request, acount_in: SigninUpIn):
         return status.HTTP_400_BAD_REQUEST, MessageOut(detail="passwords do not match")
     # normalize the data
     email = normalize_email(acount_in.email)
-    # check if email is already in use
-    if User.objects.filter(email=acount_in.email).exists():
+    # check if email is already in use, before paying for the hash
+    if User.objects.filter(email=email).exists():
         return status.HTTP_400_BAD_REQUEST, MessageOut(detail="Email is already in use")
-    # create user
-    user = User.objects.create_user(
-        # name=name,
-        email=email,
-        password=acount_in.password1
-    )
-    # create empty profile with just name and user
-    profile = Profile.objects.create(user=user, 
-                           name=acount_in.name)
+    with transaction.atomic():
+        # create user
+        user = User.objects.create_user(
+            # name=name,
+            email=email,
+            password=acount_in.password1
+        )
+        # create empty profile with just name and user
+        profile = Profile.objects.create(user=user, 
+                               name=acount_in.name)
+        # create empty Cart for the user
+        Cart.objects.create(user=profile)
     # create token for the user
     token = create_token(user)
 
@@ -71,18 +91,21 @@ def signup(request, acount_in: SigninUpIn):
                             200: AuthOut,
                             404: MessageOut,
                             400: MessageOut,
+                            429: MessageOut,
                       }
 )
+@rate_limit("auth")
+@rate_limit("signin-account", key=signin_account)
 def signin(request, acount_in: SigninIn):
     # normalize email
     email = normalize_email(acount_in.email)
     # check if email exists
-    is_user = User.objects.filter(email=email).exists()
-    if not is_user:
+    user = User.objects.filter(email=email).first()
+    if user is None:
         return status.HTTP_404_NOT_FOUND, MessageOut(detail="User is not registered Or Email is wrong")
 
-    # check if password is correct
-    user = User.objects.get(email=email)
+    # check if password is correct, re-hashed with the
+    # preferred hasher (settings.PASSWORD_HASHERS) if it is outdated
     if user.check_password(acount_in.password):
         # create token for user
         token = create_token(user)
@@ -92,6 +115,38 @@ def signin(request, acount_in: SigninIn):
 
 
 
+@auth_controller.post("refresh",
+                      response={
+                            200: TokenOut,
+                            401: MessageOut,
+                            429: MessageOut,
+                      }
+)
+@rate_limit("auth")
+def refresh(request, token_in: RefreshIn):
+    """
+    a new access token, and refresh token, for a refresh token,
+    access tokens expire after settings.ACCESS_TOKEN_LIFETIME seconds.
+    """
+    user = refresh_user(token_in.refresh)
+    if user is None:
+        return status.HTTP_401_UNAUTHORIZED, MessageOut(detail="Invalid or expired refresh token")
+
+    return status.HTTP_200_OK, create_token(user)
+
+
+@auth_controller.post("signout",
+                      response={200: MessageOut},
+                      auth=CustomAuth(),
+)
+def signout(request):
+    """
+    sign out of every device, every access and refresh token of the user stops working.
+    """
+    revoke_tokens(request.auth)
+    return status.HTTP_200_OK, MessageOut(detail="Signed out")
+
+
 """ Profile End-points """
 
 
@@ -110,11 +165,8 @@ def all_profile(request):
                         auth=CustomAuth(),
 )
 def get_profile(request):
-    # get email from auth request
-    email = normalize_email(request.auth)
-
-    # check if user and profile exists
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
@@ -148,25 +200,29 @@ def create_profile(request, profile_in: ProfileIn, img: UploadedFile=None):
     except:
         return status.HTTP_400_BAD_REQUEST, MessageOut(detail="phone number is not valid.")
 
+    # validate the picture, it is re-encoded in the background
+    error = image_error(request, img)
+    if error:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=error)
+
     # create the profile
     profile = Profile.objects.create(
         user=user,
         name=profile_in.name,
         city=profile_in.city,
         province=profile_in.province,
+        latitude=profile_in.latitude,
+        longitude=profile_in.longitude,
         phone=profile_in.phone_number,
+        img_upload=uuid4() if img else None,
     )
-
-    # Save profile picture
     if img:
-        profile.img.save(f'profile-{profile.id}-{uuid4()}.jpg', img)
-    else: profile.img=img
-
-    # save all changes
-    profile.save()
+        profile_images.schedule(profile, img)
 
     # create empty Cart for the user
     Cart.objects.create(user=profile)
+    # drop any cached lookup of the user, it had no profile
+    invalidate_profile(email)
 
     # create response
     project_dict = profile.__dict__
@@ -189,11 +245,8 @@ def create_profile(request, profile_in: ProfileIn, img: UploadedFile=None):
                          auth=CustomAuth(),
 )
 def edit_profile(request, profile_in: ProfileIn=Body(...), img: UploadedFile=File(None)):
-    # get email from auth request
-    email = normalize_email(request.auth)
-
-    # Check if user profile exists
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
@@ -207,18 +260,25 @@ def edit_profile(request, profile_in: ProfileIn=Body(...), img: UploadedFile=Fil
     profile.name = profile_in.name
     profile.city=profile_in.city
     profile.province=profile_in.province
+    profile.latitude=profile_in.latitude
+    profile.longitude=profile_in.longitude
     profile.phone=profile_in.phone_number
 
-    # Save new profile picture if provided
+    # validate the new picture, it is re-encoded and swapped in the background
+    error = image_error(request, img)
+    if error:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=error)
+    fields = ["name", "city", "province", "latitude", "longitude", "phone"]
+    if img:
+        profile.img_upload = uuid4()
+        fields.append("img_upload")
+
+    # only the edited fields, a background task may be swapping the picture
+    profile.save(update_fields=fields)
     if img:
-        # remove old img
-        if profile.img:
-            os.remove(profile.img.path)
-        # profile.img = img
-        profile.img.save(f'profile-{profile.id}-{uuid4()}.jpg', img)
-
-    # save all changes
-    profile.save()
+        profile_images.schedule(profile, img)
+    # cached copies of the profile are stale now
+    invalidate_profile(request.auth)
 
     return status.HTTP_200_OK, profile
 
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, UserManager
 from phonenumber_field.modelfields import PhoneNumberField
+# local
+from pharmace.utlize.geo import Located
 
 
 # Overriding the default UserManager for the user model
@@ -36,6 +38,8 @@ class CustomUser(AbstractUser, models.Model):
     username = models.NOT_PROVIDED # remove username field
     email = models.EmailField(max_length=255, unique=True, 
                               primary_key=True)
+    # part of every token, bumped to revoke them all, see authentication.revoke_tokens
+    token_generation = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -52,7 +56,18 @@ class CustomUser(AbstractUser, models.Model):
         app_label = 'auth_profile'
 
 
-class Profile(models.Model):
+class RefreshToken(models.Model):
+    # the refresh tokens not used yet, each one works once, see authentication.refresh_user
+    jti = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                             related_name='refresh_tokens')
+    expires = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'expires'])]
+
+
+class Profile(Located):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, 
                                 related_name='profile_user',
                                 null=False, blank=False)
@@ -60,6 +75,8 @@ class Profile(models.Model):
     name = models.CharField(max_length=100)
     img = models.ImageField(upload_to='profile_imgs', 
                             null=True, blank=True)
+    # the uploaded picture waiting for its background processing, see profile_images.py
+    img_upload = models.UUIDField(null=True, blank=True, editable=False)
     # for address
     city = models.CharField(max_length=85)
     province = models.CharField(max_length=85)
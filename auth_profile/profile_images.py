@@ -0,0 +1,111 @@
+"""
+Background processing of the uploaded profile pictures.
+
+create_profile and edit_profile only check the image header, stage the upload
+(pharmace.utlize.uploads) and record its token in Profile.img_upload. A
+background task decodes it, re-encodes it as a JPEG of at most
+settings.PROFILE_IMAGE_SIZE px without its metadata, and swaps it in, in one
+transaction, if the token is still the profile's latest upload. The replaced
+picture is deleted once committed, `manage.py sweep_media` removes what a
+crash left behind.
+"""
+import os
+import uuid
+import logging
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.db import transaction
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+# local models
+from .models import Profile
+from pharmace.utlize import tasks, uploads
+from auth_profile.authentication import invalidate_profile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TO = "profile_imgs"
+JPEG_OPTIONS = {"quality": 85, "optimize": True, "progressive": True}
+
+
+def check(upload) -> Optional[str]:
+    """
+    the reason the upload can't be a profile picture, None if it looks fine.
+    only the header is read, the pixels are decoded in the background.
+    """
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return "img is not a valid image."
+    finally:
+        upload.seek(0)
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        return "img has too many pixels."
+    return None
+
+
+def encode(path: str) -> bytes:
+    edge = settings.PROFILE_IMAGE_SIZE
+    with Image.open(path) as image:
+        # JPEGs are decoded at a reduced scale still larger than the target
+        image.draft("RGB", (edge, edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            # flatten the transparency on white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        buffer = BytesIO()
+        # no exif=, the re-encoded file drops the metadata (GPS included)
+        image.save(buffer, "JPEG", **JPEG_OPTIONS)
+    return buffer.getvalue()
+
+
+def discard(name: Optional[str]):
+    # only our own uploads, the seeded profiles share their picture
+    if name and name.startswith(f"{UPLOAD_TO}/"):
+        default_storage.delete(name)
+
+
+def process(profile_id: int, token: uuid.UUID, path: str):
+    try:
+        try:
+            data = encode(path)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning("profile %s: dropping the uploaded image: %s", profile_id, e)
+            Profile.objects.filter(id=profile_id, img_upload=token).update(img_upload=None)
+            return
+
+        name = default_storage.save(f"{UPLOAD_TO}/profile-{profile_id}-{uuid.uuid4()}.jpg",
+                                    ContentFile(data))
+        with transaction.atomic():
+            profile = (Profile.objects.select_for_update()
+                       .filter(id=profile_id, img_upload=token).first())
+            if profile is None:
+                # deleted meanwhile, or a newer upload replaced this one
+                default_storage.delete(name)
+                return
+            replaced = profile.img.name
+            profile.img = name
+            profile.img_upload = None
+            profile.save(update_fields=["img", "img_upload"])
+            transaction.on_commit(lambda: discard(replaced))
+        invalidate_profile(profile.user_id)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def schedule(profile: Profile, upload):
+    """
+    stage the upload now, process it in the background once the
+    profile row holding its token is committed.
+    """
+    path = uploads.stage(upload)
+    profile_id, token = profile.id, profile.img_upload
+    transaction.on_commit(lambda: tasks.submit(process, profile_id, token, path))
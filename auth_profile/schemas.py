@@ -1,6 +1,8 @@
 from ninja import Schema
 from typing import Optional
 from pydantic import EmailStr, Field
+# local
+from pharmace.utlize import images
 
 
 # General Schemas
@@ -17,6 +19,11 @@ class UserIn(Schema):
 
 class TokenOut(Schema):
     access: str
+    refresh: str
+
+
+class RefreshIn(Schema):
+    refresh: str
 
 
 class UserOut(Schema):
@@ -50,12 +57,21 @@ class ProfileSchema(Schema):
 class ProfileIn(ProfileSchema):
     city: str = None
     province: str = None
+    # home location, used to find nearby pharmacies
+    latitude: float = Field(None, ge=-90, le=90)
+    longitude: float = Field(None, ge=-180, le=180)
 
 
 class ProfileOut(ProfileIn):
     img: Optional[str] = None
+    renditions: Optional[dict] = None
     email: EmailStr
 
+    @staticmethod
+    def resolve_renditions(self):
+        # create_profile builds it from a dict
+        return images.renditions(self["img"] if isinstance(self, dict) else self.img)
+
 
 class ProfileSchemaUpdate(ProfileIn):
     pass
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import time
+import importlib.util
+from unittest import mock, skipUnless
+from jose import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+# local models
+from auth_profile.models import Profile
+from auth_profile.authentication import CustomAuth, auth_cache, create_token, profile_version_key
 
-# Create your tests here.
+User = get_user_model()
+
+
+class HasherTests(SimpleTestCase):
+    @skipUnless(importlib.util.find_spec("argon2"), "argon2-cffi is not installed")
+    def test_new_hashes_use_the_tuned_argon2(self):
+        encoded = make_password("String1@")
+        self.assertEqual(encoded.split("$")[:4], [
+            "argon2", "argon2id", "v=19",
+            f"m={settings.ARGON2_MEMORY_COST},t={settings.ARGON2_TIME_COST},"
+            f"p={settings.ARGON2_PARALLELISM}"])
+        self.assertFalse(identify_hasher(encoded).must_update(encoded))
+
+    @override_settings(PASSWORD_HASHERS=["pharmace.hashers.TunedPBKDF2PasswordHasher"])
+    def test_pbkdf2_fallback_uses_the_tuned_rounds(self):
+        encoded = make_password("String1@")
+        self.assertEqual(encoded.split("$")[:2],
+                         ["pbkdf2_sha256", str(settings.PBKDF2_ITERATIONS)])
+        hasher = identify_hasher(encoded)
+        self.assertFalse(hasher.must_update(encoded))
+        # a hash with other rounds is re-hashed on the next sign in
+        self.assertTrue(hasher.must_update(hasher.encode("String1@", hasher.salt(), iterations=1000)))
+
+
+@override_settings(RATE_LIMITS={"auth": (60, 100), "signin-account": (60, 100)})
+class AuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # an outdated hash, from a hasher that is not the preferred one
+        User.objects.create(email="auth@example.com",
+                            password=make_password("String1@", hasher="pbkdf2_sha1"))
+
+    def signin(self, password="String1@", email="auth@example.com", ip="10.0.0.1"):
+        return self.client.post("/api/auth/signin", {"email": email, "password": password},
+                                content_type="application/json", REMOTE_ADDR=ip)
+
+    def test_signin_rehashes_an_outdated_hash(self):
+        self.assertEqual(self.signin().status_code, 200)
+        algorithm = User.objects.get(email="auth@example.com").password.split("$")[0]
+        self.assertEqual(algorithm, get_hasher().algorithm)
+
+        # the user and the new refresh token, the hash is up to date now
+        with self.assertNumQueries(2):
+            self.assertEqual(self.signin().status_code, 200)
+        self.assertEqual(self.signin("Wrong1234").status_code, 400)
+        self.assertEqual(self.signin(email="nobody@example.com").status_code, 404)
+
+    @override_settings(RATE_LIMITS={"auth": (6, 3), "signin-account": (60, 100)})
+    def test_bursts_are_shed_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.signin("Wrong1234").status_code, 400)
+
+        with mock.patch.object(User, "check_password") as check_password, \
+                self.assertNumQueries(0):
+            response = self.signin()
+        self.assertEqual(response.status_code, 429)
+        # a token every 10 seconds
+        self.assertIn(int(response["Retry-After"]), range(1, 11))
+        check_password.assert_not_called()
+
+        # other clients have their own bucket, and the bucket refills
+        self.assertEqual(self.signin(ip="10.0.0.2").status_code, 200)
+        later = time.time() + 10
+        with mock.patch("pharmace.utlize.ratelimit.time.time", return_value=later):
+            self.assertEqual(self.signin().status_code, 200)
+
+    @override_settings(RATE_LIMITS={"auth": (60, 100), "signin-account": (60, 2)})
+    def test_account_is_limited_from_every_address(self):
+        for ip in ("10.0.0.1", "10.0.0.2"):
+            self.assertEqual(self.signin("Wrong1234", ip=ip).status_code, 400)
+        self.assertEqual(self.signin(ip="10.0.0.3").status_code, 429)
+
+
+class TokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+        self.user = User.objects.create(email="token@example.com", password="!")
+        Profile.objects.create(user=self.user, name="token", city="Baghdad", province="Mansour")
+        self.tokens = create_token(self.user)
+
+    def get_profile(self, access):
+        return self.client.get("/api/profile/get_profile", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def refresh(self, refresh):
+        return self.client.post("/api/auth/refresh", {"refresh": refresh},
+                                content_type="application/json")
+
+    def test_hot_path_skips_the_database(self):
+        request = mock.Mock()
+        self.assertEqual(CustomAuth().authenticate(request, self.tokens["access"]), self.user.email)
+        with self.assertNumQueries(0):
+            self.assertEqual(CustomAuth().authenticate(request, self.tokens["access"]),
+                             self.user.email)
+
+    def test_profile_changes_reach_every_process(self):
+        self.assertEqual(self.get_profile(self.tokens["access"]).json()["name"], "token")
+
+        # another process saves the profile, it can't reach this one's auth_cache
+        Profile.objects.filter(user=self.user).update(name="edited")
+        cache.set(profile_version_key(self.user.email), "elsewhere", None)
+        self.assertEqual(self.get_profile(self.tokens["access"]).json()["name"], "edited")
+
+    def test_access_tokens_expire_and_refresh(self):
+        self.assertEqual(self.get_profile(self.tokens["access"]).status_code, 200)
+        later = time.time() + settings.ACCESS_TOKEN_LIFETIME + 1
+        with mock.patch("auth_profile.authentication.time.time", return_value=later):
+            # the cached token expires too
+            self.assertEqual(self.get_profile(self.tokens["access"]).status_code, 401)
+
+        response = self.refresh(self.tokens["refresh"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile(response.json()["access"]).status_code, 200)
+
+        # the kinds don't mix, and tokens without expiry are refused
+        self.assertEqual(self.refresh(self.tokens["access"]).status_code, 401)
+        self.assertEqual(self.get_profile(self.tokens["refresh"]).status_code, 401)
+        old = jwt.encode({"username": self.user.email}, settings.SECRET_KEY, algorithm="HS256")
+        self.assertEqual(self.get_profile(old).status_code, 401)
+
+    def test_refresh_tokens_work_once(self):
+        response = self.refresh(self.tokens["refresh"])
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()["refresh"]
+        self.assertNotEqual(rotated, self.tokens["refresh"])
+
+        # a replayed refresh token is refused, the new one works once
+        self.assertEqual(self.refresh(self.tokens["refresh"]).status_code, 401)
+        self.assertEqual(self.refresh(rotated).status_code, 200)
+        self.assertEqual(self.refresh(rotated).status_code, 401)
+
+    def test_signout_revokes_every_token(self):
+        other = create_token(self.user)
+        self.assertEqual(self.get_profile(other["access"]).status_code, 200)
+
+        response = self.client.post("/api/auth/signout",
+                                    HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile(other["access"]).status_code, 401)
+        self.assertEqual(self.refresh(other["refresh"]).status_code, 401)
+
+        # signing in again starts a new generation
+        self.user.refresh_from_db()
+        self.assertEqual(self.get_profile(create_token(self.user)["access"]).status_code, 200)
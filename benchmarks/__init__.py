@@ -0,0 +1,9 @@
+"""
+Benchmarks of the public API hot paths.
+
+    python -m benchmarks --scales small medium --output report.json
+
+seeds a fresh test database per scale, drives the end-points through the
+Django test client and records latency percentiles and query counts,
+the run fails if a result is over its budget in benchmarks/budgets.json.
+"""
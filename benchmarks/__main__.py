@@ -0,0 +1,12 @@
+import os
+import sys
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmace.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.runner import main  # noqa: E402
+
+sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Throughput of the sync (WSGI) against the async (ASGI) read end-points.
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.loadtest --serve --concurrency 50 200 500
+
+starts `gunicorn pharmace.wsgi` and `uvicorn pharmace.asgi` on the database of
+the settings (seed it first with `manage.py seed`), drives the sync routes on
+the WSGI server and their /api/async/ variants on the ASGI server with
+`--concurrency` keep-alive connections for `--duration` seconds each, and prints
+requests/s and latency percentiles. Point it at servers you started yourself
+with --wsgi / --asgi.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+
+@dataclass
+class Target:
+    name: str
+    url: str
+    # prefix of the routes it is driven on
+    prefix: str
+
+
+@dataclass
+class Route:
+    name: str
+    path: Callable[[random.Random, dict], str]
+    auth: bool = False
+
+
+ROUTES = [
+    Route("get_all", lambda rng, data: f"pharmacy/get_all/{rng.randint(1, data['pages'])}"),
+    Route("get_by_id", lambda rng, data: f"pharmacy/get_by_id/{rng.choice(data['pharmacies'])}"),
+    Route("get_druge", lambda rng, data: f"pharmacy/get_druge/{rng.choice(data['pharmacies'])}/1"),
+    Route("get_reviews", lambda rng, data: f"pharmacy/get_reviews/{rng.choice(data['pharmacies'])}"),
+    Route("get_cart", lambda rng, data: "cart/get_cart", auth=True),
+]
+
+
+class Connection:
+    """
+    a minimal HTTP/1.1 keep-alive client, the load generator
+    must not be the bottleneck so it skips any HTTP library.
+    """
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.reader = self.writer = None
+
+    async def get(self, path: str, headers: dict) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 *(f"{key}: {value}" for key, value in headers.items()), "", ""]
+        self.writer.write("\r\n".join(lines).encode())
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = (await self.reader.readline()).decode().strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            response_headers[key.lower()] = value.strip().lower()
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    # nearest-rank percentile
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[index] if ordered else 0.0
+
+
+async def drive(target: Target, route: Route, data: dict, concurrency: int,
+                duration: float, seed: int) -> dict:
+    timings, errors = [], 0
+    headers = {"Authorization": f"Bearer {data['token']}"} if route.auth else {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int):
+        nonlocal errors
+        rng = random.Random(seed + index)
+        connection = Connection(target.url)
+        try:
+            while time.perf_counter() < deadline:
+                path = f"{target.prefix}{route.path(rng, data)}"
+                start = time.perf_counter()
+                try:
+                    status = await connection.get(path, headers)
+                except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                    errors += 1
+                    await connection.close()
+                    continue
+                timings.append((time.perf_counter() - start) * 1000)
+                if status >= 400:
+                    errors += 1
+        finally:
+            await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "errors": errors,
+        "rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+    }
+
+
+def load_data() -> dict:
+    """
+    pharmacy ids and a token of a user with a profile, from the servers' database.
+    """
+    import django
+    django.setup()
+    from core.models import Pharmacy
+    from auth_profile.models import Profile
+    from auth_profile.authentication import create_token
+    from pharmace.utlize.constant import PHARMACY_PER_PAGE
+
+    pharmacies = list(Pharmacy.objects.values_list("id", flat=True))
+    profile = Profile.objects.select_related("user").order_by("id").first()
+    if not pharmacies or profile is None:
+        raise SystemExit("the database is empty, run `python manage.py seed` first")
+    return {
+        "pharmacies": pharmacies,
+        "pages": max(len(pharmacies) // PHARMACY_PER_PAGE, 1),
+        "token": create_token(profile.user)["access"],
+    }
+
+
+def serve(args) -> List[subprocess.Popen]:
+    env = dict(os.environ)
+    if not args.cache:
+        # measure the views, not the response cache
+        env["RESPONSE_CACHE_TIMEOUT"] = "0"
+    commands = [
+        ["gunicorn", "pharmace.wsgi:application", "--bind", f"127.0.0.1:{args.wsgi_port}",
+         "--workers", str(args.workers), "--threads", str(args.threads)],
+        ["uvicorn", "pharmace.asgi:application", "--port", str(args.asgi_port),
+         "--workers", str(args.workers), "--no-access-log"],
+    ]
+    try:
+        servers = [subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL) for command in commands]
+    except FileNotFoundError as e:
+        raise SystemExit(f"{e.filename} is not installed: pip install gunicorn uvicorn")
+
+    for port in (args.wsgi_port, args.asgi_port):
+        for _ in range(100):
+            try:
+                urlopen(f"http://127.0.0.1:{port}/api/pharmacy/get_all/1", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            stop(servers)
+            raise SystemExit(f"no server answered on port {port}")
+    return servers
+
+
+def stop(servers: List[subprocess.Popen]):
+    for server in servers:
+        server.terminate()
+    for server in servers:
+        server.wait()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest",
+                                     description="Compare WSGI and ASGI throughput")
+    parser.add_argument("--serve", action="store_true",
+                        help="start gunicorn and uvicorn instead of using --wsgi/--asgi")
+    parser.add_argument("--wsgi", default=None, help="URL of a running WSGI server")
+    parser.add_argument("--asgi", default=None, help="URL of a running ASGI server")
+    parser.add_argument("--wsgi-port", type=int, default=8100)
+    parser.add_argument("--asgi-port", type=int, default=8101)
+    parser.add_argument("--workers", type=int, default=1, help="server processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--routes", nargs="+", choices=[route.name for route in ROUTES],
+                        default=[route.name for route in ROUTES])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    servers: Optional[List[subprocess.Popen]] = None
+    if args.serve:
+        servers = serve(args)
+        args.wsgi = f"http://127.0.0.1:{args.wsgi_port}"
+        args.asgi = f"http://127.0.0.1:{args.asgi_port}"
+    targets = [target for target in (Target("wsgi", args.wsgi, "/api/"),
+                                     Target("asgi", args.asgi, "/api/async/"))
+               if target.url]
+    if not targets:
+        parser.error("pass --serve, or --wsgi and/or --asgi")
+
+    data = load_data()
+    report = {}
+    try:
+        for route in (route for route in ROUTES if route.name in args.routes):
+            for concurrency in args.concurrency:
+                for target in targets:
+                    result = asyncio.run(drive(target, route, data, concurrency,
+                                               args.duration, args.seed))
+                    report.setdefault(route.name, {}).setdefault(target.name, []).append(result)
+                    print(f"{route.name:<12} {target.name} c={concurrency:<4} "
+                          f"{result['rps']:>8} req/s  p50 {result['p50_ms']} ms  "
+                          f"p99 {result['p99_ms']} ms  errors {result['errors']}")
+    finally:
+        if servers:
+            stop(servers)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmace.settings")
+    sys.exit(main())
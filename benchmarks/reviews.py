@@ -0,0 +1,135 @@
+"""
+Throughput of the review listing at 1k and 100k reviews on one pharmacy.
+
+    python -m benchmarks.reviews --reviews 1000 100000 --output reviews.json
+
+seeds a fresh test database per size and times a page of reviews three ways:
+`lazy` (ReviewOut per row, the profile loaded per review, the old get_reviews),
+`joined` (the same with select_related) and `lean` (core.reviews: one projected
+query, no pydantic model per row), at the first, middle and last page, and the
+whole get_reviews request through the test client without the response cache.
+"""
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict
+
+import django
+from django.db import connection
+from django.core.cache import cache
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.contrib.auth.hashers import make_password
+
+
+def seed(size: int) -> int:
+    from django.contrib.auth import get_user_model
+    from core.models import Pharmacy, Review
+    from auth_profile.models import Profile
+
+    # a review per user and pharmacy, so one reviewer per review
+    password = make_password("String1@")
+    pharmacy = Pharmacy.objects.create(name="reviewed", description="pharmacy",
+                                       location="Mansour", img="seed_img/pharmacy_img.jpg")
+    for start in range(0, size, 5000):
+        batch = range(start, min(start + 5000, size))
+        users = get_user_model().objects.bulk_create(
+            [get_user_model()(email=f"reviewer{i}@bench.local", password=password) for i in batch])
+        profiles = Profile.objects.bulk_create(
+            [Profile(user=user, name=f"reviewer {i}", city="Baghdad", province="Mansour",
+                     img="seed_img/profile.png") for i, user in zip(batch, users)])
+        Review.objects.bulk_create(
+            [Review(user=profile, pharmacy=pharmacy, rating=(i % 50) / 10, description="good")
+             for i, profile in zip(batch, profiles)])
+    return pharmacy.id
+
+
+def implementations(pharmacy_id: int) -> Dict[str, Callable[[int, int], str]]:
+    from ninja.responses import NinjaJSONEncoder
+    from core import reviews
+    from core.models import Review
+    from core.schemas import ReviewOut
+
+    def with_schema(queryset):
+        def page(start, end):
+            return json.dumps([ReviewOut.from_orm(review).dict() for review in queryset[start:end]],
+                              cls=NinjaJSONEncoder)
+        return page
+
+    newest = Review.objects.filter(pharmacy=pharmacy_id).order_by("-id")
+    return {
+        "lazy": with_schema(newest),
+        "joined": with_schema(newest.select_related("user").only(*reviews.ONLY)),
+        "lean": lambda start, end: reviews.render(list(reviews.rows(pharmacy_id)[start:end])),
+    }
+
+
+def time_calls(call: Callable, iterations: int) -> dict:
+    with CaptureQueriesContext(connection) as captured:
+        call()
+    queries = len(captured)
+
+    start = perf_counter()
+    for _ in range(iterations):
+        call()
+    elapsed = perf_counter() - start
+    return {"per_second": round(iterations / elapsed, 1),
+            "mean_ms": round(elapsed / iterations * 1000, 3), "queries": queries}
+
+
+def run_size(size: int, iterations: int, log: Callable = print) -> dict:
+    from pharmace.utlize.constant import REVIEW_PER_PAGE
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        log(f"[{size}] seeding {size} reviews")
+        pharmacy_id = seed(size)
+        pages = {"first": 1, "middle": max(size // REVIEW_PER_PAGE // 2, 1),
+                 "last": max((size - 1) // REVIEW_PER_PAGE + 1, 1)}
+
+        results = {}
+        for name, call in implementations(pharmacy_id).items():
+            for where, page in pages.items():
+                start = (page - 1) * REVIEW_PER_PAGE
+                result = time_calls(lambda: call(start, start + REVIEW_PER_PAGE), iterations)
+                results[f"{name}/{where}"] = result
+                log(f"[{size}] {name:<7} {where:<7} {result}")
+
+        client = Client()
+
+        def request():
+            # measure the view, not the response cache
+            cache.clear()
+            response = client.get(f"/api/pharmacy/get_reviews/{pharmacy_id}")
+            assert response.status_code == 200, response.status_code
+
+        results["get_reviews"] = time_calls(request, iterations)
+        log(f"[{size}] get_reviews request {results['get_reviews']}")
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.reviews",
+                                     description="Benchmark the review listing")
+    parser.add_argument("--reviews", type=int, nargs="+", default=[1_000, 100_000],
+                        help="reviews of the pharmacy, one run per size")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    setup_test_environment()
+    report = {size: run_size(size, args.iterations) for size in args.reviews}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmace.settings")
+    django.setup()
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Seed, drive and time the API end-points, see the benchmarks package docstring.
+"""
+import json
+import random
+import argparse
+import platform
+from pathlib import Path
+from datetime import datetime, timezone
+from time import perf_counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import django
+from django.test import Client
+from django.db import connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+# local models
+from core.seed import DRUG_NAMES, seed_database
+from core.models import Cart, Drug, DrugItem, Pharmacy
+from auth_profile.models import Profile
+from auth_profile.authentication import auth_cache, create_token
+from pharmace.utlize.constant import PHARMACY_PER_PAGE
+
+BUDGETS = Path(__file__).with_name("budgets.json")
+
+SCALES = {
+    "small": dict(pharmacies=50, drugs=2_000, reviews=2_000, users=100),
+    "medium": dict(pharmacies=500, drugs=50_000, reviews=50_000, users=500),
+    "large": dict(pharmacies=5_000, drugs=500_000, reviews=1_000_000, users=1_000),
+}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Context:
+    client: Client
+    headers: dict
+    rng: random.Random
+    cart: Cart
+    pharmacies: List[int]
+    drugs: List[int]
+
+    def fill_cart(self, size: int = 5):
+        DrugItem.objects.filter(cart=self.cart).delete()
+        DrugItem.objects.bulk_create([DrugItem(cart=self.cart, drug_id=drug_id, amount=1)
+                                      for drug_id in self.rng.sample(self.drugs, size)])
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    url: Callable[[Context], str]
+    auth: bool = False
+    # runs before every call, not measured
+    setup: Optional[Callable[[Context], None]] = None
+
+
+ENDPOINTS = [
+    Endpoint("get_all", "get",
+             lambda ctx: f"/api/pharmacy/get_all/"
+                         f"{ctx.rng.randint(1, max(len(ctx.pharmacies) // PHARMACY_PER_PAGE, 1))}"),
+    Endpoint("get_by_id", "get",
+             lambda ctx: f"/api/pharmacy/get_by_id/{ctx.rng.choice(ctx.pharmacies)}"),
+    Endpoint("search_name", "get",
+             lambda ctx: f"/api/pharmacy/search_pharmacy/{ctx.rng.choice(DRUG_NAMES)}"),
+    Endpoint("filter_rates", "get",
+             lambda ctx: f"/api/pharmacy/filter_by_rates/{ctx.rng.choice(DRUG_NAMES)}"),
+    Endpoint("best_rated", "get",
+             lambda ctx: f"/api/pharmacy/best_rated/{ctx.rng.choice(DRUG_NAMES)}"),
+    Endpoint("most_popular", "get",
+             lambda ctx: f"/api/pharmacy/most_popular/{ctx.rng.choice(DRUG_NAMES)}"),
+    Endpoint("get_cart", "get", lambda ctx: "/api/cart/get_cart", auth=True),
+    Endpoint("add_to_cart", "post",
+             lambda ctx: f"/api/cart/add_increment_to_cart/{ctx.rng.choice(ctx.drugs)}",
+             auth=True),
+    Endpoint("checkout", "put", lambda ctx: "/api/cart/checkout", auth=True,
+             setup=lambda ctx: ctx.fill_cart()),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    # nearest-rank percentile
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[index]
+
+
+def measure(ctx: Context, endpoint: Endpoint, iterations: int, warmup: int) -> dict:
+    timings, queries = [], []
+    headers = ctx.headers if endpoint.auth else {}
+    for i in range(warmup + iterations):
+        if endpoint.setup:
+            endpoint.setup(ctx)
+        url = endpoint.url(ctx)
+
+        with CaptureQueriesContext(connection) as captured:
+            start = perf_counter()
+            response = getattr(ctx.client, endpoint.method)(url, **headers)
+            elapsed = perf_counter() - start
+
+        if response.status_code >= 400:
+            raise BenchmarkError(f"{endpoint.name}: {url} returned {response.status_code}")
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries": max(queries),
+        "bytes": len(response.content),
+    }
+
+
+def create_context(seed: int) -> Context:
+    auth_cache.clear()
+    cache.clear()
+    profile = Profile.objects.select_related("user").order_by("id").first()
+    cart, _ = Cart.objects.get_or_create(user=profile)
+    return Context(
+        client=Client(),
+        headers={"HTTP_AUTHORIZATION": f"Bearer {create_token(profile.user)['access']}"},
+        rng=random.Random(seed),
+        cart=cart,
+        pharmacies=list(Pharmacy.objects.values_list("id", flat=True)),
+        drugs=list(Drug.objects.values_list("id", flat=True)),
+    )
+
+
+def run_scale(scale: str, iterations: int, warmup: int, seed: int,
+              endpoints: List[Endpoint] = ENDPOINTS, log: Callable = print) -> Dict[str, dict]:
+    """
+    seed a fresh test database with the scale dataset and measure every end-point.
+    """
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        log(f"[{scale}] seeding {SCALES[scale]}")
+        seed_database(seed=seed, **SCALES[scale])
+        ctx = create_context(seed)
+
+        results = {}
+        for endpoint in endpoints:
+            results[endpoint.name] = measure(ctx, endpoint, iterations, warmup)
+            log(f"[{scale}] {endpoint.name}: {results[endpoint.name]}")
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def check_budgets(report: dict, budgets: dict) -> List[str]:
+    failures = []
+    for scale, results in report["results"].items():
+        for name, result in results.items():
+            budget = budgets.get(scale, {}).get(name, {})
+            for key, limit in budget.items():
+                if result.get(key, 0) > limit:
+                    failures.append(f"{scale}/{name}: {key} {result[key]} over budget {limit}")
+    return failures
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    p95 latencies that got slower than the baseline report by more than `tolerance`.
+    """
+    failures = []
+    for scale, results in report["results"].items():
+        for name, result in results.items():
+            old = baseline.get("results", {}).get(scale, {}).get(name)
+            if not old:
+                continue
+            ratio = result["p95_ms"] / old["p95_ms"] if old["p95_ms"] else 1
+            print(f"{scale}/{name}: p95 {old['p95_ms']} -> {result['p95_ms']} ms ({ratio:.2f}x), "
+                  f"queries {old['queries']} -> {result['queries']}")
+            if ratio > 1 + tolerance:
+                failures.append(f"{scale}/{name}: p95 regressed {ratio:.2f}x")
+            if result["queries"] > old["queries"]:
+                failures.append(f"{scale}/{name}: queries {old['queries']} -> {result['queries']}")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark the public API hot paths")
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["small"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--budgets", type=Path, default=BUDGETS)
+    parser.add_argument("--compare", type=Path, help="JSON report of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p95 slow down against --compare (default 25%%)")
+    args = parser.parse_args(argv)
+
+    setup_test_environment()
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": args.iterations,
+            "seed": args.seed,
+        },
+        "results": {scale: run_scale(scale, args.iterations, args.warmup, args.seed)
+                    for scale in args.scales},
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    failures = []
+    if args.budgets and args.budgets.exists():
+        failures += check_budgets(report, json.loads(args.budgets.read_text()))
+    if args.compare:
+        failures += compare(report, json.loads(args.compare.read_text()), args.tolerance)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import OpeningHours, Pharmacy, Drug, DrugItem, Cart, Review
+from .models import OpeningHours, Order, OrderLine, Pharmacy, Drug, DrugItem, Cart, Review
 
 
 # reverse foreign key
@@ -15,6 +15,9 @@ class ReviewAdmin(admin.TabularInline):
 class OpeningHoursAdmin(admin.TabularInline):
     model = OpeningHours
 
+class OrderLineAdmin(admin.TabularInline):
+    model = OrderLine
+
 
 class PharmacyAdmin(admin.ModelAdmin):
     model = Pharmacy
@@ -24,8 +27,13 @@ class CartAdmin(admin.ModelAdmin):
     model = Cart
     inlines = [DrugItemAdmin]
 
+class OrderAdmin(admin.ModelAdmin):
+    model = Order
+    inlines = [OrderLineAdmin]
+
 
 # Register the models.
 admin.site.register(Pharmacy, PharmacyAdmin)
 admin.site.register(Cart, CartAdmin)
+admin.site.register(Order, OrderAdmin)
 
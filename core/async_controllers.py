@@ -0,0 +1,144 @@
+"""
+Async variants of the pharmacy and cart read end-points, mounted under
+/api/async/, for ASGI servers (`uvicorn pharmace.asgi:application`).
+
+They wait on the database with the async ORM instead of holding a thread.
+ninja serializes the result in the event loop, so everything a response
+schema reads has to be loaded here (select_related / prefetch_related),
+a lazy query in a resolver raises SynchronousOnlyOperation, and the image
+renditions are looked up with images.aprefetch rather than a blocking cache read.
+"""
+from typing import List
+from ninja import Router
+from rest_framework import status
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from pharmace.utlize.constant import DRUG_PER_PAGE, PHARMACY_PER_PAGE, REVIEW_PER_PAGE
+# locall models
+from core import documents, reviews, search
+from core.response_cache import cache_response
+from .models import Cart, Drug, Pharmacy
+from pharmace.utlize import images
+from pharmace.utlize.custom_classes import Error
+from auth_profile.authentication import async_auth
+from .schemas import CartOut, DrugOut, PharmacyOut, PharmacyShort, MessageOut, ReviewOut
+
+async_pharmacy_router = Router()
+async_cart_router = Router()
+
+""" Pharmacy """
+
+
+@async_pharmacy_router.get("get_all/{page_number}",
+                           response={
+                               200: List[PharmacyShort],
+                               400: MessageOut
+                           })
+@cache_response()
+async def get_all(request, page_number: int):
+    # validate page number
+    if page_number <= 0:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(
+                detail="Invalid page number Has to be grater than 0")
+
+    start = (page_number - 1) * PHARMACY_PER_PAGE
+    end = start + PHARMACY_PER_PAGE
+
+    pharmacies = [pharmacy async for pharmacy in Pharmacy.objects.order_by('id')[start:end]]
+    await images.aprefetch(pharmacy.img for pharmacy in pharmacies)
+
+    return status.HTTP_200_OK, pharmacies
+
+
+@async_pharmacy_router.get("get_by_id/{id}",
+                           response={
+                               200: PharmacyOut,
+                               400: MessageOut
+                           })
+@cache_response(pharmacy="id")
+async def get_by_id(request, id: int):
+    # the pre-rendered PharmacyOut, see core/documents.py
+    document = await documents.aget_document(id)
+    if document is None:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {id} Not Found")
+
+    return HttpResponse(document, content_type=documents.CONTENT_TYPE)
+
+
+@async_pharmacy_router.get("get_druge/{pharmacy_id}/{page_number}",
+                           response={
+                               200: List[DrugOut],
+                               400: MessageOut
+                           })
+@cache_response(pharmacy="pharmacy_id")
+async def get_druge(request, pharmacy_id: int, page_number: int):
+    # validate page number
+    if page_number <= 0:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(
+                detail="Invalid page number Has to be grater than 0")
+
+    start = (page_number - 1) * DRUG_PER_PAGE
+    end = start + DRUG_PER_PAGE
+
+    drugs = [drug async for drug in Drug.objects.filter(pharmacy=pharmacy_id)[start:end]]
+
+    if not drugs:
+        return (status.HTTP_400_BAD_REQUEST, 
+                MessageOut(detail=f"No Drugs with id {pharmacy_id}"))
+    await images.aprefetch(drug.img for drug in drugs)
+
+    return status.HTTP_200_OK, drugs
+
+
+@async_pharmacy_router.get("get_reviews/{id}",
+                           response={
+                               200: List[ReviewOut],
+                               400: MessageOut,
+                           })
+@cache_response(pharmacy="id")
+async def get_pharm_reviews(request, id: int, page_number: int = 1):
+    start = (page_number - 1) * REVIEW_PER_PAGE
+    end = start + REVIEW_PER_PAGE
+
+    page = [row async for row in reviews.rows(id)[start:end]]
+    if not page and not await Pharmacy.objects.filter(id=id).aexists():
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {id} Not Found")
+    await images.aprefetch(row["user__img"] for row in page)
+
+    return HttpResponse(reviews.render(page), content_type=documents.CONTENT_TYPE)
+
+
+@async_pharmacy_router.get("search_pharmacy/{drug_name}",
+                           response={200: List[PharmacyShort],
+                                     400: MessageOut,},)
+@cache_response()
+async def search_name(request, drug_name: str):
+    # the FTS queries are raw SQL on the sync connection
+    pharmacies = await sync_to_async(search.search_pharmacies)(drug_name)
+    await images.aprefetch(pharmacy.img for pharmacy in pharmacies)
+    return status.HTTP_200_OK, pharmacies
+
+
+""" Cart """
+
+
+@async_cart_router.get("get_cart",
+                       response={200: CartOut,
+                                 404: MessageOut},
+                       # documents the bearer auth of @async_auth
+                       openapi_extra={"security": [{"CustomAuth": []}]})
+@async_auth
+async def get_cart(request):
+    # user profile resolved by AsyncCustomAuth
+    profile = request.profile
+    if isinstance(profile, Error):
+        return profile.status, profile.message
+
+    cart = await Cart.objects.with_items().filter(user=profile).afirst()
+    if cart is None:
+        # users who signed up before carts were created with their profile
+        created = await Cart.objects.acreate(user=profile)
+        cart = await Cart.objects.with_items().aget(id=created.id)
+    await images.aprefetch([cart.user.img, *(item.drug.img for item in cart.item_cart.all())])
+
+    return status.HTTP_200_OK, cart
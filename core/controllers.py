@@ -2,22 +2,30 @@ import random
 from typing import List
 from ninja import Router
 from rest_framework import status
-from django.db.models import Avg, Q
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.db.models import Q
 from auth_profile.models import Profile
 from django.contrib.auth import get_user_model
-from pharmace.utlize.constant import (DRUG_PER_PAGE, PHARMACY_PER_PAGE, 
-                                      REVIEW_DESCRIPTION, REVIEW_PER_PAGE)
+from pharmace.utlize import geo
+from pharmace.utlize.constant import (DRUG_PER_PAGE, NEARBY_LIMIT, NEARBY_MAX_RADIUS_KM,
+                                      NEARBY_RADIUS_KM, ORDER_PER_PAGE, PHARMACY_PER_PAGE,
+                                      RANKING_CANDIDATES, REVIEW_PER_PAGE, SEARCH_LIMIT)
 # locall models
-from .models import Cart, DrugItem, OpeningHours, Pharmacy, Review, Drug
-from pharmace.utlize.custom_classes import Error
+from core import documents, products, ranking, reviews, search
+from core.response_cache import cache_response
+from core.seed import seed_database
+from .models import Cart, DrugItem, Order, Pharmacy, Product, Review, Drug
+from pharmace.utlize.custom_classes import Error, cursor_paginate
 from auth_profile.authentication import CustomAuth
-from pharmace.utlize.utlize import get_user_profile, normalize_email
-from .schemas import (CartOut, Checkout, DrugOut, ItemUpdate, PharmacyOut, 
-                      PharmacyShort, MessageOut, ReviewIn, ReviewOut, SeedSchema)
+from .schemas import (CartOut, Checkout, DrugOut, ItemDelta, ItemUpdate, OrderOut, PharmacyNearby,
+                      PharmacyOut, PharmacyShort, MessageOut, ProductOffers, ProductOut, ReviewIn,
+                      ReviewOut, SeedSchema)
 User = get_user_model()
 
 # 
 pharmacy_router = Router()
+product_router = Router()
 cart_router = Router()
 draft_router = Router()
 
@@ -29,6 +37,7 @@ draft_router = Router()
                          200:List[PharmacyShort],
                          400: MessageOut
                      })
+@cache_response()
 def get_all(request, page_number: int):
     # validate page number
     if page_number <= 0:
@@ -48,12 +57,14 @@ def get_all(request, page_number: int):
                          200:PharmacyOut,
                          400: MessageOut
                      })
+@cache_response(pharmacy="id")
 def get_by_id(request, id: int):
-    pharmacy = Pharmacy.objects.filter(id=id)
-    if not pharmacy:
+    # the pre-rendered PharmacyOut, see core/documents.py
+    document = documents.get_document(id)
+    if document is None:
         return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {id} Not Found")
 
-    return status.HTTP_200_OK, Pharmacy.objects.filter(id=id).first()
+    return HttpResponse(document, content_type=documents.CONTENT_TYPE)
 
 
 @pharmacy_router.get("get_druge/{pharmacy_id}/{page_number}",
@@ -61,6 +72,7 @@ def get_by_id(request, id: int):
                          200:List[DrugOut],
                          400: MessageOut
                      })
+@cache_response(pharmacy="pharmacy_id")
 def get_druge(request, pharmacy_id: int, page_number: int):
     # validate page number
     if page_number <= 0:
@@ -84,46 +96,121 @@ def get_druge(request, pharmacy_id: int, page_number: int):
                          200:List[ReviewOut],
                          400: MessageOut,
                      },)
+@cache_response(pharmacy="id")
 def get_pharm_reviews(request, id: int, page_number: int=1):
-    pharmacy = Pharmacy.objects.filter(id=id).first()
-    if not pharmacy:
-        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {id} Not Found")
-
     start = (page_number - 1) * REVIEW_PER_PAGE
     end = start + REVIEW_PER_PAGE
 
-    return Review.objects.filter(pharmacy=pharmacy).order_by("-id")[start:end]
+    page = list(reviews.rows(id)[start:end])
+    # an empty page may be a missing pharmacy
+    if not page and not Pharmacy.objects.filter(id=id).exists():
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {id} Not Found")
+
+    # serialized without a ReviewOut per row, same JSON
+    return HttpResponse(reviews.render(page), content_type=documents.CONTENT_TYPE)
+
+
+@pharmacy_router.get("pharmacies",
+                     response={200: List[PharmacyShort]})
+@cursor_paginate("id", page_size=PHARMACY_PER_PAGE)
+def list_pharmacies(request):
+    """
+    keyset paginated version of get_all,
+    follow the `next` link to get the following page.
+    """
+    return Pharmacy.objects.all()
+
+
+@pharmacy_router.get("drugs/{pharmacy_id}",
+                     response={200: List[DrugOut]})
+@cursor_paginate("id", page_size=DRUG_PER_PAGE)
+def list_drugs(request, pharmacy_id: int):
+    """
+    keyset paginated version of get_druge,
+    follow the `next` link to get the following page.
+    """
+    return Drug.objects.filter(pharmacy=pharmacy_id)
+
+
+@pharmacy_router.get("reviews/{pharmacy_id}",
+                     response={
+                         200: List[ReviewOut],
+                         400: MessageOut,
+                     })
+@cursor_paginate("-id", page_size=REVIEW_PER_PAGE)
+def list_reviews(request, pharmacy_id: int):
+    """
+    keyset paginated version of get_reviews, newest first,
+    follow the `next` link to get the following page.
+    """
+    if not Pharmacy.objects.filter(id=pharmacy_id).exists():
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail=f"Pharmacy with id {pharmacy_id} Not Found")
+
+    return Review.objects.filter(pharmacy=pharmacy_id).select_related("user").only(*reviews.ONLY)
 
 
 @pharmacy_router.get("search_pharmacy/{drug_name}",
                      response={200: List[PharmacyShort],
                                400: MessageOut,},)
+@cache_response()
 def search_name(request, drug_name: str):
-    pharmacies = (Pharmacy.objects.filter(Q(drug__name__icontains=drug_name) | 
-                                          Q(name__contains=drug_name))
-                  .distinct())
+    pharmacies = search.search_pharmacies(drug_name)
     return status.HTTP_200_OK, pharmacies
 
 
+def nearest_stocking(drug_name: str, latitude: float, longitude: float,
+                     radius: float) -> List[Pharmacy]:
+    """
+    pharmacies within `radius` km with an active drug matching drug_name, nearest first.
+    """
+    candidates = geo.nearby(Pharmacy.objects.only("id", "latitude", "longitude"),
+                            latitude, longitude, radius)
+    stocking = search.stocking_pharmacy_ids(drug_name, [pharmacy.id for pharmacy in candidates])
+    candidates = [pharmacy for pharmacy in candidates if pharmacy.id in stocking][:NEARBY_LIMIT]
+
+    pharmacies = Pharmacy.objects.in_bulk([pharmacy.id for pharmacy in candidates])
+    for pharmacy in candidates:
+        pharmacies[pharmacy.id].distance = pharmacy.distance
+    return [pharmacies[pharmacy.id] for pharmacy in candidates]
+
+
+@pharmacy_router.get("nearest/{drug_name}",
+                     response={200: List[PharmacyNearby],
+                               400: MessageOut,},)
+def nearest(request, drug_name: str, latitude: float, longitude: float,
+            radius: float = NEARBY_RADIUS_KM):
+    """
+    the nearest pharmacies stocking the drug, at most `radius` km away.
+    """
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return status.HTTP_400_BAD_REQUEST, MessageOut(detail="Invalid coordinates")
+    if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+        return status.HTTP_400_BAD_REQUEST, MessageOut(
+                detail=f"radius has to be between 0 and {NEARBY_MAX_RADIUS_KM} km")
+
+    return status.HTTP_200_OK, nearest_stocking(drug_name, latitude, longitude, radius)
+
+
 @pharmacy_router.get("search_by_location/{drug_name}",
-                     response={200: List[PharmacyShort],
+                     response={200: List[PharmacyNearby],
                                400: MessageOut,},
                      auth=CustomAuth())
 def search_location(request, drug_name: str):
-    email = normalize_email(request.auth)
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
-    pharmacies = (Pharmacy.objects
-                  .filter(Q(drug__name__icontains=drug_name) | 
-                          Q(name__contains=drug_name))
-                  .distinct()
-                  .filter(
-                      Q(location__icontains=profile.city) |
-                      Q(location__icontains=profile.province)
-                      )
-                  )
+
+    if profile.has_location:
+        return status.HTTP_200_OK, nearest_stocking(drug_name, profile.latitude,
+                                                    profile.longitude, NEARBY_RADIUS_KM)
+
+    # profiles without coordinates fall back to matching the address text
+    nearby = Pharmacy.objects.filter(
+        Q(location__icontains=profile.city) |
+        Q(location__icontains=profile.province)
+        )
+    pharmacies = search.search_pharmacies(drug_name, nearby)
 
     return status.HTTP_200_OK, pharmacies
 
@@ -132,31 +219,52 @@ def search_location(request, drug_name: str):
                      response={200: List[PharmacyShort],
                                400: MessageOut,},)
 def filter_rates(request, drug_name: str):
-    pharmacies = (Pharmacy.objects.filter(Q(drug__name__icontains=drug_name) | 
-                                          Q(name__contains=drug_name))
-                  .distinct()
-                  .annotate(rate_avg=Avg("review__rating"))
-                  .order_by("rate_avg"))
+    # the best rated of every match, not of the best matches, see core/ranking.py
+    pharmacy_ids = search.search_pharmacy_ids(drug_name, limit=None)
+    return status.HTTP_200_OK, ranking.best_rated(pharmacy_ids, limit=SEARCH_LIMIT)
+
+
+@pharmacy_router.get("best_rated/{drug_name}",
+                     response={200: List[PharmacyShort]})
+@cache_response()
+def best_rated(request, drug_name: str):
+    """
+    the pharmacies matching the drug query with the best
+    rating (Bayesian average of the reviews) first.
+    """
+    pharmacy_ids = search.search_pharmacy_ids(drug_name, RANKING_CANDIDATES)
+    return status.HTTP_200_OK, ranking.best_rated(pharmacy_ids)
 
-    return status.HTTP_200_OK, pharmacies
+
+@pharmacy_router.get("most_popular/{drug_name}",
+                     response={200: List[PharmacyShort]})
+@cache_response()
+def most_popular(request, drug_name: str):
+    """
+    the pharmacies matching the drug query with the most
+    ordered units first, then the most reviewed.
+    """
+    pharmacy_ids = search.search_pharmacy_ids(drug_name, RANKING_CANDIDATES)
+    return status.HTTP_200_OK, ranking.most_popular(pharmacy_ids)
 
 
 @pharmacy_router.get("filter_by_location/{name}",
-                     response={200: List[PharmacyShort],
+                     response={200: List[PharmacyNearby],
                                400: MessageOut,},
                      auth=CustomAuth(),)
 def filter_location(request, name: str):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
-    pharmacy = Pharmacy.objects.filter(name__icontains=name).filter(location__icontains=profile.province)
+    pharmacies = Pharmacy.objects.filter(name__icontains=name)
+    if profile.has_location:
+        return status.HTTP_200_OK, geo.nearby(pharmacies, profile.latitude, profile.longitude,
+                                              NEARBY_RADIUS_KM, limit=NEARBY_LIMIT)
 
-    return status.HTTP_200_OK, pharmacy
+    # profiles without coordinates fall back to matching the address text
+    return status.HTTP_200_OK, pharmacies.filter(location__icontains=profile.province)
 
 
 @pharmacy_router.post("add_edit_review",
@@ -165,23 +273,35 @@ def filter_location(request, name: str):
                                 404: MessageOut},
                       auth=CustomAuth(),)
 def add_edit_review(request, review_in: ReviewIn):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
     pharmacy = Pharmacy.objects.filter(id=review_in.Pharmacy_id).first()
-    # get the review or create new one
-
-    review, _ = Review.objects.get_or_create(user=profile, pharmacy=pharmacy,
-                                             defaults={'rating': 0, 'description': ''})
-    review.rating = review_in.rating
-    review.description = review_in.description
-
-    review.save()
+    if not pharmacy:
+        return status.HTTP_404_NOT_FOUND, MessageOut(
+                detail=f"Pharmacy with id {review_in.Pharmacy_id} Not Found")
+
+    try:
+        with transaction.atomic():
+            # get the review or create new one, locked so the
+            # rating aggregates see the rating it replaces
+            review = (Review.objects.select_for_update()
+                      .filter(user=profile, pharmacy=pharmacy).first())
+            old_rating = review.rating if review else None
+            if not review:
+                review = Review(user=profile, pharmacy=pharmacy)
+
+            review.rating = review_in.rating
+            review.description = review_in.description
+            review.save()
+
+            Pharmacy.update_rating(pharmacy.id, old_rating, review.rating)
+    except IntegrityError:
+        # a concurrent request of the user created the review first
+        return status.HTTP_400_BAD_REQUEST, MessageOut(
+                detail="The review was submitted twice, try again")
 
     return review
 
@@ -191,38 +311,88 @@ def add_edit_review(request, review_in: ReviewIn):
                                   404: MessageOut,},
                         auth=CustomAuth(),)
 def delete_review(request, pharmacy_id: int):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
   
-    review = Review.objects.filter(user=profile, pharmacy = pharmacy_id)
-    if not review.exists():
-        return status.HTTP_404_NOT_FOUND, MessageOut(detail="Review Not Found")
+    with transaction.atomic():
+        review = (Review.objects.select_for_update()
+                  .filter(user=profile, pharmacy=pharmacy_id).first())
+        if not review:
+            return status.HTTP_404_NOT_FOUND, MessageOut(detail="Review Not Found")
+
+        review.delete()
+        Pharmacy.update_rating(pharmacy_id, old_rating=review.rating)
 
-    review.delete()
     return status.HTTP_200_OK, MessageOut(detail="Review Deleted Successfully")
 
 
+""" Products """
+
+
+@product_router.get("search/{drug_name}",
+                    response={200: List[ProductOut]})
+@cache_response()
+def search_products(request, drug_name: str):
+    """
+    the products whose name starts with drug_name, with their price range,
+    the same drug of every pharmacy is one product, see core/products.py.
+    """
+    return status.HTTP_200_OK, products.search(drug_name)
+
+
+@product_router.get("offers/{product_id}",
+                    response={
+                        200: ProductOffers,
+                        404: MessageOut,
+                    })
+@cache_response()
+def product_offers(request, product_id: int):
+    """
+    the offers of the product across pharmacies, cheapest first.
+    """
+    offers = products.offers(product_id)
+    if offers:
+        return status.HTTP_200_OK, {"product": offers[0].product, "offers": offers}
+
+    # no offer left, or no such product
+    product = Product.objects.filter(id=product_id).first()
+    if product is None:
+        return status.HTTP_404_NOT_FOUND, MessageOut(detail=f"Product with id {product_id} Not Found")
+    return status.HTTP_200_OK, {"product": product, "offers": []}
+
+
 """ Cart """
 
 
+def cart_item(cart, drug_id):
+    """
+    the cart item of the drug for an ItemUpdate response,
+    with the cart reloaded so the cart total sees every item.
+    an item with amount 0 is returned if the drug was removed.
+    """
+    cart = Cart.objects.with_items().get(id=cart.id)
+    for item in cart.items:
+        if item.drug_id == drug_id:
+            return item
+
+    return DrugItem(cart=cart, drug=Drug.objects.get(id=drug_id), amount=0)
+
+
 @cart_router.get("get_cart",
                  response={200:CartOut},
                  auth=CustomAuth(),)
 def get_cart(request):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
-    cart = Cart.objects.filter(user=profile).first()
+    cart = Cart.objects.with_items().filter(user=profile).first()
+    if cart is None:
+        # users who signed up before carts were created with their profile
+        cart = Cart.objects.create(user=profile)
 
     return status.HTTP_200_OK, cart
 
@@ -235,34 +405,17 @@ def get_cart(request):
                   },
                 auth=CustomAuth(),)
 def add_to_cart(request, drug_id: int):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # check if user and profile exists
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
     # cart of the user
-    cart = Cart.objects.filter(user=profile).first()
-    drug = Drug.objects.filter(id=drug_id).first()
-
-    # check if there is an item
-    item = DrugItem.objects.filter(drug=drug,
-                                   cart=cart,)
+    cart = Cart.objects.only('id').filter(user=profile).first()
 
-    if item.exists():
-        item = item.first()
-        item.amount += 1
-        item.save()
+    if not cart.increment(drug_id):
+        return status.HTTP_404_NOT_FOUND, MessageOut(detail="Drug Not Found")
 
-        return item
-    
-    # create Item
-    item = DrugItem.objects.create(drug = drug,
-                                          cart=cart,
-                                          amount=1)
-
-    return item
+    return status.HTTP_200_OK, cart_item(cart, drug_id)
 
 
 @cart_router.put("decrease_from_cart/{drug_id}",
@@ -273,34 +426,49 @@ def add_to_cart(request, drug_id: int):
                   },
                 auth=CustomAuth(),)
 def decrease_from_cart(request, drug_id: int):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # check if user and profile exists
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
     # cart of the user
-    cart = Cart.objects.filter(user=profile).first()
-    drug = Drug.objects.filter(id=drug_id).first()
-
-    # check if there is an item
-    item = DrugItem.objects.filter(drug=drug,
-                                   cart=cart,)
+    cart = Cart.objects.only('id').filter(user=profile).first()
 
-    if not item.exists():
+    if not cart.decrement(drug_id):
         return status.HTTP_404_NOT_FOUND, MessageOut(detail="Item Not Found")
 
-    item = item.first()
-    item.amount -= 1
-    item.save()
+    return status.HTTP_200_OK, cart_item(cart, drug_id)
+
+
+@cart_router.post("bulk_update",
+                  response={
+                      200: CartOut,
+                      400: MessageOut,
+                      404: MessageOut,
+                  },
+                auth=CustomAuth(),)
+def bulk_update_cart(request, deltas: List[ItemDelta]):
+    """
+    add (positive amount) or remove (negative amount) several drugs at once,
+    all changes are applied together or none of them.
+    """
+    # user profile resolved by CustomAuth
+    profile = request.profile
+    if isinstance(profile, Error):
+        return profile.status, profile.message
+
+    # merge deltas of the same drug
+    changes = {}
+    for delta in deltas:
+        changes[delta.drug_id] = changes.get(delta.drug_id, 0) + delta.amount
 
-    if item.amount <= 0:
-        item.delete()
-        item
+    cart = Cart.objects.only('id').filter(user=profile).first()
+    unknown = cart.apply_deltas(changes)
+    if unknown:
+        return status.HTTP_404_NOT_FOUND, MessageOut(
+                detail=f"Drugs with ids {unknown} Not Found")
 
-    return status.HTTP_200_OK, item
+    return status.HTTP_200_OK, Cart.objects.with_items().get(id=cart.id)
 
 
 @cart_router.put("checkout",
@@ -310,22 +478,44 @@ def decrease_from_cart(request, drug_id: int):
                   },
                 auth=CustomAuth(),)
 def checkout(request):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # get user profile
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
-    cart = Cart.objects.filter(user=profile).first()
-    # Serialize the old cart data
-    old_cart = Checkout.from_orm(cart)
+    with transaction.atomic():
+        # lock the cart, a double submitted checkout waits
+        # here and then finds the cart already empty
+        cart = (Cart.objects.with_items().select_for_update(of=('self',))
+                .filter(user=profile).first())
+        if cart is None or not cart.items:
+            return status.HTTP_400_BAD_REQUEST, MessageOut(detail="Cart is empty")
+
+        # Serialize the old cart data
+        old_cart = Checkout.from_orm(cart)
+        order = Order.from_cart(cart)
+        # the items stay loaded after the cart is emptied
+        ranking.record_order(cart.items)
+
+    old_cart.order_id = order.id
+    return status.HTTP_200_OK, old_cart
 
-    for item in cart.items:
-        item.delete()
 
-    return status.HTTP_200_OK, old_cart
+@cart_router.get("orders",
+                 response={200: List[OrderOut]},
+                 auth=CustomAuth(),)
+@cursor_paginate("-id", page_size=ORDER_PER_PAGE)
+def get_orders(request):
+    """
+    order history of the user, newest first,
+    follow the `next` link to get the following page.
+    """
+    # user profile resolved by CustomAuth
+    profile = request.profile
+    if isinstance(profile, Error):
+        return profile.status, profile.message
+
+    return Order.objects.filter(user=profile).prefetch_related('lines')
 
 
 """ Draft """
@@ -334,132 +524,38 @@ def checkout(request):
 @draft_router.post("create_seed", response={200: SeedSchema})
 def create(request):
     """
+    small version of `python manage.py seed`, use the command for bigger datasets.
     make sure you have these files:
         - seed_img/drug.png
         - seed_img/pharmacy_img.jpg
         - seed_img/profile.png
     """
-
-    profile_img = "seed_img/profile.png"
-
-    provinces = ["Mansour", "Kadhimiya", "Al Jamaa"]
-    profile_users = []
-    for user_ in range(12):
-        
-        user = User.objects.filter(email= f'user{user_}@example.com')
-        if user.exists():
-            user = user.first()
-        else:
-            user = User.objects.create_user(
-                email= f'user{user_}@example.com',
-                password= 'String1@',
-            )
-
-        profile, _ = Profile.objects.get_or_create(
-            user=user, 
-            name='BASBOS',
-            img=profile_img,
-            city="Baghdad",
-            province=random.choice(provinces)
-        )
-        # create empty Cart for the user
-        Cart.objects.create(user=profile)
-
-        profile_users.append(profile)
-
-    pharmacy_img = "seed_img/pharmacy_img.jpg"
-
-    pharmacies = []
-    names_1 = ['nahr','Kauthar','alsiha','life']
-    names_2 = ['aldawaa','alyasameen','elixer','dalya']
-    current_id = 0
-
-    for i in range(10):
-        pharmacy, _ = Pharmacy.objects.get_or_create(
-                name=f"{i} {names_1[current_id]} {names_2[current_id]}",
-                description="A family-owned pharmacy that has been serving the community",
-                location=f"{random.choice(provinces)} / alroad / cross meshmesha",
-                img=pharmacy_img,
-        )
-        current_id = current_id+1 if current_id < len(names_1)-1 else 0
-
-        # create opening hours
-        for choice in OpeningHours.DayChoices.choices:
-            choice = choice[0]
-            open_hours, created = OpeningHours.objects.get_or_create(weekday=choice,
-                                                               pharmacy=pharmacy,)
-            if created:
-                hours = "9:00 AM - 9:00 PM"
-                if choice == "FRI":
-                    hours = "closed"
-
-                open_hours.hours = hours
-                open_hours.save()
-
-        # create reviews
-        for usr_indx in range(12):
-            review = Review.objects.filter(user=profile_users[usr_indx],
-                                         pharmacy=pharmacy,)
-            if review.exists():
-                continue
-
-            Review.objects.create(user=profile_users[usr_indx],
-                                         pharmacy=pharmacy,
-                                         rating=random.uniform(0.0, 5.0),
-                                         description=REVIEW_DESCRIPTION,)
-
-        pharmacies.append(pharmacy)
-
-
-    drug_img = "seed_img/drug.png"
-    drug_names = ['Aspirin', 'Ibuprofen', 'Acetaminophen', 'Morphine', "Ibuprofen 200mg tablets"]
-
-    for pharmacy_ in range(len(pharmacies)):
-        for drug_ in range(20):
-            Drug.objects.get_or_create(
-                name = f"{drug_} {random.choice(drug_names)}",
-                description ="Pain relief for headaches, toothaches, menstrual cramps, and other minor aches and pains.",
-                img = drug_img,
-                price=4.99,
-                is_active=True,
-                pharmacy=pharmacies[pharmacy_],
-            )
-
+    result = seed_database(pharmacies=10, drugs=200, reviews=120, users=12,
+                           seed=random.randrange(2 ** 32))
 
     return status.HTTP_200_OK, SeedSchema(
-        pharmacies= pharmacies,
-        profile= profile_users[1]
+        pharmacies=list(Pharmacy.objects.filter(id__in=result.pharmacies).order_by('id')),
+        profile=Profile.objects.select_related('user').get(id=result.profiles[1]),
         )
 
 
 @draft_router.put("remove_from_cart/{drug_id}",
                   response={
-                      200: ItemUpdate,
+                      200: MessageOut,
                       400: MessageOut,
                       404: MessageOut,
                   },
                 auth=CustomAuth(),)
 def remove_from_cart(request, drug_id: int):
-    # get the user from email in auth
-    email = normalize_email(request.auth)
-
-    # check if user and profile exists
-    profile = get_user_profile(email)
+    # user profile resolved by CustomAuth
+    profile = request.profile
     if isinstance(profile, Error):
         return profile.status, profile.message
 
-    # cart of the user
-    cart = Cart.objects.filter(user=profile).first()
-    drug = Drug.objects.filter(id=drug_id).first()
-
-    # check if there is an item
-    item = DrugItem.objects.filter(drug=drug,
-                                   cart=cart,)
-
-    if item.exists():
-        item = item.first()
-        item.delete()
+    # delete the item of the drug from the user cart
+    deleted, _ = DrugItem.objects.filter(drug=drug_id, cart__user=profile).delete()
 
+    if deleted:
         return status.HTTP_200_OK, MessageOut(detail="Item Deleted")
 
     return status.HTTP_404_NOT_FOUND, MessageOut(detail="Item Not Found")
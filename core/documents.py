@@ -0,0 +1,151 @@
+"""
+Pre-rendered pharmacy detail documents.
+
+get_by_id serves the PharmacyOut JSON stored in PharmacyDocument with one
+primary-key read instead of rendering the pharmacy, its drugs, opening hours
+and reviews on every request.
+
+The signals in core.signals call `schedule_rebuild` when a row the document
+shows changes, the document is re-rendered once the transaction commits.
+`manage.py rebuild_documents` renders them all across a process pool.
+"""
+import json
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from ninja.responses import NinjaJSONEncoder
+# local models
+from core.models import Pharmacy, PharmacyDocument
+from core.schemas import PharmacyOut
+from pharmace import db
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/json; charset=utf-8"
+
+# pharmacy ids waiting for their on_commit rebuild
+_scheduled = threading.local()
+
+
+def render(pharmacy: Pharmacy) -> str:
+    """
+    the same JSON ninja renders for a PharmacyOut response.
+    """
+    return json.dumps(PharmacyOut.from_orm(pharmacy).dict(), cls=NinjaJSONEncoder)
+
+
+def render_many(pharmacy_ids: Iterable[int]) -> List[Tuple[int, str]]:
+    pharmacies = Pharmacy.objects.filter(id__in=list(pharmacy_ids)).order_by("id")
+    return [(pharmacy.id, render(pharmacy)) for pharmacy in pharmacies]
+
+
+def save_documents(rendered: List[Tuple[int, str]]):
+    PharmacyDocument.objects.bulk_create(
+        [PharmacyDocument(pharmacy_id=pharmacy_id, body=body) for pharmacy_id, body in rendered],
+        update_conflicts=True, unique_fields=["pharmacy"], update_fields=["body", "updated_at"],
+    )
+
+
+def rebuild(pharmacy_ids: Iterable[int]) -> int:
+    # the rows just written may not have reached the replicas
+    with db.primary():
+        rendered = render_many(pharmacy_ids)
+    save_documents(rendered)
+    return len(rendered)
+
+
+def get_document(pharmacy_id: int) -> Optional[str]:
+    """
+    the document body of the pharmacy, rendered now if it has none yet,
+    None if the pharmacy does not exist.
+    """
+    body = (PharmacyDocument.objects.filter(pharmacy_id=pharmacy_id)
+            .values_list("body", flat=True).first())
+    if body is None:
+        with db.primary():
+            rendered = render_many([pharmacy_id])
+        if not rendered:
+            return None
+        # a GET filling the document in doesn't pin its client to the primary
+        with db.unpinned_writes():
+            save_documents(rendered)
+        body = rendered[0][1]
+    return body
+
+
+async def aget_document(pharmacy_id: int) -> Optional[str]:
+    """
+    get_document for the async views.
+    """
+    body = await (PharmacyDocument.objects.filter(pharmacy_id=pharmacy_id)
+                  .values_list("body", flat=True).afirst())
+    if body is None:
+        body = await sync_to_async(get_document)(pharmacy_id)
+    return body
+
+
+def schedule_rebuild(pharmacy_id: int):
+    """
+    re-render the document once the current transaction commits,
+    several changes to the same pharmacy in one transaction render it once.
+    """
+    if not hasattr(_scheduled, "ids"):
+        _scheduled.ids = set()
+    _scheduled.ids.add(pharmacy_id)
+
+    def run():
+        # an earlier callback of the same commit already rendered it
+        if pharmacy_id in _scheduled.ids:
+            _scheduled.ids.discard(pharmacy_id)
+            try:
+                rebuild([pharmacy_id])
+            except Exception:
+                # never serve the stale document, get_document renders it again
+                logger.exception("rendering the document of pharmacy %s failed", pharmacy_id)
+                PharmacyDocument.objects.filter(pharmacy_id=pharmacy_id).delete()
+
+    transaction.on_commit(run)
+
+
+def _init_worker():
+    # drop the database connections inherited from the parent without closing
+    # them, closing would close them for the parent too, the worker opens its own
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+def rebuild_all(queryset=None, batch_size: int = 200, workers: int = None,
+                log: Callable = lambda message: None) -> int:
+    """
+    render the documents of every pharmacy in `queryset` (default: all), batches of
+    `batch_size` pharmacies are rendered by a pool of `workers` processes
+    (1 renders in this process) and written from here.
+    """
+    queryset = Pharmacy.objects.all() if queryset is None else queryset
+    ids = list(queryset.order_by("id").values_list("id", flat=True))
+    batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+    if workers == 1 or len(batches) <= 1:
+        results = map(render_many, batches)
+        pool = None
+    else:
+        # fork so the workers inherit the configured django
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   mp_context=multiprocessing.get_context("fork"))
+        results = pool.map(render_many, batches)
+
+    written = 0
+    try:
+        for rendered in results:
+            save_documents(rendered)
+            written += len(rendered)
+            log(f"PharmacyDocument: {written}/{len(ids)}")
+    finally:
+        if pool:
+            pool.shutdown()
+    return written
@@ -0,0 +1,131 @@
+import re
+import json
+import time
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand, CommandError
+# local models
+from core import ranking
+from pharmace import db
+from auth_profile.authentication import create_token
+from core.models import Cart, Drug, Pharmacy, Product
+
+# "SCAN core_drug" is a full scan, "SCAN core_drug USING INDEX ..." is not,
+# neither is the scan of a virtual (full-text search) table, its module picks the index
+SQLITE_FULL_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING| VIRTUAL TABLE)")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+# the statements that look rows up, the inserts and savepoints don't
+PLANNED = ("SELECT", "UPDATE", "DELETE")
+
+
+def sample_ids():
+    def first(model):
+        return model.objects.order_by("id").values_list("id", flat=True).first() or 1
+
+    return {"pharmacy": first(Pharmacy), "drug": first(Drug), "cart": first(Cart),
+            "product": first(Product)}
+
+
+def controller_requests(ids):
+    """
+    (controller, method, path, body, tables its queries may scan) of the
+    requests whose queries are checked, the ones with a body are authenticated.
+    """
+    pharmacy, drug = ids["pharmacy"], ids["drug"]
+    return [
+        # offset pages and the first cursor page read the table in id order by design
+        ("get_all", "get", "/api/pharmacy/get_all/1", None, {"core_pharmacy"}),
+        ("get_by_id", "get", f"/api/pharmacy/get_by_id/{pharmacy}", None, set()),
+        ("get_druge", "get", f"/api/pharmacy/get_druge/{pharmacy}/1", None, set()),
+        ("get_reviews", "get", f"/api/pharmacy/get_reviews/{pharmacy}", None, set()),
+        ("pharmacies", "get", "/api/pharmacy/pharmacies", None, {"core_pharmacy"}),
+        ("drugs", "get", f"/api/pharmacy/drugs/{pharmacy}", None, set()),
+        ("reviews", "get", f"/api/pharmacy/reviews/{pharmacy}", None, set()),
+        ("search_pharmacy", "get", "/api/pharmacy/search_pharmacy/asp", None, set()),
+        ("nearest", "get", "/api/pharmacy/nearest/asp?latitude=33.3128&longitude=44.345",
+         None, set()),
+        ("filter_by_rates", "get", "/api/pharmacy/filter_by_rates/asp", None, set()),
+        ("best_rated", "get", "/api/pharmacy/best_rated/asp", None, set()),
+        ("most_popular", "get", "/api/pharmacy/most_popular/asp", None, set()),
+        ("search_products", "get", "/api/products/search/asp", None, set()),
+        ("product_offers", "get", f"/api/products/offers/{ids['product']}", None, set()),
+        ("get_cart", "get", "/api/cart/get_cart", {}, set()),
+        ("add_to_cart", "post", f"/api/cart/add_increment_to_cart/{drug}", {}, set()),
+        ("remove_from_cart", "put", f"/api/draft/remove_from_cart/{drug}", {}, set()),
+        ("add_edit_review", "post", "/api/pharmacy/add_edit_review",
+         {"Pharmacy_id": pharmacy, "rating": 4, "description": "query plan"}, set()),
+        ("orders", "get", "/api/cart/orders", {}, set()),
+    ]
+
+
+def explain(sql: str) -> str:
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+        # the same layout as QuerySet.explain()
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def captured_queries(client, method, path, body, headers):
+    """
+    the status and the queries the request ran that EXPLAIN can plan,
+    its writes are rolled back.
+    """
+    kwargs = {} if body is None else dict(headers)
+    if body:
+        kwargs.update(data=json.dumps(body), content_type="application/json")
+    # pinned to the primary, the reads run where EXPLAIN runs and skip the response cache
+    client.cookies[db.PIN_COOKIE] = str(time.time() + 3600)
+    with transaction.atomic(), db.primary(), CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(path, **kwargs)
+        transaction.set_rollback(True)
+    return response.status_code, [query["sql"] for query in queries.captured_queries
+                                  if query["sql"].lstrip().upper().startswith(PLANNED)]
+
+
+def full_scans(plan: str):
+    pattern = POSTGRES_FULL_SCAN if connection.vendor == "postgresql" else SQLITE_FULL_SCAN
+    return set(pattern.findall(plan))
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queries the controllers run and flag the full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--show-plans", action="store_true", help="print every plan")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"query plans of {connection.vendor} are not supported")
+
+        ids = sample_ids()
+        # the cart end-points act as the owner of the sample cart
+        cart = Cart.objects.select_related("user__user").filter(id=ids["cart"]).first()
+        headers = ({"HTTP_AUTHORIZATION": f"Bearer {create_token(cart.user.user)['access']}"}
+                   if cart else {})
+
+        # the mean of every review is cached until rebuild_scores, not computed per request
+        ranking.prior()
+
+        flagged = []
+        client = Client()
+        for name, method, path, body, allowed in controller_requests(ids):
+            status, queries = captured_queries(client, method, path, body, headers)
+            if status != 200:
+                self.stdout.write(self.style.WARNING(
+                    f"{name}: answered {status}, only the queries before the error are checked"))
+
+            plans = [(sql, explain(sql)) for sql in queries]
+            scans = set().union(*(full_scans(plan) for _, plan in plans)) - allowed
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(sorted(scans))}"))
+            else:
+                self.stdout.write(f"{name}: {len(plans)} queries ok")
+            for sql, plan in plans:
+                if options["show_plans"] or full_scans(plan) - allowed:
+                    self.stdout.write(f"  {sql}\n  " + plan.replace("\n", "\n  "))
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} controllers run full table scans")
+        self.stdout.write(self.style.SUCCESS("No unexpected full table scans"))
@@ -0,0 +1,22 @@
+import os
+from django.core.management.base import BaseCommand
+# local models
+from core import documents
+
+
+class Command(BaseCommand):
+    help = "Re-render the pharmacy detail documents served by get_by_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="rendering processes (default: one per CPU)")
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        verbose = options["verbosity"] > 1
+        log = (lambda message: self.stdout.write(message)) if verbose else (lambda message: None)
+
+        written = documents.rebuild_all(batch_size=options["batch_size"],
+                                        workers=options["workers"], log=log)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {written} pharmacy documents"))
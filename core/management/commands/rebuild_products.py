@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+# local models
+from core import products, response_cache
+
+
+class Command(BaseCommand):
+    help = "File every drug under the product of its normalized name and rebuild the price index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = products.rebuild(batch_size=options["batch_size"])
+        # bulk_update skips the signals
+        response_cache.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the price index of {count} products"))
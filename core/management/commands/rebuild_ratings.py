@@ -0,0 +1,33 @@
+import os
+from django.core.management.base import BaseCommand
+# local models
+from core import documents, ranking, response_cache
+from core.models import Pharmacy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized rating aggregates of pharmacies from their reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pharmacy", type=int, nargs="*",
+                            help="ids of the pharmacies to rebuild (default: all)")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="processes rendering the pharmacy documents (default: one per CPU)")
+
+    def handle(self, *args, **options):
+        pharmacies = Pharmacy.objects.all()
+        if options["pharmacy"]:
+            pharmacies = pharmacies.filter(id__in=options["pharmacy"])
+
+        updated = Pharmacy.rebuild_ratings(pharmacies, batch_size=options["batch_size"])
+        # the ratings of the scores come from the aggregates
+        if options["pharmacy"]:
+            ranking.refresh(options["pharmacy"])
+        else:
+            ranking.rebuild(batch_size=options["batch_size"])
+        # bulk_update skips the signals, the documents show the aggregates
+        documents.rebuild_all(pharmacies, workers=options["workers"])
+        response_cache.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates of {updated} pharmacies"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+# local models
+from core import ranking, response_cache
+
+
+class Command(BaseCommand):
+    help = "Recompute the ranking scores of every pharmacy and the mean rating they are pulled to"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = ranking.rebuild(batch_size=options["batch_size"])
+        # the ranked listings are cached
+        response_cache.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the ranking scores of {written} pharmacies"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+# local models
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Create the drug & pharmacy search index and re-index every row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        search.create_index()
+        indexed = search.rebuild_index(batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} drugs and pharmacies"))
@@ -0,0 +1,35 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+# local models
+from core import documents, response_cache
+from core.models import Drug, Pharmacy
+from auth_profile.models import Profile
+from pharmace.utlize import images
+
+
+class Command(BaseCommand):
+    help = "Render the missing image renditions of every pharmacy, drug and profile image"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="rendering threads (default: one per CPU)")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Pharmacy, Drug, Profile):
+            names.update(model.objects.exclude(img="").exclude(img=None)
+                         .values_list("img", flat=True).distinct())
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            digests = list(pool.map(images.render, sorted(names)))
+        failed = digests.count(None)
+
+        # the cached pages and documents were rendered without the new renditions
+        response_cache.invalidate_all()
+        documents.rebuild_all(workers=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {len(names) - failed} images, {len(set(digests) - {None})} distinct"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} images could not be read"))
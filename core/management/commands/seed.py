@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+# local models
+from core.seed import seed_database
+
+
+class Command(BaseCommand):
+    help = ("Generate a synthetic dataset of pharmacies, drugs, reviews and users with bulk inserts, "
+            "the already seeded users and pharmacies are kept")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pharmacies", type=int, default=10)
+        parser.add_argument("--drugs", type=int, default=200,
+                            help="total number of drugs, spread evenly over the pharmacies")
+        parser.add_argument("--reviews", type=int, default=120,
+                            help="total number of reviews, at most one per user and pharmacy")
+        parser.add_argument("--users", type=int, default=12)
+        parser.add_argument("--seed", type=int, default=0,
+                            help="random seed, the same seed gives the same dataset")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        verbose = options["verbosity"] > 1
+        log = (lambda message: self.stdout.write(message)) if verbose else (lambda message: None)
+
+        start = time.perf_counter()
+        result = seed_database(pharmacies=options["pharmacies"],
+                               drugs=options["drugs"],
+                               reviews=options["reviews"],
+                               users=options["users"],
+                               seed=options["seed"],
+                               batch_size=options["batch_size"],
+                               log=log)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {result.users} users, {len(result.created)} pharmacies, "
+            f"{result.drugs} drugs and {result.reviews} reviews "
+            f"in {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,71 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+# local models
+from core.models import Drug, Pharmacy
+from auth_profile.models import Profile
+from pharmace.utlize import images
+
+MODELS = (Pharmacy, Drug, Profile)
+
+
+def listdir(directory):
+    try:
+        return default_storage.listdir(directory)
+    except FileNotFoundError:
+        return [], []
+
+
+class Command(BaseCommand):
+    help = ("Delete the uploaded images no row uses anymore, their renditions, "
+            "and the staged uploads a crashed background task left behind")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age", type=float, default=24,
+                            help="hours a file must be unchanged for before it is deleted, "
+                                 "so uploads still being processed are kept (default 24)")
+        parser.add_argument("--dry-run", action="store_true", help="only list the files")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["min_age"])
+        dry_run = options["dry_run"]
+        used = set()
+        for model in MODELS:
+            used.update(model.objects.exclude(img="").exclude(img=None)
+                        .values_list("img", flat=True).distinct())
+
+        orphans = []
+        for directory in {model._meta.get_field("img").upload_to for model in MODELS}:
+            orphans += [f"{directory}/{name}" for name in listdir(directory)[1]
+                        if f"{directory}/{name}" not in used]
+
+        digests = {images.content_digest(name) for name in used}
+        for shard in listdir(images.DIRECTORY)[0]:
+            orphans += [f"{images.DIRECTORY}/{shard}/{name}"
+                        for name in listdir(f"{images.DIRECTORY}/{shard}")[1]
+                        if name.split("-")[0] not in digests]
+
+        deleted = 0
+        for name in orphans:
+            if default_storage.get_modified_time(name) > cutoff:
+                continue
+            self.stdout.write(name)
+            if not dry_run:
+                default_storage.delete(name)
+            deleted += 1
+
+        staged = 0
+        if os.path.isdir(settings.UPLOAD_STAGING_DIR):
+            for entry in os.scandir(settings.UPLOAD_STAGING_DIR):
+                if entry.is_file() and entry.stat().st_mtime < cutoff.timestamp():
+                    self.stdout.write(entry.path)
+                    if not dry_run:
+                        os.remove(entry.path)
+                    staged += 1
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} orphaned media files and {staged} staged uploads"))
@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Prefetch, Q, Sum
 from django.core.validators import MaxValueValidator, MinValueValidator
+# local
+from pharmace.utlize.geo import Located
 
 
 class Review(models.Model):
@@ -12,11 +15,16 @@ class Review(models.Model):
                                    MaxValueValidator(5),
                                ])
     description = models.CharField(max_length=500, null=True)
-    pharmacy = models.ForeignKey("core.Pharmacy", on_delete=models.CASCADE)
+    # indexed by the (pharmacy, id) index below
+    pharmacy = models.ForeignKey("core.Pharmacy", on_delete=models.CASCADE, db_index=False)
     start_date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ['pharmacy', 'user']
+        indexes = [
+            # reviews of a pharmacy, newest first
+            models.Index(fields=['pharmacy', 'id'], name='review_pharmacy_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} / {self.rating}"
@@ -45,7 +53,21 @@ class OpeningHours(models.Model):
         return u'%s: %s - %s' % (self.get_weekday_display(),
                                  self.from_hour, self.to_hour)
 
-class Pharmacy(models.Model):
+def rating_bucket(rating):
+    """
+    Star bucket (1-5) a rating is counted in,
+    ratings below half a star are not bucketed.
+    """
+    if rating is None or rating < 0.5:
+        return None
+    if rating >= 4.5:
+        return 5
+    return int(rating + 0.5)
+
+
+class Pharmacy(Located):
+    STAR_FIELDS = ['stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+
     name = models.CharField(max_length=100)
     description = models.CharField(max_length=750)
 
@@ -53,6 +75,160 @@ class Pharmacy(models.Model):
     location = models.CharField(max_length=150)
     shipping = models.FloatField(default=0)
 
+    # denormalized review aggregates, maintained by the review
+    # end-points and rebuilt by `manage.py rebuild_ratings`
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    @property
+    def avg_stars(self):
+        if not self.review_count:
+            return 0
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def pct_rates(self):
+        if not self.review_count:
+            return None
+
+        counts = [getattr(self, field) for field in self.STAR_FIELDS]
+        total_count = sum(counts)
+        return {star: round(count / total_count * 100) if total_count else 0
+                for star, count in enumerate(counts, start=1)}
+
+    @classmethod
+    def update_rating(cls, pharmacy_id, old_rating=None, new_rating=None):
+        """
+        Apply a review change to the aggregates with a single UPDATE,
+        pass old_rating=None for a new review and new_rating=None for a deleted one.
+        """
+        changes = {}
+        count_delta = (new_rating is not None) - (old_rating is not None)
+        if count_delta:
+            changes['review_count'] = F('review_count') + count_delta
+
+        sum_delta = (new_rating or 0) - (old_rating or 0)
+        if sum_delta:
+            changes['rating_sum'] = F('rating_sum') + sum_delta
+
+        old_bucket, new_bucket = rating_bucket(old_rating), rating_bucket(new_rating)
+        if old_bucket != new_bucket:
+            if old_bucket:
+                field = f'stars_{old_bucket}'
+                changes[field] = F(field) - 1
+            if new_bucket:
+                field = f'stars_{new_bucket}'
+                changes[field] = F(field) + 1
+
+        if changes:
+            cls.objects.filter(id=pharmacy_id).update(**changes)
+
+    @classmethod
+    def rebuild_ratings(cls, queryset=None, batch_size=500):
+        """
+        Recompute the aggregates of the given pharmacies (all by default)
+        from Review in one grouped query, returns the number of pharmacies updated.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        buckets = {
+            'stars_1': Q(review__rating__gte=0.5, review__rating__lt=1.5),
+            'stars_2': Q(review__rating__gte=1.5, review__rating__lt=2.5),
+            'stars_3': Q(review__rating__gte=2.5, review__rating__lt=3.5),
+            'stars_4': Q(review__rating__gte=3.5, review__rating__lt=4.5),
+            'stars_5': Q(review__rating__gte=4.5),
+        }
+        rows = (queryset.order_by()
+                .values('id')
+                .annotate(agg_count=Count('review'),
+                          agg_sum=Sum('review__rating'),
+                          **{f'agg_{field}': Count('review', filter=condition)
+                             for field, condition in buckets.items()}))
+
+        fields = ['review_count', 'rating_sum', *cls.STAR_FIELDS]
+        updated, pharmacies = 0, []
+        for row in rows:
+            pharmacy = cls(id=row['id'],
+                           review_count=row['agg_count'],
+                           rating_sum=row['agg_sum'] or 0)
+            for field in cls.STAR_FIELDS:
+                setattr(pharmacy, field, row[f'agg_{field}'])
+            pharmacies.append(pharmacy)
+
+            if len(pharmacies) >= batch_size:
+                cls.objects.bulk_update(pharmacies, fields)
+                updated, pharmacies = updated + len(pharmacies), []
+
+        if pharmacies:
+            cls.objects.bulk_update(pharmacies, fields)
+        return updated + len(pharmacies)
+
+    def __str__(self):
+        return self.name
+
+
+class PharmacyDocument(models.Model):
+    """
+    The pre-rendered PharmacyOut JSON of a pharmacy served by get_by_id,
+    kept up to date by core.documents.
+    """
+    pharmacy = models.OneToOneField(Pharmacy, on_delete=models.CASCADE,
+                                    primary_key=True, related_name='document')
+    body = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"document of {self.pharmacy_id}"
+
+
+class PharmacyScore(models.Model):
+    """
+    The ranking scores of a pharmacy the best_rated and most_popular
+    listings are ordered by, kept up to date by core.ranking.
+    """
+    pharmacy = models.OneToOneField(Pharmacy, on_delete=models.CASCADE,
+                                    primary_key=True, related_name='score')
+    # Bayesian average of the reviews, see core.ranking
+    rating = models.FloatField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    # units of its drugs in checked out orders
+    order_volume = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # top-K pharmacies, best rated and most ordered first
+            models.Index(fields=['-rating', 'pharmacy'], name='score_rating_idx'),
+            models.Index(fields=['-order_volume', '-review_count', 'pharmacy'],
+                         name='score_popularity_idx'),
+        ]
+
+    def __str__(self):
+        return f"score of {self.pharmacy_id}"
+
+
+class Product(models.Model):
+    """
+    The drugs of every pharmacy sharing a normalized name, with the price
+    index of their active offers, kept up to date by core.products.
+    """
+    # core.products.normalize of the drug names
+    key = models.CharField(max_length=100, unique=True)
+    # the name of the first drug filed under it
+    name = models.CharField(max_length=100)
+
+    offer_count = models.PositiveIntegerField(default=0)
+    min_price = models.FloatField(null=True)
+    max_price = models.FloatField(null=True)
+    median_price = models.FloatField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
 
@@ -65,8 +241,32 @@ class Drug(models.Model):
     price = models.FloatField()
     is_active = models.BooleanField('is active')
 
+    # indexed by the (pharmacy, id) index below
     pharmacy = models.ForeignKey("core.Pharmacy", 
-                              on_delete=models.CASCADE)
+                              on_delete=models.CASCADE, db_index=False)
+    # set from the name by core.products, indexed by the (product, price) index below
+    product = models.ForeignKey("core.Product", null=True, blank=True, editable=False,
+                                related_name="offers",
+                                on_delete=models.SET_NULL, db_index=False)
+
+    class Meta:
+        indexes = [
+            # the offers of a product, cheapest first
+            models.Index(fields=['product', 'price'], condition=Q(is_active=True),
+                         name='drug_product_price_idx'),
+            # drug pages of a pharmacy, in id order
+            models.Index(fields=['pharmacy', 'id'], name='drug_pharmacy_id_idx'),
+            # the drugs a pharmacy has in stock
+            models.Index(fields=['pharmacy', 'id'], condition=Q(is_active=True),
+                         name='drug_active_pharmacy_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        drug = super().from_db(db, field_names, values)
+        # core.products files the drug again only when its name changed
+        drug._filed_name = drug.__dict__.get('name')
+        return drug
 
     def __str__(self) -> str:
         return self.name
@@ -80,9 +280,15 @@ class DrugItem(models.Model):
     drug = models.ForeignKey("core.Drug", 
                              on_delete=models.CASCADE)
     amount = models.IntegerField()
+    # indexed by the unique (cart, drug) constraint below
     cart = models.ForeignKey("core.Cart", 
                              related_name="item_cart",
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'drug'], name='unique_cart_drug'),
+        ]
 
     @property
     def total(self):
@@ -93,6 +299,17 @@ class DrugItem(models.Model):
         return f"{self.drug} / {self.amount}"
 
 
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        load the carts with their profile, items, drugs and pharmacies
+        in two queries, whatever the number of items.
+        """
+        items = DrugItem.objects.select_related('drug__pharmacy').order_by('id')
+        return (self.select_related('user__user')
+                .prefetch_related(Prefetch('item_cart', queryset=items)))
+
+
 class Cart(models.Model):
     class StatusChoices(models.TextChoices):
         # cart is empty or items in the basket.
@@ -114,9 +331,12 @@ class Cart(models.Model):
 
     start_date = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
     @property
     def items(self):
-        return DrugItem.objects.filter(cart=self).all()
+        # served from the prefetch cache when loaded with `with_items()`
+        return self.item_cart.all()
 
     @property
     def total(self):
@@ -127,6 +347,169 @@ class Cart(models.Model):
 
         return round(total, 2)
 
+    @property
+    def shipping(self):
+        items = self.items
+        if not items:
+            return 0
+        return items[0].drug.pharmacy.shipping
+
+    def increment(self, drug_id, amount=1):
+        """
+        Add `amount` of the drug with a single conditional UPDATE,
+        inserting the item when the cart does not hold the drug yet.
+        returns False if there is no such drug.
+        """
+        items = DrugItem.objects.filter(cart=self, drug_id=drug_id)
+        with transaction.atomic():
+            if items.update(amount=F('amount') + amount):
+                return True
+
+            if not Drug.objects.filter(id=drug_id).exists():
+                return False
+            try:
+                # savepoint, a concurrent request may insert the item first
+                with transaction.atomic():
+                    DrugItem.objects.create(cart=self, drug_id=drug_id, amount=amount)
+            except IntegrityError:
+                items.update(amount=F('amount') + amount)
+        return True
+
+    def apply_deltas(self, deltas):
+        """
+        Apply {drug_id: amount} changes (negative amounts remove) in one transaction,
+        existing items are updated relative to their current amount so
+        concurrent increments are kept, items left with nothing are deleted.
+        returns the ids of unknown drugs, nothing is applied if there are any.
+        """
+        known = set(Drug.objects.filter(id__in=deltas).values_list('id', flat=True))
+        unknown = sorted(set(deltas) - known)
+        if unknown:
+            return unknown
+
+        with transaction.atomic():
+            items = DrugItem.objects.filter(cart=self, drug_id__in=deltas).only('id', 'drug_id')
+            changed = []
+            for item in items:
+                item.amount = F('amount') + deltas[item.drug_id]
+                changed.append(item)
+            DrugItem.objects.bulk_update(changed, ['amount'])
+
+            held = {item.drug_id for item in changed}
+            new = [DrugItem(cart=self, drug_id=drug_id, amount=amount)
+                   for drug_id, amount in deltas.items()
+                   if drug_id not in held and amount > 0]
+            try:
+                # savepoint, a concurrent request may insert one of the items first
+                with transaction.atomic():
+                    DrugItem.objects.bulk_create(new)
+            except IntegrityError:
+                for item in new:
+                    self.increment(item.drug_id, item.amount)
+
+            DrugItem.objects.filter(cart=self, amount__lte=0).delete()
+        return []
+
+    def decrement(self, drug_id, amount=1):
+        """
+        Remove `amount` of the drug, deleting the item in the
+        same transaction when none is left.
+        returns False if the cart does not hold the drug.
+        """
+        items = DrugItem.objects.filter(cart=self, drug_id=drug_id)
+        with transaction.atomic():
+            if not items.update(amount=F('amount') - amount):
+                return False
+            items.filter(amount__lte=0).delete()
+        return True
+
     def __str__(self):
         return f"{self.user.__str__()} cart"
 
+
+
+class Order(models.Model):
+    """
+    Snapshot of a checked out cart,
+    lines keep the name and price the drugs had at checkout.
+    """
+    # indexed by the (user, id) index below
+    user = models.ForeignKey("auth_profile.Profile",
+                             verbose_name=("user_profile"),
+                             related_name="orders",
+                             on_delete=models.CASCADE, db_index=False)
+    status = models.CharField(max_length=15, choices=Cart.StatusChoices.choices,
+                              default=Cart.StatusChoices.PROCESSING)
+    shipping = models.FloatField(default=0)
+    total = models.FloatField()
+
+    start_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # order history of a user, newest first
+            models.Index(fields=['user', 'id'], name='order_user_id_idx'),
+        ]
+
+    @classmethod
+    def from_cart(cls, cart):
+        """
+        Turn the cart items into an order and empty the cart,
+        the cart has to be locked and loaded `with_items()`.
+        returns None if the cart is empty.
+        """
+        items = list(cart.items)
+        if not items:
+            return None
+
+        order = cls.objects.create(user_id=cart.user_id,
+                                   shipping=cart.shipping,
+                                   total=cart.total)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order,
+                      drug=item.drug,
+                      pharmacy_id=item.drug.pharmacy_id,
+                      name=item.drug.name,
+                      price=item.drug.price,
+                      amount=item.amount)
+            for item in items
+        ])
+        # take out only what was copied, an item added or incremented
+        # meanwhile (the items aren't locked) stays in the cart: the items
+        # still holding the copied amount go in one DELETE, the rare others
+        # give back the copied amount
+        copied = Q()
+        for item in items:
+            copied |= Q(id=item.id, amount=item.amount)
+        _, deleted = DrugItem.objects.filter(copied).delete()
+        if deleted.get(DrugItem._meta.label, 0) < len(items):
+            DrugItem.objects.bulk_update([DrugItem(id=item.id, amount=F('amount') - item.amount)
+                                          for item in items], ['amount'])
+            DrugItem.objects.filter(id__in=[item.id for item in items], amount__lte=0).delete()
+
+        return order
+
+    def __str__(self):
+        return f"{self.user} order {self.id}"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey("core.Order",
+                              related_name="lines",
+                              on_delete=models.CASCADE)
+    # kept when the drug or pharmacy is deleted later
+    drug = models.ForeignKey("core.Drug", null=True,
+                             on_delete=models.SET_NULL)
+    pharmacy = models.ForeignKey("core.Pharmacy", null=True,
+                                 on_delete=models.SET_NULL)
+    name = models.CharField(max_length=100)
+    price = models.FloatField()
+    amount = models.IntegerField()
+
+    @property
+    def total(self):
+        total = self.price * self.amount
+        return round(total, 2)
+
+    def __str__(self):
+        return f"{self.name} / {self.amount}"
@@ -0,0 +1,149 @@
+"""
+Canonical products for the price comparison.
+
+Pharmacies file the same drug as their own Drug rows, "Ibuprofen 200mg
+Tablets" here and "ibuprofen 200 mg tablets" there. Every drug is filed
+under the Product of its normalized name, which keeps the number of active
+offers and their min/max/median price, so the cheapest offers of a product
+are one read of the (product, price) index.
+
+The signals in core/signals.py file a drug under its product when it is
+saved and refresh the price index of the products it left or joined once
+the transaction commits, `manage.py rebuild_products` re-files every drug.
+"""
+import re
+import statistics
+import unicodedata
+from typing import Dict, Iterable, List
+
+from django.utils import timezone
+# local models
+from core.models import Drug, Product
+from pharmace import db
+# registers the __prefix lookup
+from pharmace.utlize import lookups  # noqa: F401
+from pharmace.utlize.constant import OFFER_LIMIT, SEARCH_LIMIT
+
+# units glued to the number before them: "200 mg" is "200mg"
+UNITS = {"mg", "g", "mcg", "ug", "ml", "l", "iu", "%"}
+PRICE_FIELDS = ["offer_count", "min_price", "max_price", "median_price", "updated_at"]
+
+
+def normalize(name: str) -> str:
+    """
+    the product key of a drug name: lower case words and numbers, units attached.
+    """
+    name = unicodedata.normalize("NFKC", name).lower()
+    terms: List[str] = []
+    for term in re.findall(r"\d+(?:[.,]\d+)?|[^\W\d_]+|%", name):
+        if term in UNITS and terms and terms[-1][-1].isdigit():
+            terms[-1] += term
+        else:
+            terms.append(term.replace(",", "."))
+    return " ".join(terms)[:Product._meta.get_field("key").max_length]
+
+
+def assign(drug: Drug):
+    """
+    file the (unsaved) drug under the product of its name, created if new,
+    a saved drug keeps its product until its name changes.
+    """
+    if not drug._state.adding and drug.name == getattr(drug, "_filed_name", None):
+        return
+    key = normalize(drug.name)
+    if not key:
+        drug.product = None
+    else:
+        drug.product, _ = Product.objects.get_or_create(key=key, defaults={"name": drug.name})
+    drug._filed_name = drug.name
+
+
+def refresh(product_ids: Iterable[int]):
+    """
+    recompute the price index of the products from their active offers.
+    """
+    prices: Dict[int, List[float]] = {product_id: [] for product_id in product_ids if product_id}
+    if not prices:
+        return
+
+    # the offers were just written, a replica may not have them yet
+    with db.primary():
+        offers = (Drug.objects.filter(product_id__in=list(prices), is_active=True)
+                  .order_by("product_id", "price").values_list("product_id", "price"))
+        for product_id, price in offers:
+            prices[product_id].append(price)
+
+    now = timezone.now()
+    Product.objects.bulk_update([
+        Product(id=product_id, offer_count=len(offered),
+                min_price=offered[0] if offered else None,
+                max_price=offered[-1] if offered else None,
+                median_price=statistics.median(offered) if offered else None,
+                updated_at=now)
+        for product_id, offered in prices.items()
+    ], PRICE_FIELDS)
+
+
+def rebuild(batch_size: int = 2000) -> int:
+    """
+    File every drug under the product of its name and recompute every
+    price index, drops the products left without drugs.
+    returns the number of products.
+    """
+    with db.primary():
+        products = dict(Product.objects.values_list("key", "id"))
+        drugs = Drug.objects.only("id", "name", "product").order_by("id")
+        last_id = 0
+        # keyset batches, SQLite doesn't isolate a cursor from the updates below
+        while True:
+            batch = list(drugs.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            keys = [normalize(drug.name) for drug in batch]
+
+            # the first name seen is the product name
+            new = {}
+            for drug, key in zip(batch, keys):
+                if key and key not in products:
+                    new.setdefault(key, drug.name)
+            if new:
+                Product.objects.bulk_create([Product(key=key, name=name) for key, name in new.items()],
+                                            ignore_conflicts=True)
+                products.update(Product.objects.filter(key__in=new).values_list("key", "id"))
+
+            changed = []
+            for drug, key in zip(batch, keys):
+                if drug.product_id != products.get(key):
+                    drug.product_id = products.get(key)
+                    changed.append(drug)
+            Drug.objects.bulk_update(changed, ["product"])
+
+        Product.objects.filter(offers__isnull=True).delete()
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(product_ids), batch_size):
+        refresh(product_ids[start:start + batch_size])
+    return len(product_ids)
+
+
+""" Queries """
+
+
+def search(query: str, limit: int = SEARCH_LIMIT) -> List[Product]:
+    """
+    the products on offer whose normalized name starts with the query's.
+    """
+    prefix = normalize(query)
+    if not prefix:
+        return []
+    # a read of the unique key index, see pharmace/utlize/lookups.py
+    return list(Product.objects.filter(key__prefix=prefix, offer_count__gt=0)
+                .order_by("key")[:limit])
+
+
+def offers(product_id: int, limit: int = OFFER_LIMIT) -> List[Drug]:
+    """
+    the active offers of the product cheapest first, with their pharmacy and product.
+    """
+    return list(Drug.objects.filter(product_id=product_id, is_active=True)
+                .select_related("pharmacy", "product").order_by("price", "id")[:limit])
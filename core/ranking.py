@@ -0,0 +1,153 @@
+"""
+Pharmacy rankings.
+
+PharmacyScore holds per pharmacy what the best_rated and most_popular
+listings are ordered by, so a ranked listing is one indexed read:
+
+- rating: the Bayesian average of the reviews, the mean rating pulled
+  towards the mean of every review by RATING_PRIOR_WEIGHT phantom reviews,
+  a single 5 star review doesn't outrank hundreds of 4.8s.
+- review_count, order_volume: the reviews, and the units of its drugs in
+  checked out orders.
+
+The signals in core/signals.py refresh the score of a pharmacy when it is
+created or its reviews change (the bulk inserts that skip them call rebuild()),
+checkout adds the ordered units (the cached listings show them once they
+expire, orders don't invalidate them). The prior
+(the mean of every review) is cached and only recomputed by rebuild(),
+run `manage.py rebuild_scores` periodically so the scores follow it.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+# local models
+from core.models import OrderLine, Pharmacy, PharmacyScore
+from pharmace import db
+from pharmace.utlize.constant import RANKING_LIMIT, RATING_PRIOR_WEIGHT
+
+PRIOR_KEY = "ranking:prior"
+
+
+def prior() -> float:
+    """
+    the mean rating of every review.
+    """
+    mean = cache.get(PRIOR_KEY)
+    if mean is None:
+        totals = Pharmacy.objects.aggregate(count=Sum("review_count"), total=Sum("rating_sum"))
+        mean = totals["total"] / totals["count"] if totals["count"] else 0.0
+        cache.set(PRIOR_KEY, mean, None)
+    return mean
+
+
+def bayesian(rating_sum: float, review_count: int, mean: float) -> float:
+    return (RATING_PRIOR_WEIGHT * mean + rating_sum) / (RATING_PRIOR_WEIGHT + review_count)
+
+
+def _save(scores: List[PharmacyScore], fields: List[str]):
+    # one upsert, the fields not listed keep their value
+    PharmacyScore.objects.bulk_create(scores, update_conflicts=True,
+                                      unique_fields=["pharmacy"],
+                                      update_fields=[*fields, "updated_at"])
+
+
+def refresh(pharmacy_ids: Iterable[int]):
+    """
+    recompute the rating of the pharmacies from their review aggregates,
+    creating the missing scores.
+    """
+    # the aggregates were just written, a replica may not have them yet
+    with db.primary():
+        mean = prior()
+        rows = list(Pharmacy.objects.filter(id__in=list(pharmacy_ids)).values_list(
+            "id", "review_count", "rating_sum"))
+    _save([PharmacyScore(pharmacy_id=pharmacy_id, review_count=count,
+                         rating=bayesian(total, count, mean))
+           for pharmacy_id, count, total in rows],
+          ["rating", "review_count"])
+
+
+def record_order(items) -> None:
+    """
+    add the units of the ordered items (DrugItem with their drug)
+    to the order volume of their pharmacies, in one UPDATE.
+    """
+    units: Dict[int, int] = {}
+    for item in items:
+        units[item.drug.pharmacy_id] = units.get(item.drug.pharmacy_id, 0) + item.amount
+    if not units:
+        return
+
+    if _add_units(units) < len(units):
+        # pharmacies created without the signals (bulk_create) have no score yet
+        existing = set(PharmacyScore.objects.filter(pharmacy_id__in=units)
+                       .values_list("pharmacy_id", flat=True))
+        refresh(units)
+        _add_units({pharmacy_id: amount for pharmacy_id, amount in units.items()
+                    if pharmacy_id not in existing})
+
+
+def _add_units(units: Dict[int, int]) -> int:
+    return PharmacyScore.objects.filter(pharmacy_id__in=units).update(
+        order_volume=F("order_volume") + Case(
+            *[When(pharmacy_id=pharmacy_id, then=Value(amount))
+              for pharmacy_id, amount in units.items()],
+            default=Value(0), output_field=IntegerField()))
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """
+    Recompute the prior and every score from the pharmacy aggregates and
+    the order lines, returns the number of scores written.
+    """
+    with db.primary():
+        cache.delete(PRIOR_KEY)
+        mean = prior()
+        volumes = dict(OrderLine.objects.filter(pharmacy__isnull=False).order_by()
+                       .values("pharmacy").annotate(units=Sum("amount"))
+                       .values_list("pharmacy", "units"))
+
+        written, scores = 0, []
+        rows = (Pharmacy.objects.order_by("id").values_list("id", "review_count", "rating_sum")
+                .iterator(chunk_size=batch_size))
+        for pharmacy_id, count, total in rows:
+            scores.append(PharmacyScore(pharmacy_id=pharmacy_id, review_count=count,
+                                        rating=bayesian(total, count, mean),
+                                        order_volume=volumes.get(pharmacy_id, 0)))
+            if len(scores) >= batch_size:
+                _save(scores, ["rating", "review_count", "order_volume"])
+                written, scores = written + len(scores), []
+
+    if scores:
+        _save(scores, ["rating", "review_count", "order_volume"])
+    return written + len(scores)
+
+
+""" Queries """
+
+
+def _ranked(pharmacy_ids: Iterable[int], order: List[str], limit: Optional[int]) -> List[Pharmacy]:
+    """
+    the pharmacies of pharmacy_ids ordered by `order` of their PharmacyScore
+    columns, a read of the index on them. Every pharmacy has a score: the
+    signals create it with the pharmacy and the bulk inserts that skip them
+    (seed) are followed by rebuild(), like `manage.py rebuild_ratings`.
+    """
+    scores = (PharmacyScore.objects.filter(pharmacy_id__in=list(pharmacy_ids))
+              .select_related("pharmacy").order_by(*order, "pharmacy")[:limit])
+    return [score.pharmacy for score in scores]
+
+
+def best_rated(pharmacy_ids: Iterable[int], limit: Optional[int] = RANKING_LIMIT) -> List[Pharmacy]:
+    """
+    the pharmacies of pharmacy_ids with the best Bayesian rating first.
+    """
+    return _ranked(pharmacy_ids, ["-rating"], limit)
+
+
+def most_popular(pharmacy_ids: Iterable[int], limit: Optional[int] = RANKING_LIMIT) -> List[Pharmacy]:
+    """
+    the pharmacies of pharmacy_ids with the most ordered units first, then the most reviewed.
+    """
+    return _ranked(pharmacy_ids, ["-order_volume", "-review_count"], limit)
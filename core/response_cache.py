@@ -0,0 +1,204 @@
+"""
+Response cache of the public catalog end-points.
+
+@cache_response keeps the rendered JSON body of a route in Django's cache
+(settings.CACHES) under the request path plus the version tokens of the data
+it shows. A pharmacy page depends on that pharmacy's version, the listings
+and searches on the catalog version. The signals in core/signals.py replace
+the tokens when a Pharmacy, Drug, Review or OpeningHours row changes, so
+pages rendered from older data are never read again and expire on their own.
+
+Every cached body carries an ETag, a matching If-None-Match gets a 304.
+"""
+import uuid
+import hashlib
+import inspect
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+# local
+from pharmace import db
+from pharmace.metrics import register_cache
+
+PREFIX = "response-cache"
+# bumped by bulk writes that skip the signals (seed, rebuild_ratings)
+ALL_VERSION = f"{PREFIX}:all"
+# bumped by any catalog change, used by listings and searches
+CATALOG_VERSION = f"{PREFIX}:catalog"
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+stats = CacheStats()
+register_cache("response", stats)
+
+
+def pharmacy_version(pharmacy_id) -> str:
+    return f"{PREFIX}:pharmacy:{pharmacy_id}"
+
+
+def _token() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def current_versions(keys) -> str:
+    """
+    the version tokens of `keys` joined, a missing (evicted) token is replaced
+    by a new one rather than restarted so old entries can't match it again.
+    """
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            token = _token()
+            # another process may have set it first
+            tokens[key] = token if cache.add(key, token, None) else cache.get(key, token)
+    return ".".join(tokens[key] for key in keys)
+
+
+async def acurrent_versions(keys) -> str:
+    """
+    current_versions with the async cache API, for the async routes.
+    """
+    tokens = await cache.aget_many(keys)
+    for key in keys:
+        if key not in tokens:
+            token = _token()
+            # another process may have set it first
+            added = await cache.aadd(key, token, None)
+            tokens[key] = token if added else await cache.aget(key, token)
+    return ".".join(tokens[key] for key in keys)
+
+
+def _bump(keys):
+    def bump():
+        cache.set_many({key: _token() for key in keys}, None)
+
+    bump()
+    # a page rendered from the old rows before the commit
+    # is cached under the new tokens, bump again once committed
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def invalidate_pharmacy(pharmacy_id):
+    _bump([pharmacy_version(pharmacy_id), CATALOG_VERSION])
+
+
+def invalidate_all():
+    _bump([ALL_VERSION])
+
+
+def cache_response(pharmacy: str = None, timeout: int = None):
+    """
+    @router.get("get_by_id/{id}", response={200: PharmacyOut, 400: MessageOut})
+    @cache_response(pharmacy="id")
+    def get_by_id(request, id: int):
+        ...
+
+    cache the 200 responses of an anonymous route, `pharmacy` names the path
+    parameter holding the pharmacy id the page depends on, without it the
+    page depends on the whole catalog.
+    """
+    timeout = settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout
+
+    def version_keys(kw):
+        if pharmacy:
+            # the raw path parameter, "05" and "+5" are pharmacy 5 too
+            try:
+                pharmacy_id = int(kw.get(pharmacy))
+            except (TypeError, ValueError):
+                # ninja answers 422, which isn't cached
+                pharmacy_id = kw.get(pharmacy)
+            return [ALL_VERSION, pharmacy_version(pharmacy_id)]
+        return [ALL_VERSION, CATALOG_VERSION]
+
+    def entry_key(request, versions):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f"{PREFIX}:{path}:{versions}"
+
+    def make_entry(response):
+        if response.status_code != 200 or response.streaming:
+            return None
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        return response.content, response["Content-Type"], etag
+
+    def from_entry(request, entry):
+        content, content_type, etag = entry
+        response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def decorator(func):
+        contribute = getattr(func, "_ninja_contribute_to_operation", None)
+
+        def contribute_to_operation(operation):
+            if contribute:
+                contribute(operation)
+            run = operation.run
+
+            @wraps(run)
+            def cached_run(request, **kw):
+                # a client reading its own writes skips the pages rendered from the replicas
+                if request.method != "GET" or db.pinned():
+                    return run(request, **kw)
+
+                key = entry_key(request, current_versions(version_keys(kw)))
+                entry = cache.get(key)
+                if entry is None:
+                    stats.miss()
+                    response = run(request, **kw)
+                    entry = make_entry(response)
+                    if entry is None:
+                        return response
+                    cache.set(key, entry, timeout)
+                else:
+                    stats.hit()
+                return from_entry(request, entry)
+
+            @wraps(run)
+            async def async_cached_run(request, **kw):
+                if request.method != "GET" or db.pinned():
+                    return await run(request, **kw)
+
+                key = entry_key(request, await acurrent_versions(version_keys(kw)))
+                entry = await cache.aget(key)
+                if entry is None:
+                    stats.miss()
+                    response = await run(request, **kw)
+                    entry = make_entry(response)
+                    if entry is None:
+                        return response
+                    await cache.aset(key, entry, timeout)
+                else:
+                    stats.hit()
+                return from_entry(request, entry)
+
+            # operation.is_async is only set after the contributions
+            operation.run = async_cached_run if inspect.iscoroutinefunction(run) else cached_run
+
+        func._ninja_contribute_to_operation = contribute_to_operation
+        return func
+
+    return decorator
@@ -0,0 +1,47 @@
+"""
+Lean review listing.
+
+A page of reviews is one query that joins the reviewer's profile and only
+selects the columns ReviewOut shows, the rows are serialized straight to the
+JSON ReviewOut renders, without building a model instance and a pydantic
+model per review.
+"""
+import json
+from typing import List
+
+from django.core.files.storage import default_storage
+from ninja.responses import NinjaJSONEncoder
+# local models
+from core.models import Review
+from pharmace.utlize import images
+
+# the columns ReviewOut serializes
+FIELDS = ("rating", "description", "start_date", "user__name", "user__img")
+# the same for the listings that keep model instances, select_related("user") with it
+ONLY = ("id", "rating", "description", "start_date", "user", "user__name", "user__img")
+
+
+def rows(pharmacy_id: int):
+    """
+    the reviews of the pharmacy newest first, as dicts of FIELDS, slice it.
+    """
+    return Review.objects.filter(pharmacy=pharmacy_id).order_by("-id").values(*FIELDS)
+
+
+def serialize(row: dict) -> dict:
+    # what ReviewOut gives for the row
+    img = row["user__img"]
+    return {
+        "rating": round(row["rating"], 1),
+        "description": row["description"],
+        "start_date": row["start_date"].date(),
+        "user": {
+            "name": row["user__name"],
+            "img": default_storage.url(img) if img else None,
+            "renditions": images.renditions(img),
+        },
+    }
+
+
+def render(page: List[dict]) -> str:
+    return json.dumps([serialize(row) for row in page], cls=NinjaJSONEncoder)
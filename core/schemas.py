@@ -1,10 +1,11 @@
 from ninja import Schema
-from datetime import date
+from datetime import date, datetime
 from typing import List, Optional
-from django.db.models import Count, Q, Avg
-from django.db.models.functions import Round
 # local models
 from core.models import Drug, Review
+from core.reviews import ONLY as REVIEW_FIELDS
+from pharmace.utlize import images
+from pharmace.metrics import instrumented
 from auth_profile.schemas import ProfileOut
 from pharmace.utlize.constant import DRUG_PER_PAGE, REVIEW_PER_PAGE
 
@@ -17,6 +18,11 @@ class MessageOut(Schema):
 class ProfileReview(Schema):
     name: str
     img: str = None
+    renditions: dict = None
+
+    @staticmethod
+    def resolve_renditions(self):
+        return images.renditions(self.img)
 
 
 class DrugSchema(Schema):
@@ -32,6 +38,42 @@ class DrugIn(DrugSchema):
 
 class DrugOut(DrugSchema):
     id: int
+    # resized copies of img, {size: {"webp": url, "jpeg": url}}
+    renditions: dict = None
+
+    @staticmethod
+    def resolve_renditions(self):
+        return images.renditions(self.img)
+
+
+class ProductOut(Schema):
+    id: int
+    name: str
+    offer_count: int
+    min_price: float = None
+    max_price: float = None
+    median_price: float = None
+
+
+class OfferPharmacy(Schema):
+    id: int
+    name: str
+    location: str
+    shipping: float
+
+
+class OfferOut(Schema):
+    # the drug as the pharmacy lists it
+    id: int
+    name: str
+    price: float
+    pharmacy: OfferPharmacy
+
+
+class ProductOffers(Schema):
+    product: ProductOut
+    # cheapest first
+    offers: List[OfferOut]
 
 
 class ReviewSchema(Schema):
@@ -63,40 +105,31 @@ class PharmacyShort(Schema):
     description: str
     img: str
     location: str
+    latitude: float = None
+    longitude: float = None
 
     avg_stars: float
     pct_rates: dict = None
+    renditions: dict = None
 
     @staticmethod
+    @instrumented
     def resolve_avg_stars(self):
-        avg_rating = self.review_set.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        if avg_rating is None:
-            return 0
-
-        return round(avg_rating, 1)
+        return self.avg_stars
 
     @staticmethod
+    @instrumented
     def resolve_pct_rates(self):
+        return self.pct_rates
 
-        has_reviews = self.review_set.exists()
-
-        if not has_reviews:
-            return
-
-        rating_counts = self.review_set.filter(
-            Q(rating__gte=0.5, rating__lt=1.5) |
-            Q(rating__gte=1.5, rating__lt=2.5) |
-            Q(rating__gte=2.5, rating__lt=3.5) |
-            Q(rating__gte=3.5, rating__lt=4.5) |
-            Q(rating__gte=4.5)
-        ).annotate(rounded_rating=Round('rating')).values('rounded_rating').annotate(count=Count('id'))
+    @staticmethod
+    def resolve_renditions(self):
+        return images.renditions(self.img)
 
-        counts = {rating_count['rounded_rating']: rating_count['count'] for rating_count in rating_counts}
-        total_count = sum(counts.values())
-        percentages = {i: round(counts.get(i, 0) / total_count * 100)
-                       for i in range(1, 6)}
 
-        return percentages
+class PharmacyNearby(PharmacyShort):
+    # km from the searched point, None when searched by the profile address
+    distance: float = None
 
 
 class PharmacySchema(PharmacyShort):
@@ -105,10 +138,12 @@ class PharmacySchema(PharmacyShort):
     opening_hours: List[OpeningHoursSchema]
 
     @staticmethod
+    @instrumented
     def resolve_opening_hours(self):
         return self.opening_hours.all()
 
     @staticmethod
+    @instrumented
     def resolve_drugs(self):
         drugs = Drug.objects.filter(pharmacy=self)[:DRUG_PER_PAGE]
 
@@ -124,8 +159,10 @@ class PharmacyOut(PharmacySchema):
     reviews: List[ReviewOut] = None
 
     @staticmethod
+    @instrumented
     def resolve_reviews(self):
-        return Review.objects.filter(pharmacy=self).order_by("-id")[:REVIEW_PER_PAGE]
+        return (Review.objects.filter(pharmacy=self).select_related("user").only(*REVIEW_FIELDS)
+                .order_by("-id")[:REVIEW_PER_PAGE])
 
 
 """ Cart Schemas """
@@ -139,6 +176,11 @@ class ItemIn(ItemSchema):
     drug_id: int
 
 
+class ItemDelta(Schema):
+    drug_id: int
+    amount: int
+
+
 class ItemOut(ItemSchema):
     drug: DrugOut
     total: float
@@ -148,6 +190,7 @@ class ItemUpdate(ItemOut):
     cart_total: float
 
     @staticmethod
+    @instrumented
     def resolve_cart_total(self):
         total = self.cart.total
         return round(total, 2)
@@ -162,11 +205,9 @@ class CartSchema(Schema):
     total: float
 
     @staticmethod
+    @instrumented
     def resolve_shipping(self):
-        items = self.items
-        if not items:
-            return 0
-        return items[0].drug.pharmacy.shipping
+        return self.shipping
 
 
 class CartIn(CartSchema):
@@ -178,7 +219,29 @@ class CartOut(CartSchema):
 
 
 class Checkout(CartSchema):
-    pass
+    order_id: int = None
+
+
+class OrderLineOut(Schema):
+    drug_id: int = None
+    name: str
+    price: float
+    amount: int
+    total: float
+
+
+class OrderOut(Schema):
+    id: int
+    status: str
+    start_date: datetime
+    shipping: float
+    total: float
+    lines: List[OrderLineOut]
+
+    @staticmethod
+    @instrumented
+    def resolve_lines(self):
+        return self.lines.all()
 
 
 """ Draft Schemas """
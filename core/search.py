@@ -0,0 +1,241 @@
+"""
+Full-text search over Drug.name, Drug.description and Pharmacy.name.
+
+- SQLite: an FTS5 table (`core_search_index`) kept in sync by the
+  signals in core.signals, and rebuilt by `manage.py rebuild_search_index`.
+- Postgres: GIN tsvector expression indexes on the tables themselves,
+  so the database keeps them in sync.
+- Any other backend falls back to the old icontains scan.
+
+Every word of the query is matched as a prefix, results are pharmacy ids
+ranked best first.
+"""
+import re
+from typing import Iterable, List, Optional, Set
+
+from django.db import connections, router
+from django.db.models import Q
+# local models
+from core.models import Drug, Pharmacy
+from pharmace.utlize.constant import SEARCH_LIMIT
+
+FTS_TABLE = "core_search_index"
+# bm25 weights of the FTS columns: pharmacy_id, name, description
+FTS_RANK = "bm25(0.0, 10.0, 1.0)"
+PG_DRUG_VECTOR = "to_tsvector('simple', name || ' ' || description)"
+PG_PHARMACY_VECTOR = "to_tsvector('simple', name)"
+
+
+def _connection(write: bool = False):
+    alias = router.db_for_write(Pharmacy) if write else router.db_for_read(Pharmacy)
+    return connections[alias]
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def _row_id(obj_id: int, is_pharmacy: bool) -> int:
+    # drugs and pharmacies share the FTS rowid space
+    return obj_id * 2 + int(is_pharmacy)
+
+
+""" Index maintenance """
+
+
+def create_index(using: str = "default"):
+    """
+    Create the search index structures, safe to run more than once.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "pharmacy_id UNINDEXED, name, description, "
+                "prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)",
+                           [FTS_RANK])
+        elif connection.vendor == "postgresql":
+            cursor.execute("CREATE INDEX IF NOT EXISTS core_drug_search_idx "
+                           f"ON core_drug USING gin ({PG_DRUG_VECTOR})")
+            cursor.execute("CREATE INDEX IF NOT EXISTS core_pharmacy_search_idx "
+                           f"ON core_pharmacy USING gin ({PG_PHARMACY_VECTOR})")
+
+
+def _uses_fts(connection) -> bool:
+    return connection.vendor == "sqlite"
+
+
+def index_drugs(drugs: Iterable[Drug]):
+    connection = _connection(write=True)
+    if not _uses_fts(connection):
+        return
+    rows = [(_row_id(drug.id, False), drug.pharmacy_id, drug.name, drug.description)
+            for drug in drugs]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT OR REPLACE INTO {FTS_TABLE}"
+                           "(rowid, pharmacy_id, name, description) VALUES (%s, %s, %s, %s)",
+                           rows)
+
+
+def index_pharmacies(pharmacies: Iterable[Pharmacy]):
+    connection = _connection(write=True)
+    if not _uses_fts(connection):
+        return
+    rows = [(_row_id(pharmacy.id, True), pharmacy.id, pharmacy.name, "")
+            for pharmacy in pharmacies]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT OR REPLACE INTO {FTS_TABLE}"
+                           "(rowid, pharmacy_id, name, description) VALUES (%s, %s, %s, %s)",
+                           rows)
+
+
+def remove_drug(drug_id: int):
+    _remove(_row_id(drug_id, False))
+
+
+def remove_pharmacy(pharmacy_id: int):
+    _remove(_row_id(pharmacy_id, True))
+
+
+def _remove(row_id: int):
+    connection = _connection(write=True)
+    if not _uses_fts(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [row_id])
+
+
+def rebuild_index(batch_size: int = 2000) -> int:
+    """
+    Re-index every drug and pharmacy, returns the number of indexed rows.
+    """
+    connection = _connection(write=True)
+    if not _uses_fts(connection):
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    indexed = 0
+    for model, index in ((Pharmacy, index_pharmacies), (Drug, index_drugs)):
+        fields = ["id", "name"] + (["pharmacy", "description"] if model is Drug else [])
+        batch = []
+        for obj in model.objects.only(*fields).order_by("id").iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                index(batch)
+                indexed, batch = indexed + len(batch), []
+        index(batch)
+        indexed += len(batch)
+
+    return indexed
+
+
+""" Queries """
+
+
+def _subquery(queryset, connection):
+    """
+    the SQL and params selecting the ids of a Pharmacy queryset.
+    """
+    return queryset.order_by().values("id").query.get_compiler(connection=connection).as_sql()
+
+
+def search_pharmacy_ids(query: str, limit: Optional[int] = SEARCH_LIMIT,
+                        within=None) -> List[int]:
+    """
+    Ids of the pharmacies with a drug or a name matching the query, best match first,
+    optionally only the ones of `within`, a queryset of pharmacies.
+    limit=None gives every match.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    connection = _connection()
+    # the scope is a subquery of the search, the limit applies to the pharmacies in it
+    scope, scope_params = ("", [])
+    if within is not None and connection.vendor in ("sqlite", "postgresql"):
+        scope, scope_params = _subquery(within, connection)
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        sql = (f"SELECT pharmacy_id, MIN(rank) AS score FROM {FTS_TABLE} "
+               f"WHERE {FTS_TABLE} MATCH %s "
+               + (f"AND pharmacy_id IN ({scope}) " if scope else "") +
+               "GROUP BY pharmacy_id ORDER BY score LIMIT %s")
+        # a negative LIMIT is no limit on SQLite
+        params = [match, *scope_params, -1 if limit is None else limit]
+    elif connection.vendor == "postgresql":
+        match = " & ".join(f"{term}:*" for term in terms)
+        sql = ("SELECT pharmacy_id, MAX(score) AS score FROM ("
+               f"  SELECT pharmacy_id, ts_rank({PG_DRUG_VECTOR}, q) AS score"
+               "   FROM core_drug, to_tsquery('simple', %s) q"
+               f"  WHERE {PG_DRUG_VECTOR} @@ q"
+               + (f"  AND pharmacy_id IN ({scope})" if scope else "") +
+               "  UNION ALL"
+               f"  SELECT id, 10 * ts_rank({PG_PHARMACY_VECTOR}, q)"
+               "   FROM core_pharmacy, to_tsquery('simple', %s) q"
+               f"  WHERE {PG_PHARMACY_VECTOR} @@ q"
+               + (f"  AND id IN ({scope})" if scope else "") +
+               ") hits GROUP BY pharmacy_id ORDER BY score DESC LIMIT %s")
+        params = [match, *scope_params, match, *scope_params, limit]
+    else:
+        pharmacies = Pharmacy.objects.all() if within is None else within
+        return list(pharmacies
+                    .filter(Q(drug__name__icontains=query) | Q(name__icontains=query))
+                    .distinct()
+                    .values_list("id", flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_pharmacies(query: str, queryset=None, limit: int = SEARCH_LIMIT) -> List[Pharmacy]:
+    """
+    Pharmacies matching the query in rank order,
+    optionally restricted to a queryset of pharmacies.
+    """
+    ids = search_pharmacy_ids(query, limit, within=queryset)
+    if queryset is None:
+        queryset = Pharmacy.objects.all()
+
+    pharmacies = queryset.in_bulk(ids)
+    return [pharmacies[pharmacy_id] for pharmacy_id in ids if pharmacy_id in pharmacies]
+
+
+def stocking_pharmacy_ids(query: str, pharmacy_ids: Iterable[int]) -> Set[int]:
+    """
+    The pharmacies of `pharmacy_ids` with an active drug matching the query.
+    """
+    terms = _terms(query)
+    pharmacy_ids = list(pharmacy_ids)
+    if not terms or not pharmacy_ids:
+        return set()
+
+    connection = _connection()
+    placeholders = ", ".join(["%s"] * len(pharmacy_ids))
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        # even rowids are drugs, see _row_id
+        sql = (f"SELECT DISTINCT drug.pharmacy_id FROM {FTS_TABLE} "
+               f"JOIN core_drug drug ON drug.id = {FTS_TABLE}.rowid / 2 "
+               f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid %% 2 = 0 "
+               f"AND drug.is_active AND drug.pharmacy_id IN ({placeholders})")
+        params = [match, *pharmacy_ids]
+    elif connection.vendor == "postgresql":
+        match = " & ".join(f"{term}:*" for term in terms)
+        sql = ("SELECT DISTINCT pharmacy_id FROM core_drug "
+               f"WHERE {PG_DRUG_VECTOR} @@ to_tsquery('simple', %s) "
+               f"AND is_active AND pharmacy_id IN ({placeholders})")
+        params = [match, *pharmacy_ids]
+    else:
+        return set(Drug.objects
+                   .filter(name__icontains=query, is_active=True, pharmacy_id__in=pharmacy_ids)
+                   .values_list("pharmacy_id", flat=True).distinct())
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
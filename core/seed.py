@@ -0,0 +1,214 @@
+"""
+Synthetic dataset generator used by `manage.py seed` and the draft seed end-point.
+
+Rows are generated lazily and written with bulk_create in batches,
+every user shares one pre-computed password hash and
+a seeded RNG makes the same arguments give the same dataset.
+Users and pharmacies are named after their index, the ones that
+already exist are kept as they are so seeding again adds nothing.
+"""
+import random
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterable, List
+
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+# local models
+from core import documents, products, ranking, response_cache, search
+from auth_profile.models import Profile
+from pharmace.utlize import geo, images
+from pharmace.utlize.constant import REVIEW_DESCRIPTION
+from core.models import Cart, Drug, OpeningHours, Pharmacy, Review
+
+User = get_user_model()
+
+PROFILE_IMG = "seed_img/profile.png"
+PHARMACY_IMG = "seed_img/pharmacy_img.jpg"
+DRUG_IMG = "seed_img/drug.png"
+SEED_PASSWORD = "String1@"
+
+PROVINCES = ["Mansour", "Kadhimiya", "Al Jamaa", "Karrada", "Adhamiya", "Zayouna"]
+# rough (latitude, longitude) of each province
+PROVINCE_CENTERS = {
+    "Mansour": (33.3128, 44.3450),
+    "Kadhimiya": (33.3800, 44.3394),
+    "Al Jamaa": (33.2950, 44.3250),
+    "Karrada": (33.3048, 44.4227),
+    "Adhamiya": (33.3717, 44.3807),
+    "Zayouna": (33.3265, 44.4546),
+}
+# degrees around the province center, ~3km
+LOCATION_SPREAD = 0.03
+PHARMACY_NAMES_1 = ["nahr", "Kauthar", "alsiha", "life", "shifa", "noor"]
+PHARMACY_NAMES_2 = ["aldawaa", "alyasameen", "elixer", "dalya", "alamal", "care"]
+DRUG_NAMES = ["Aspirin", "Ibuprofen", "Acetaminophen", "Amoxicillin", "Metformin",
+              "Omeprazole", "Loratadine", "Cetirizine", "Atorvastatin", "Amlodipine",
+              "Azithromycin", "Diclofenac", "Paracetamol", "Salbutamol", "Vitamin C"]
+DRUG_STRENGTHS = ["100mg", "200mg", "250mg", "500mg", "1g"]
+DRUG_FORMS = ["tablets", "capsules", "syrup", "cream", "injection"]
+DRUG_DESCRIPTION = ("Pain relief for headaches, toothaches, menstrual cramps, "
+                    "and other minor aches and pains.")
+# values per `__in` query, under the bound parameters SQLite allows (999 before 3.32)
+LOOKUP_BATCH = 900
+
+
+@dataclass
+class SeedResult:
+    users: int = 0
+    pharmacies: List[int] = field(default_factory=list)
+    # the pharmacies created by this run, the others were already seeded
+    created: List[int] = field(default_factory=list)
+    drugs: int = 0
+    reviews: int = 0
+    profiles: List[int] = field(default_factory=list)
+
+
+def _batches(rows: Iterable, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _bulk_create(model, rows: Iterable, batch_size: int, log: Callable) -> int:
+    created = 0
+    for batch in _batches(rows, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+        log(f"{model.__name__}: {created}")
+    return created
+
+
+def _values_in(queryset, lookup: str, values: List, field: str) -> list:
+    """
+    the `field` of the rows whose `lookup` is one of the values,
+    one query per LOOKUP_BATCH values.
+    """
+    found = []
+    for batch in _batches(values, LOOKUP_BATCH):
+        found.extend(queryset.filter(**{f"{lookup}__in": batch}).values_list(field, flat=True))
+    return found
+
+
+def _location(rng: random.Random, province: str) -> dict:
+    center_lat, center_lon = PROVINCE_CENTERS[province]
+    latitude = round(center_lat + rng.uniform(-LOCATION_SPREAD, LOCATION_SPREAD), 6)
+    longitude = round(center_lon + rng.uniform(-LOCATION_SPREAD, LOCATION_SPREAD), 6)
+    # bulk_create skips Located.save()
+    return dict(latitude=latitude, longitude=longitude, geohash=geo.encode(latitude, longitude))
+
+
+def pharmacy_name(index: int) -> str:
+    return (f"{index} {PHARMACY_NAMES_1[index % len(PHARMACY_NAMES_1)]} "
+            f"{PHARMACY_NAMES_2[index % len(PHARMACY_NAMES_2)]}")
+
+
+def seed_database(pharmacies: int = 10, drugs: int = 200, reviews: int = 120,
+                  users: int = 12, seed: int = 0, batch_size: int = 5000,
+                  log: Callable = lambda message: None) -> SeedResult:
+    """
+    Add `pharmacies` pharmacies with `drugs` drugs and `reviews` reviews spread
+    over them, written by `users` seed users. The seed users and pharmacies
+    are only created if missing, the existing ones keep their drugs and reviews.
+    """
+    rng = random.Random(seed)
+    result = SeedResult()
+    # each pharmacy can get one review per user at most
+    reviews_per_pharmacy = min(reviews // max(pharmacies, 1), users)
+    drugs_per_pharmacy = drugs // max(pharmacies, 1)
+
+    with transaction.atomic():
+        # users, profiles & carts
+        emails = [f"user{i}@example.com" for i in range(users)]
+        existing = set(_values_in(User.objects.all(), "email", emails, "email"))
+        password = make_password(SEED_PASSWORD)
+
+        result.users = _bulk_create(User, (
+            User(email=email, password=password)
+            for email in emails if email not in existing
+        ), batch_size, log)
+        _bulk_create(Profile, (
+            Profile(user_id=email, name="BASBOS", img=PROFILE_IMG,
+                    city="Baghdad", province=province, **_location(rng, province))
+            for email, province in ((email, rng.choice(PROVINCES)) for email in emails)
+            if email not in existing
+        ), batch_size, log)
+
+        result.profiles = sorted(_values_in(Profile.objects.all(), "user_id", emails, "id"))
+        _bulk_create(Cart, (
+            Cart(user_id=profile_id)
+            for profile_id in _values_in(Profile.objects.filter(cart__isnull=True),
+                                         "user_id", emails, "id")
+        ), batch_size, log)
+
+        # pharmacies & opening hours
+        names = [pharmacy_name(i) for i in range(pharmacies)]
+        seeded = set(_values_in(Pharmacy.objects.all(), "name", names, "name"))
+        last_id = Pharmacy.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        _bulk_create(Pharmacy, (
+            Pharmacy(name=name,
+                     description="A family-owned pharmacy that has been serving the community",
+                     location=f"{province} / alroad / cross meshmesha",
+                     img=PHARMACY_IMG,
+                     shipping=rng.choice([0, 2, 3, 5]),
+                     **_location(rng, province))
+            for name, province in ((name, rng.choice(PROVINCES)) for name in names)
+            if name not in seeded
+        ), batch_size, log)
+        result.pharmacies = sorted(_values_in(Pharmacy.objects.all(), "name", names, "id"))
+        result.created = [pharmacy_id for pharmacy_id in result.pharmacies if pharmacy_id > last_id]
+        # the created pharmacies, without their ids as query parameters
+        created = Pharmacy.objects.filter(id__gt=last_id)
+
+        _bulk_create(OpeningHours, (
+            OpeningHours(pharmacy_id=pharmacy_id, weekday=day,
+                         hours="closed" if day == "FRI" else "9:00 AM - 9:00 PM")
+            for pharmacy_id in result.created
+            for day in OpeningHours.DayChoices.values
+        ), batch_size, log)
+
+        # drugs & reviews
+        result.drugs = _bulk_create(Drug, (
+            Drug(name=f"{rng.choice(DRUG_NAMES)} {rng.choice(DRUG_STRENGTHS)} {rng.choice(DRUG_FORMS)}",
+                 description=DRUG_DESCRIPTION,
+                 img=DRUG_IMG,
+                 price=round(rng.uniform(0.5, 60), 2),
+                 is_active=rng.random() > 0.05,
+                 pharmacy_id=pharmacy_id)
+            for pharmacy_id in result.created
+            for _ in range(drugs_per_pharmacy)
+        ), batch_size, log)
+
+        result.reviews = _bulk_create(Review, (
+            Review(user_id=profile_id, pharmacy_id=pharmacy_id,
+                   rating=round(rng.uniform(0.0, 5.0), 1),
+                   description=REVIEW_DESCRIPTION)
+            for pharmacy_id in result.created
+            for profile_id in rng.sample(result.profiles, reviews_per_pharmacy)
+        ), batch_size, log)
+
+        # derived data, bulk_create skips the signals and save()
+        log("rebuilding rating aggregates")
+        Pharmacy.rebuild_ratings(created, batch_size=batch_size)
+        log("filing drugs under products")
+        products.rebuild(batch_size=batch_size)
+        log("rebuilding ranking scores")
+        ranking.rebuild(batch_size=batch_size)
+        log("rebuilding search index")
+        search.rebuild_index(batch_size=batch_size)
+        response_cache.invalidate_all()
+
+    # every seeded row shares these three images, render them before the documents
+    log("rendering image renditions")
+    for name in (PROFILE_IMG, PHARMACY_IMG, DRUG_IMG):
+        images.render(name)
+
+    # after the commit so the documents render the committed rows
+    log("rendering pharmacy documents")
+    documents.rebuild_all(created, workers=1)
+
+    return result
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+# local models
+from core import documents, products, ranking, response_cache, search
+from pharmace.utlize import images
+from auth_profile.models import Profile
+from .models import Drug, OpeningHours, Pharmacy, Review
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    if sender.name == "core":
+        search.create_index(using)
+
+
+""" Search index """
+
+
+@receiver(post_save, sender=Drug)
+def index_drug(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_drugs([instance])
+
+
+@receiver(post_delete, sender=Drug)
+def unindex_drug(sender, instance, **kwargs):
+    search.remove_drug(instance.id)
+
+
+@receiver(post_save, sender=Pharmacy)
+def index_pharmacy(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_pharmacies([instance])
+
+
+@receiver(post_delete, sender=Pharmacy)
+def unindex_pharmacy(sender, instance, **kwargs):
+    search.remove_pharmacy(instance.id)
+
+
+""" Pharmacy documents & response cache """
+
+
+def pharmacy_changed(pharmacy_id):
+    # the document is re-rendered before the cached pages are dropped
+    documents.schedule_rebuild(pharmacy_id)
+    response_cache.invalidate_pharmacy(pharmacy_id)
+
+
+@receiver([post_save, post_delete], sender=Pharmacy)
+def pharmacy_saved(sender, instance, **kwargs):
+    pharmacy_changed(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Drug)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=OpeningHours)
+def pharmacy_content_changed(sender, instance, **kwargs):
+    pharmacy_changed(instance.pharmacy_id)
+
+
+def reviewed_pharmacies_changed(profile_id):
+    # the reviews show the reviewer name and image
+    pharmacies = (Review.objects.filter(user_id=profile_id)
+                  .values_list("pharmacy_id", flat=True).distinct())
+    for pharmacy_id in pharmacies:
+        pharmacy_changed(pharmacy_id)
+
+
+@receiver(post_save, sender=Profile)
+def reviewer_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        reviewed_pharmacies_changed(instance.id)
+
+
+""" Ranking scores """
+
+
+@receiver(post_save, sender=Pharmacy)
+def create_score(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        ranking.refresh([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    # the review end-points update the rating aggregates after saving the review
+    pharmacy_id = instance.pharmacy_id
+    transaction.on_commit(lambda: ranking.refresh([pharmacy_id]))
+
+
+""" Products """
+
+
+@receiver(pre_save, sender=Drug)
+def file_drug(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # the product a renamed drug leaves is refreshed too
+    instance._previous_product_id = instance.product_id
+    products.assign(instance)
+
+
+@receiver([post_save, post_delete], sender=Drug)
+def offer_changed(sender, instance, **kwargs):
+    product_ids = {instance.product_id, getattr(instance, "_previous_product_id", None)}
+    pharmacy_id = instance.pharmacy_id
+
+    def run():
+        products.refresh(product_ids)
+        # the comparison pages cached before the refresh show the old prices
+        response_cache.invalidate_pharmacy(pharmacy_id)
+    transaction.on_commit(run)
+
+
+""" Image renditions """
+
+
+@receiver(post_save, sender=Pharmacy)
+@receiver(post_save, sender=Drug)
+@receiver(post_save, sender=Profile)
+def render_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance.img:
+        return
+    if sender is Profile:
+        on_ready = lambda: reviewed_pharmacies_changed(instance.id)  # noqa: E731
+    else:
+        pharmacy_id = instance.id if sender is Pharmacy else instance.pharmacy_id
+        # the pages rendered meanwhile have no renditions yet
+        on_ready = lambda: pharmacy_changed(pharmacy_id)  # noqa: E731
+    name = instance.img.name
+    transaction.on_commit(lambda: images.schedule(name, on_ready))
@@ -0,0 +1,51 @@
+"""
+Builders of the test fixtures, each test case creates only the rows it uses
+(in setUpTestData when the tests don't need their own copy).
+"""
+from django.contrib.auth import get_user_model
+# local models
+from auth_profile.models import Profile
+from auth_profile.authentication import create_token
+from core.models import Cart, Drug, DrugItem, Pharmacy
+
+User = get_user_model()
+
+
+def create_profile(email: str, name: str = "tester", **fields) -> Profile:
+    # no password hashing, the tests authenticate with tokens
+    user = User.objects.create(email=email, password="!")
+    fields = {"city": "Baghdad", "province": "Mansour", **fields}
+    return Profile.objects.create(user=user, name=name, **fields)
+
+
+def create_customer(email: str, name: str = "customer") -> Profile:
+    """
+    a profile with its (empty) cart.
+    """
+    profile = create_profile(email, name)
+    Cart.objects.create(user=profile)
+    return profile
+
+
+def create_pharmacy(name: str = "nahr aldawaa", **fields) -> Pharmacy:
+    fields = {"description": "pharmacy", "location": "Mansour",
+              "img": "seed_img/pharmacy_img.jpg", **fields}
+    return Pharmacy.objects.create(name=name, **fields)
+
+
+def create_drugs(pharmacy: Pharmacy, count: int, name: str = "Aspirin", price: float = 4.99):
+    """
+    `count` active drugs named "0 Aspirin", "1 Aspirin", ...
+    """
+    return [Drug.objects.create(name=f"{i} {name}", description="Pain relief", price=price,
+                                is_active=True, pharmacy=pharmacy)
+            for i in range(count)]
+
+
+def fill_cart(cart: Cart, drugs, amount: int = 2):
+    DrugItem.objects.filter(cart=cart).delete()
+    DrugItem.objects.bulk_create([DrugItem(cart=cart, drug=drug, amount=amount) for drug in drugs])
+
+
+def auth_headers(profile: Profile) -> dict:
+    return {"HTTP_AUTHORIZATION": f"Bearer {create_token(profile.user)['access']}"}
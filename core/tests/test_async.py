@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import contextmanager
+from unittest import mock
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+# local models
+from core.models import Review
+from core.tests.fixtures import (auth_headers, create_customer, create_drugs, create_pharmacy,
+                                 fill_cart)
+from pharmace.utlize import images
+from auth_profile.authentication import auth_cache
+
+
+@contextmanager
+def blocking_cache_calls():
+    """
+    the sync cache calls made in the event loop, the async API runs them in a thread.
+    """
+    calls = []
+
+    def watch(name):
+        method = getattr(LocMemCache, name)
+
+        def watched(self, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                calls.append((name, args[0]))
+            except RuntimeError:
+                pass
+            return method(self, *args, **kwargs)
+        return mock.patch.object(LocMemCache, name, watched)
+
+    patches = [watch(name) for name in ("get", "set", "add", "get_many", "set_many")]
+    for patch in patches:
+        patch.start()
+    try:
+        yield calls
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class AsyncRouteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_customer("async@example.com")
+        cls.headers = auth_headers(cls.profile)
+        cls.pharmacy = create_pharmacy()
+        fill_cart(cls.profile.cart, create_drugs(cls.pharmacy, 3))
+        Review.objects.create(user=cls.profile, pharmacy=cls.pharmacy, rating=4,
+                              description="good")
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    async def test_async_routes_match_the_sync_ones(self):
+        for path in (f"get_all/1", f"get_by_id/{self.pharmacy.id}",
+                     f"get_druge/{self.pharmacy.id}/1", f"get_reviews/{self.pharmacy.id}",
+                     "search_pharmacy/aspirin"):
+            sync = await self.async_client.get(f"/api/pharmacy/{path}")
+            response = await self.async_client.get(f"/api/async/pharmacy/{path}")
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.json(), sync.json(), path)
+
+        response = await self.async_client.get("/api/async/pharmacy/get_by_id/0")
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_get_cart(self):
+        auth_cache.clear()
+        # the async client takes the headers by name
+        headers = {"Authorization": self.headers["HTTP_AUTHORIZATION"]}
+        response = await self.async_client.get("/api/async/cart/get_cart", headers=headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        sync = await self.async_client.get("/api/cart/get_cart", headers=headers)
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(len(response.json()["items"]), 3)
+
+        response = await self.async_client.get("/api/async/cart/get_cart")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get("/api/async/cart/get_cart",
+                                               headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_routes_use_the_async_cache_api(self):
+        headers = {"Authorization": self.headers["HTTP_AUTHORIZATION"]}
+        # the images rendered by the other tests are looked up again
+        with mock.patch.dict(images._rendered, clear=True), blocking_cache_calls() as calls:
+            # a miss filling the response cache, then a hit
+            for _ in range(2):
+                for path in ("pharmacy/get_all/1", f"pharmacy/get_by_id/{self.pharmacy.id}",
+                             f"pharmacy/get_druge/{self.pharmacy.id}/1",
+                             f"pharmacy/get_reviews/{self.pharmacy.id}",
+                             "pharmacy/search_pharmacy/aspirin"):
+                    response = await self.async_client.get(f"/api/async/{path}")
+                    self.assertEqual(response.status_code, 200, response.content)
+            # the token isn't remembered yet
+            response = await self.async_client.get("/api/async/cart/get_cart", headers=headers)
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(calls, [])
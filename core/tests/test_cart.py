@@ -0,0 +1,196 @@
+import threading
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+# local models
+from core.schemas import CartOut
+from core.models import Cart, DrugItem, Order
+from core.tests.fixtures import (auth_headers, create_customer, create_drugs, create_pharmacy,
+                                 fill_cart)
+from pharmace.utlize.constant import ORDER_PER_PAGE
+from auth_profile.authentication import auth_cache
+
+
+class CartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_customer("cart@example.com", "cart")
+        cls.cart = cls.profile.cart
+        cls.pharmacy = create_pharmacy(shipping=2.5)
+        cls.drugs = create_drugs(cls.pharmacy, 20)
+        cls.headers = auth_headers(cls.profile)
+
+    def setUp(self):
+        auth_cache.clear()
+
+    def fill_cart(self, size):
+        fill_cart(self.cart, self.drugs[:size])
+
+    def count_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries), response.json()
+
+
+class CartQueryCountTests(CartTestCase):
+    def test_get_cart_query_count_is_constant(self):
+        # warm up the authentication cache
+        self.count_queries("get", "/api/cart/get_cart")
+
+        self.fill_cart(1)
+        small_count, small_cart = self.count_queries("get", "/api/cart/get_cart")
+        self.fill_cart(20)
+        big_count, big_cart = self.count_queries("get", "/api/cart/get_cart")
+
+        self.assertEqual(small_count, big_count)
+        self.assertEqual(len(big_cart["items"]), 20)
+        self.assertEqual(big_cart["total"], round(20 * 2 * 4.99, 2))
+        self.assertEqual(big_cart["shipping"], 2.5)
+
+    def test_add_to_cart_query_count_is_constant(self):
+        drug = self.drugs[-1]
+        self.count_queries("post", f"/api/cart/add_increment_to_cart/{drug.id}")
+
+        self.fill_cart(1)
+        small_count, _ = self.count_queries("post", f"/api/cart/add_increment_to_cart/{drug.id}")
+        self.fill_cart(15)
+        big_count, item = self.count_queries("post", f"/api/cart/add_increment_to_cart/{drug.id}")
+
+        self.assertEqual(small_count, big_count)
+        self.assertEqual(item["cart_total"], round(15 * 2 * 4.99 + 4.99, 2))
+
+    def test_with_items_renders_cart_in_two_queries(self):
+        self.fill_cart(20)
+        with self.assertNumQueries(2):
+            cart = Cart.objects.with_items().get(id=self.cart.id)
+            CartOut.from_orm(cart)
+
+
+class CartMutationTests(CartTestCase):
+    def test_increment_and_decrement_to_zero(self):
+        drug = self.drugs[0]
+        for _ in range(3):
+            self.client.post(f"/api/cart/add_increment_to_cart/{drug.id}", **self.headers)
+        self.assertEqual(DrugItem.objects.get(cart=self.cart, drug=drug).amount, 3)
+
+        for _ in range(3):
+            response = self.client.put(f"/api/cart/decrease_from_cart/{drug.id}", **self.headers)
+        self.assertEqual(response.json()["amount"], 0)
+        self.assertFalse(DrugItem.objects.filter(cart=self.cart, drug=drug).exists())
+
+        response = self.client.put(f"/api/cart/decrease_from_cart/{drug.id}", **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_unknown_drug(self):
+        response = self.client.post("/api/cart/add_increment_to_cart/0", **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_update(self):
+        DrugItem.objects.create(cart=self.cart, drug=self.drugs[0], amount=2)
+        DrugItem.objects.create(cart=self.cart, drug=self.drugs[1], amount=1)
+        deltas = [
+            {"drug_id": self.drugs[0].id, "amount": 3},
+            {"drug_id": self.drugs[1].id, "amount": -1},
+            {"drug_id": self.drugs[2].id, "amount": 4},
+            {"drug_id": self.drugs[2].id, "amount": 1},
+        ]
+        response = self.client.post("/api/cart/bulk_update", deltas,
+                                    content_type="application/json", **self.headers)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        amounts = {item["drug"]["id"]: item["amount"] for item in response.json()["items"]}
+        self.assertEqual(amounts, {self.drugs[0].id: 5, self.drugs[2].id: 5})
+
+    def test_bulk_update_unknown_drug_applies_nothing(self):
+        deltas = [{"drug_id": self.drugs[0].id, "amount": 1}, {"drug_id": 0, "amount": 1}]
+        response = self.client.post("/api/cart/bulk_update", deltas,
+                                    content_type="application/json", **self.headers)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(DrugItem.objects.filter(cart=self.cart).exists())
+
+
+class CheckoutTests(CartTestCase):
+    def test_checkout_creates_order_and_empties_cart(self):
+        self.fill_cart(3)
+        response = self.client.put("/api/cart/checkout", **self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["total"], round(3 * 2 * 4.99, 2))
+
+        order = Order.objects.get(id=response.json()["order_id"])
+        self.assertEqual(order.lines.count(), 3)
+        self.assertFalse(DrugItem.objects.filter(cart=self.cart).exists())
+
+        # submitting again does not duplicate the order
+        response = self.client.put("/api/cart/checkout", **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_orders_keyset_pagination(self):
+        for _ in range(ORDER_PER_PAGE + 2):
+            self.fill_cart(1)
+            self.client.put("/api/cart/checkout", **self.headers)
+
+        first = self.client.get("/api/cart/orders", **self.headers).json()
+        second = self.client.get(first["next"], **self.headers).json()
+
+        self.assertEqual(len(first["items"]), ORDER_PER_PAGE)
+        self.assertEqual(len(second["items"]), 2)
+        self.assertIsNone(second["next"])
+        self.assertGreater(first["items"][-1]["id"], second["items"][0]["id"])
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    threads = 8
+    increments = 25
+
+    def setUp(self):
+        self.cart = create_customer("race@example.com", "race").cart
+        [self.drug] = create_drugs(create_pharmacy("life"), 1, price=1)
+
+    def hammer(self, action):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.increments):
+                    action(self.drug.id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.hammer(self.cart.increment)
+
+        item = DrugItem.objects.get(cart=self.cart, drug=self.drug)
+        self.assertEqual(item.amount, self.threads * self.increments)
+
+    def test_concurrent_decrements_delete_once(self):
+        DrugItem.objects.create(cart=self.cart, drug=self.drug,
+                                amount=self.threads * self.increments)
+        self.hammer(self.cart.decrement)
+
+        self.assertFalse(DrugItem.objects.filter(cart=self.cart).exists())
+
+    def test_increment_during_checkout_is_kept(self):
+        DrugItem.objects.create(cart=self.cart, drug=self.drug, amount=2)
+        # the checkout locks the cart, not its items: another request
+        # increments the item after the checkout loaded it
+        cart = Cart.objects.with_items().get(id=self.cart.id)
+        self.hammer(self.cart.increment)
+
+        with transaction.atomic():
+            order = Order.from_cart(cart)
+
+        self.assertEqual(order.lines.get().amount, 2)
+        item = DrugItem.objects.get(cart=self.cart, drug=self.drug)
+        self.assertEqual(item.amount, self.threads * self.increments)
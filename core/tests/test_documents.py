@@ -0,0 +1,64 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+# local models
+from core import documents
+from core.schemas import PharmacyOut
+from core.models import Pharmacy, PharmacyDocument, Review
+from core.tests.fixtures import create_drugs, create_pharmacy, create_profile
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class PharmacyDocumentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile("document@example.com")
+        cls.pharmacy = create_pharmacy()
+        create_drugs(cls.pharmacy, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.url = f"/api/pharmacy/get_by_id/{self.pharmacy.id}"
+
+    def test_get_by_id_is_one_query(self):
+        documents.rebuild_all(workers=1)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), PharmacyOut.from_orm(self.pharmacy).dict())
+
+    def test_missing_document_is_rendered_on_read(self):
+        PharmacyDocument.objects.all().delete()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertTrue(PharmacyDocument.objects.filter(pharmacy=self.pharmacy).exists())
+
+        response = self.client.get("/api/pharmacy/get_by_id/0")
+        self.assertEqual(response.status_code, 400)
+
+    def test_document_follows_the_reviews(self):
+        documents.rebuild_all(workers=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.profile, pharmacy=self.pharmacy, rating=5,
+                                  description="good")
+            Pharmacy.update_rating(self.pharmacy.id, new_rating=5)
+            self.profile.name = "renamed"
+            self.profile.save()
+
+        pharmacy = self.client.get(self.url).json()
+        self.assertEqual(pharmacy["avg_stars"], 5)
+        self.assertEqual(pharmacy["reviews"][0]["user"]["name"], "renamed")
+
+    def test_rebuilt_ratings_are_rendered(self):
+        Review.objects.create(user=self.profile, pharmacy=self.pharmacy, rating=4,
+                              description="good")
+        # written without the aggregates, like an import
+        documents.rebuild_all(workers=1)
+        self.assertEqual(self.client.get(self.url).json()["avg_stars"], 0)
+
+        call_command("rebuild_ratings", "--workers", "1", stdout=StringIO())
+        pharmacy = self.client.get(self.url).json()
+        self.assertEqual(pharmacy["avg_stars"], 4)
+        self.assertEqual(pharmacy["pct_rates"]["4"], 100)
@@ -0,0 +1,96 @@
+import random
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core.models import Drug, Pharmacy
+from core.tests.fixtures import auth_headers, create_drugs, create_pharmacy, create_profile
+from pharmace.utlize import geo
+from pharmace.utlize.lookups import prefix_successor
+from auth_profile.authentication import auth_cache
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class GeoTests(TestCase):
+    # Mansour, Baghdad
+    origin = (33.3128, 44.3450)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile("geo@example.com")
+        cls.headers = auth_headers(cls.profile)
+        cls.pharmacy = create_pharmacy()
+        create_drugs(cls.pharmacy, 1)
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    def place(self, pharmacy, km_north):
+        pharmacy.latitude = self.origin[0] + km_north / geo.KM_PER_DEGREE
+        pharmacy.longitude = self.origin[1]
+        pharmacy.save()
+        return pharmacy
+
+    def test_cover_contains_every_point_in_the_radius(self):
+        rng = random.Random(1)
+        for radius in (0.5, 3, 10, 50):
+            cells = geo.cover(*self.origin, radius)
+            for _ in range(500):
+                lat = self.origin[0] + rng.uniform(-1, 1) * radius / geo.KM_PER_DEGREE
+                lon = self.origin[1] + rng.uniform(-1, 1) * radius / geo.KM_PER_DEGREE
+                if geo.haversine_km(*self.origin, lat, lon) <= radius:
+                    point = geo.encode(lat, lon)
+                    self.assertTrue(any(point.startswith(cell) for cell in cells))
+
+    def test_prefix_successor(self):
+        self.assertEqual(prefix_successor("sv8w"), "sv8x")
+        self.assertEqual(prefix_successor("sv8z"), "sv8{")
+        self.assertEqual(prefix_successor("a\U0010ffff"), "b")
+        self.assertEqual(prefix_successor("a\ud7ff"), "a\ue000")
+        self.assertIsNone(prefix_successor(""))
+
+    def test_prefix_lookup(self):
+        self.place(self.pharmacy, 0)
+        cell = self.pharmacy.geohash[:5]
+        queryset = Pharmacy.objects.filter(geohash__prefix=cell)
+        if connection.vendor == "sqlite":
+            # a range of the geohash index, LIKE can't use it
+            self.assertIn(f'"geohash" < {prefix_successor(cell)}', str(queryset.query))
+        self.assertEqual(list(queryset), [self.pharmacy])
+        self.assertFalse(Pharmacy.objects.filter(geohash__prefix=cell[:-1] + "~").exists())
+
+    def test_nearest_pharmacies_stocking_a_drug(self):
+        near = self.place(self.pharmacy, 1)
+        far = self.place(create_pharmacy("far", location="Karrada", img="img.jpg"), 5)
+        out_of_range = self.place(create_pharmacy("out", location="Karrada", img="img.jpg"), 20)
+        closest = self.place(create_pharmacy("closest", img="img.jpg"), 0.2)
+        for pharmacy in (far, out_of_range):
+            Drug.objects.create(name="Aspirin", description="Pain relief", price=1,
+                                is_active=True, pharmacy=pharmacy)
+        # no active aspirin
+        Drug.objects.create(name="Aspirin", description="Pain relief", price=1,
+                            is_active=False, pharmacy=closest)
+
+        response = self.client.get("/api/pharmacy/nearest/aspirin",
+                                   {"latitude": self.origin[0], "longitude": self.origin[1]})
+        self.assertEqual(response.status_code, 200, response.content)
+        pharmacies = response.json()
+        self.assertEqual([pharmacy["id"] for pharmacy in pharmacies], [near.id, far.id])
+        self.assertAlmostEqual(pharmacies[0]["distance"], 1, places=1)
+
+        response = self.client.get("/api/pharmacy/nearest/aspirin",
+                                   {"latitude": 0, "longitude": 0, "radius": 1000})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_by_profile_location(self):
+        self.place(self.pharmacy, 3)
+        self.profile.latitude, self.profile.longitude = self.origin
+        self.profile.save()
+        self.assertTrue(self.profile.geohash)
+
+        response = self.client.get("/api/pharmacy/search_by_location/aspirin", **self.headers)
+        self.assertEqual([pharmacy["id"] for pharmacy in response.json()], [self.pharmacy.id])
+        response = self.client.get("/api/pharmacy/filter_by_location/nahr", **self.headers)
+        self.assertEqual([pharmacy["id"] for pharmacy in response.json()], [self.pharmacy.id])
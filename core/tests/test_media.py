@@ -0,0 +1,168 @@
+import os
+import json
+import uuid
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from PIL import Image
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+# local models
+from auth_profile.models import Profile
+from auth_profile import profile_images
+from core.models import Drug
+from core.tests.fixtures import auth_headers, create_pharmacy, create_profile
+from pharmace.utlize import images, uploads
+from auth_profile.authentication import auth_cache
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class MediaTestCase(TestCase):
+    # uploads and renditions go to a temporary MEDIA_ROOT
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        cls.staging = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media, UPLOAD_STAGING_DIR=cls.staging)
+        cls.media_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media, ignore_errors=True)
+        shutil.rmtree(cls.staging, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        auth_cache.clear()
+
+    def upload(self, name, mode="RGBA", size=(800, 600), fmt="PNG"):
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 40, 40, 128)[:len(mode)]).save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+class ImageRenditionTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shop = create_pharmacy("shop", location="Karrada")
+
+    def test_upload_is_rendered_at_every_size(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            drug = Drug.objects.create(name="Panadol", description="Pain relief", price=2,
+                                       is_active=True, pharmacy=self.shop,
+                                       img=self.upload("panadol.png"))
+
+        digest = images.rendered_digest(drug.img.name)
+        for size, edge in settings.IMAGE_RENDITIONS.items():
+            for fmt in images.FORMATS:
+                with Image.open(f"{self.media}/{images.rendition_name(digest, size, fmt)}") as image:
+                    self.assertEqual(max(image.size), edge)
+                    self.assertEqual(image.mode, "RGB" if fmt == "jpeg" else "RGBA")
+
+        drugs = self.client.get(f"/api/pharmacy/get_druge/{self.shop.id}/1").json()
+        rendered = next(row for row in drugs if row["id"] == drug.id)
+        self.assertEqual(rendered["renditions"], images.urls(digest))
+        self.assertTrue(rendered["renditions"]["thumb"]["webp"].endswith(f"{digest}-thumb.webp"))
+        # the pre-rendered document was re-rendered with the renditions
+        pharmacy = self.client.get(f"/api/pharmacy/get_by_id/{self.shop.id}").json()
+        self.assertIn(images.urls(digest), [row["renditions"] for row in pharmacy["drugs"]])
+
+    def test_same_content_is_rendered_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = Drug.objects.create(name="a", description="a", price=1, is_active=True,
+                                    pharmacy=self.shop,
+                                    img=self.upload("a.png", mode="RGB"))
+            b = Drug.objects.create(name="b", description="b", price=1, is_active=True,
+                                    pharmacy=self.shop,
+                                    img=self.upload("b.png", mode="RGB"))
+
+        self.assertNotEqual(a.img.name, b.img.name)
+        self.assertEqual(images.rendered_digest(a.img.name), images.rendered_digest(b.img.name))
+
+    def test_unreadable_image_has_no_renditions(self):
+        drug = Drug.objects.create(name="broken", description="", price=1, is_active=True,
+                                   pharmacy=self.shop,
+                                   img=SimpleUploadedFile("broken.png", b"not an image"))
+        self.assertIsNone(images.renditions(drug.img))
+        self.assertIsNone(images.renditions(None))
+
+
+class ProfileImageTests(MediaTestCase):
+    url = "/api/profile/edit_profile"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile("media@example.com", "cart")
+        cls.headers = auth_headers(cls.profile)
+
+    def edit(self, img):
+        profile_in = {"name": "cart", "phone_number": "+9647701234567",
+                      "city": "Baghdad", "province": "Mansour"}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {"profile_in": json.dumps(profile_in), "img": img},
+                                    **self.headers)
+
+    def test_upload_is_re_encoded_in_the_background(self):
+        response = self.edit(self.upload("photo.png", size=(3000, 1500)))
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.profile.refresh_from_db()
+        self.assertIsNone(self.profile.img_upload)
+        self.assertTrue(self.profile.img.name.startswith("profile_imgs/"))
+        with Image.open(self.profile.img.path) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(max(image.size), settings.PROFILE_IMAGE_SIZE)
+        # the staged upload is gone
+        self.assertEqual(os.listdir(self.staging), [])
+
+        first = self.profile.img.path
+        self.assertEqual(self.edit(self.upload("next.jpg", "RGB", fmt="JPEG")).status_code, 200)
+        self.profile.refresh_from_db()
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(self.profile.img.path))
+
+    def test_invalid_and_oversized_uploads_are_refused(self):
+        response = self.edit(SimpleUploadedFile("photo.png", b"not an image"))
+        self.assertEqual(response.status_code, 400)
+
+        with override_settings(MAX_UPLOAD_SIZE=1024):
+            response = self.edit(self.upload("photo.png", size=(1000, 1000)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("larger than", response.json()["detail"])
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.img)
+
+    def test_newer_upload_wins(self):
+        path = uploads.stage(self.upload("old.png"))
+        Profile.objects.filter(id=self.profile.id).update(img_upload=uuid.uuid4())
+        profile_images.process(self.profile.id, uuid.uuid4(), path)
+
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.img)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir(f"{self.media}/profile_imgs"), [])
+
+    def test_sweep_removes_orphans_only(self):
+        self.edit(self.upload("photo.png"))
+        self.profile.refresh_from_db()
+        orphan = f"{self.media}/profile_imgs/orphan.jpg"
+        with open(orphan, "wb") as file:
+            file.write(b"x")
+        staged = f"{self.staging}/crashed"
+        with open(staged, "wb") as file:
+            file.write(b"x")
+
+        call_command("sweep_media", "--dry-run", "--min-age", "0", stdout=StringIO())
+        self.assertTrue(os.path.exists(orphan))
+        call_command("sweep_media", "--min-age", "0", stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(staged))
+        self.assertTrue(os.path.exists(self.profile.img.path))
+        # the renditions of the picture in use are kept
+        digest = images.content_digest(self.profile.img.name)
+        self.assertTrue(os.path.exists(f"{self.media}/{images.rendition_name(digest, 'thumb', 'webp')}"))
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core.tests.fixtures import create_drugs, create_pharmacy
+from pharmace.metrics import registry
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0, METRICS_TOKEN="scraper", METRICS_QUERY_WARNING=0)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = create_pharmacy()
+        create_drugs(cls.pharmacy, 3)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def route(self, fragment, method="GET"):
+        [entry] = [entry for (route, verb), entry in registry.routes.items()
+                   if fragment in route and verb == method]
+        return entry
+
+    def scrape(self, **headers):
+        return self.client.get("/internal/metrics", **headers)
+
+    def test_requests_are_counted_per_route(self):
+        for _ in range(2):
+            self.client.get(f"/api/pharmacy/drugs/{self.pharmacy.id}")
+
+        entry = self.route("drugs/")
+        self.assertEqual(entry["requests"], 2)
+        # the buckets are cumulative, the last one (10 s) holds both
+        self.assertEqual(entry["buckets"][-1], 2)
+        self.assertGreater(entry["queries"], 0)
+        self.assertGreater(entry["bytes"], 0)
+        self.assertEqual(entry["n_plus_one"], 0)
+
+        body = self.scrape(HTTP_AUTHORIZATION="Bearer scraper").content.decode()
+        self.assertIn('pharmace_requests_total{route="api/pharmacy/drugs/', body)
+        self.assertIn("pharmace_db_queries_total", body)
+
+    @override_settings(METRICS_QUERY_WARNING=1)
+    def test_requests_over_the_query_threshold_are_logged(self):
+        with self.assertLogs("pharmace.metrics", "WARNING") as logs:
+            # renders the missing document, a query per part
+            self.client.get(f"/api/pharmacy/get_by_id/{self.pharmacy.id}")
+
+        self.assertIn("GET api/pharmacy/get_by_id/", logs.output[0])
+        self.assertIn("threshold 1", logs.output[0])
+        self.assertEqual(self.route("get_by_id/")["n_plus_one"], 1)
+
+    def test_scrape_needs_the_token(self):
+        self.assertEqual(self.scrape().status_code, 404)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+        # a local address is no proof, behind a proxy every request has one
+        self.assertEqual(self.scrape(REMOTE_ADDR="127.0.0.1").status_code, 404)
+
+        response = self.scrape(HTTP_AUTHORIZATION="Bearer scraper")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer ").status_code, 404)
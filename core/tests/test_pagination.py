@@ -0,0 +1,64 @@
+import json
+from base64 import urlsafe_b64encode
+from django.test import TestCase, override_settings
+# local models
+from core.models import Review
+from core.tests.fixtures import create_drugs, create_pharmacy, create_profile
+from pharmace.utlize.constant import DRUG_PER_PAGE, PHARMACY_PER_PAGE, REVIEW_PER_PAGE
+
+
+def cursor(value):
+    return urlsafe_b64encode(json.dumps({"k": value}).encode()).decode().rstrip("=")
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacies = [create_pharmacy(f"pharmacy {i}") for i in range(PHARMACY_PER_PAGE + 2)]
+        cls.pharmacy = cls.pharmacies[0]
+        cls.drugs = create_drugs(cls.pharmacy, DRUG_PER_PAGE + 3)
+        for i in range(REVIEW_PER_PAGE + 4):
+            Review.objects.create(user=create_profile(f"reviewer{i}@example.com"),
+                                  pharmacy=cls.pharmacy, rating=4, description=f"review {i}")
+
+    def pages(self, url):
+        """
+        the items of every page, following the `next` links.
+        """
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.json()["items"])
+            url = response.json()["next"]
+        return pages
+
+    def test_pharmacies(self):
+        first, last = self.pages("/api/pharmacy/pharmacies")
+        self.assertEqual(len(first), PHARMACY_PER_PAGE)
+        self.assertEqual([pharmacy["id"] for pharmacy in first + last],
+                         [pharmacy.id for pharmacy in self.pharmacies])
+
+    def test_drugs(self):
+        first, last = self.pages(f"/api/pharmacy/drugs/{self.pharmacy.id}")
+        self.assertEqual(len(first), DRUG_PER_PAGE)
+        self.assertEqual([drug["id"] for drug in first + last], [drug.id for drug in self.drugs])
+
+        # the pharmacy without drugs has a single empty page
+        self.assertEqual(self.pages(f"/api/pharmacy/drugs/{self.pharmacies[1].id}"), [[]])
+
+    def test_reviews_newest_first(self):
+        first, last = self.pages(f"/api/pharmacy/reviews/{self.pharmacy.id}")
+        self.assertEqual(len(first), REVIEW_PER_PAGE)
+        self.assertEqual([review["description"] for review in first + last],
+                         [f"review {i}" for i in reversed(range(REVIEW_PER_PAGE + 4))])
+
+    def test_invalid_cursors(self):
+        for route in ("pharmacies", f"drugs/{self.pharmacy.id}", f"reviews/{self.pharmacy.id}"):
+            for invalid in (cursor("zz"), cursor([1]), cursor("1"), cursor(None), cursor(1.5),
+                            "not base64!", urlsafe_b64encode(b"[1]").decode()):
+                response = self.client.get(f"/api/pharmacy/{route}", {"cursor": invalid})
+                self.assertEqual(response.status_code, 400, (route, invalid))
+                self.assertEqual(response.json(), {"detail": "Invalid cursor"})
@@ -0,0 +1,92 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core import products
+from core.models import Drug, Product
+from core.tests.fixtures import create_pharmacy
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class ProductTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.offers = {}
+        with cls.captureOnCommitCallbacks(execute=True):
+            for name, price in (("Ibuprofen 200mg Tablets", 3.0), ("ibuprofen 200 MG tablets", 1.5),
+                                ("IBUPROFEN 200mg, tablets", 2.25), ("Ibuprofen 400mg Tablets", 4.0)):
+                pharmacy = create_pharmacy(f"{price} pharmacy", location="Karrada")
+                cls.offers[price] = Drug.objects.create(name=name, description="Pain relief",
+                                                        price=price, is_active=True, pharmacy=pharmacy)
+        cls.product = cls.offers[3.0].product
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_drug_of_every_pharmacy_is_one_product(self):
+        self.assertEqual(products.normalize("ibuprofen 200 MG tablets"), "ibuprofen 200mg tablets")
+        self.assertEqual({self.offers[price].product_id for price in (3.0, 1.5, 2.25)},
+                         {self.product.id})
+        self.assertNotEqual(self.offers[4.0].product_id, self.product.id)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.offer_count, self.product.min_price,
+                          self.product.max_price, self.product.median_price), (3, 1.5, 3.0, 2.25))
+
+        found = self.client.get("/api/products/search/ibuprofen 200").json()
+        self.assertEqual([product["id"] for product in found], [self.product.id])
+
+    def test_search_matches_every_key_with_the_prefix(self):
+        # the names in scripts beyond the Basic Multilingual Plane sort after "\uffff"
+        for name in ("\U00020000\U00020001 200mg", "\U00020000 500mg"):
+            with self.captureOnCommitCallbacks(execute=True):
+                Drug.objects.create(name=name, description="Pain relief", price=1, is_active=True,
+                                    pharmacy=self.offers[3.0].pharmacy)
+
+        found = self.client.get("/api/products/search/\U00020000").json()
+        self.assertEqual([product["name"] for product in found],
+                         ["\U00020000 500mg", "\U00020000\U00020001 200mg"])
+
+    def test_only_renamed_drugs_are_filed_again(self):
+        drug = Drug.objects.get(id=self.offers[3.0].id)
+        with mock.patch.object(Product.objects, "get_or_create",
+                               wraps=Product.objects.get_or_create) as filing:
+            with self.captureOnCommitCallbacks(execute=True):
+                drug.price, drug.is_active = 2.0, False
+                drug.save()
+            filing.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                drug.name = "Ibuprofen 400mg Tablets"
+                drug.save()
+            filing.assert_called_once()
+        self.assertEqual(drug.product_id, self.offers[4.0].product_id)
+
+    def test_offers_are_price_sorted_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/offers/{self.product.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([offer["price"] for offer in response.json()["offers"]], [1.5, 2.25, 3.0])
+        self.assertEqual(response.json()["product"]["median_price"], 2.25)
+
+        self.assertEqual(self.client.get("/api/products/offers/0").status_code, 404)
+
+    def test_drug_saves_maintain_the_price_index(self):
+        cheapest = self.offers[1.5]
+        with self.captureOnCommitCallbacks(execute=True):
+            # leaves for the 400mg product
+            cheapest.name = "Ibuprofen 400 mg tablets"
+            cheapest.save()
+            self.offers[2.25].is_active = False
+            self.offers[2.25].save()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.offer_count, self.product.min_price), (1, 3.0))
+        other = Product.objects.get(id=self.offers[4.0].product_id)
+        self.assertEqual((other.offer_count, other.min_price, other.median_price), (2, 1.5, 2.75))
+
+        # the rebuild gives the same index
+        products.rebuild()
+        other.refresh_from_db()
+        self.assertEqual((other.offer_count, other.min_price, other.median_price), (2, 1.5, 2.75))
@@ -0,0 +1,38 @@
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+# local models
+from core.models import Review
+from core.tests.fixtures import create_customer, create_drugs, create_pharmacy, fill_cart
+from auth_profile.authentication import auth_cache
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        profile = create_customer("plans@example.com")
+        # close to the point the nearest end-point is checked with
+        pharmacy = create_pharmacy(latitude=33.3128, longitude=44.345)
+        fill_cart(profile.cart, create_drugs(pharmacy, 3))
+        Review.objects.create(user=profile, pharmacy=pharmacy, rating=4, description="good")
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    def test_controller_queries_use_indexes(self):
+        # raises CommandError on a full table scan
+        call_command("check_query_plans", stdout=StringIO())
+
+    def test_full_scans_are_flagged(self):
+        # the name is matched anywhere in it, no index helps
+        scanning = [("filter_by_location", "get", "/api/pharmacy/filter_by_location/nahr", {}, set())]
+        out = StringIO()
+        with mock.patch("core.management.commands.check_query_plans.controller_requests",
+                        return_value=scanning), self.assertRaises(CommandError):
+            call_command("check_query_plans", stdout=out)
+        self.assertIn("filter_by_location: full scan of core_pharmacy", out.getvalue())
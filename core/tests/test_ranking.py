@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core import ranking
+from core.models import Pharmacy, PharmacyScore, Review
+from core.tests.fixtures import (auth_headers, create_customer, create_drugs, create_pharmacy,
+                                 create_profile, fill_cart)
+from pharmace.utlize.constant import SEARCH_LIMIT
+from auth_profile.authentication import auth_cache
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_customer("ranking@example.com")
+        cls.headers = auth_headers(cls.profile)
+        cls.pharmacy = create_pharmacy()
+        cls.drugs = create_drugs(cls.pharmacy, 3)
+        cls.reviewers = [create_profile(f"ranker{i}@example.com", f"ranker {i}")
+                         for i in range(20)]
+        # raw averages 5.0, 4.8 and 2.0, cls.pharmacy has no review
+        cls.lone = cls.reviewed("lone", [5.0])
+        cls.steady = cls.reviewed("steady", [4.8] * 20)
+        cls.poor = cls.reviewed("poor", [2.0] * 10)
+        ranking.rebuild()
+
+    @classmethod
+    def reviewed(cls, name, ratings):
+        pharmacy = create_pharmacy(name, location="Karrada")
+        create_drugs(pharmacy, 1, price=3.5)
+        for reviewer, rating in zip(cls.reviewers, ratings):
+            Review.objects.create(user=reviewer, pharmacy=pharmacy, rating=rating)
+            Pharmacy.update_rating(pharmacy.id, new_rating=rating)
+        return pharmacy
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    def ranked(self, route):
+        response = self.client.get(f"/api/pharmacy/{route}/aspirin")
+        self.assertEqual(response.status_code, 200)
+        return [pharmacy["id"] for pharmacy in response.json()]
+
+    def test_bayesian_rating_outranks_a_single_review(self):
+        expected = [self.steady.id, self.lone.id, self.pharmacy.id, self.poor.id]
+        self.assertEqual(self.ranked("best_rated"), expected)
+        # best rated first, not the lowest
+        self.assertEqual(self.ranked("filter_by_rates"), expected)
+
+        with self.assertNumQueries(1):
+            ranking.best_rated([self.lone.id, self.steady.id])
+
+    def test_bulk_created_pharmacies_are_ranked_after_the_rebuild(self):
+        # bulk_create skips the signal creating the score, the seed rebuilds them
+        [bulk] = Pharmacy.objects.bulk_create([Pharmacy(
+            name="bulk", description="pharmacy", location="Karrada", img="seed_img/pharmacy_img.jpg",
+            review_count=20, rating_sum=20 * 4.9, stars_5=20)])
+        ranking.rebuild()
+        ids = Pharmacy.objects.values_list("id", flat=True)
+
+        self.assertEqual([pharmacy.id for pharmacy in ranking.best_rated(ids)],
+                         [bulk.id, self.steady.id, self.lone.id, self.pharmacy.id, self.poor.id])
+        self.assertEqual([pharmacy.id for pharmacy in ranking.most_popular(ids)],
+                         [self.steady.id, bulk.id, self.poor.id, self.lone.id, self.pharmacy.id])
+
+    def test_filter_by_rates_ranks_every_match(self):
+        # better matches (by their name) than the best rated pharmacy, more than a page
+        for i in range(SEARCH_LIMIT):
+            create_pharmacy(f"aspirin {i}", location="Karrada")
+
+        ranked = self.ranked("filter_by_rates")
+        self.assertEqual(len(ranked), SEARCH_LIMIT)
+        self.assertEqual(ranked[0], self.steady.id)
+
+    def test_checkout_adds_the_order_volume(self):
+        fill_cart(self.profile.cart, self.drugs)
+        self.client.put("/api/cart/checkout", **self.headers)
+
+        score = PharmacyScore.objects.get(pharmacy=self.pharmacy)
+        self.assertEqual(score.order_volume, 6)
+        self.assertEqual(self.ranked("most_popular"),
+                         [self.pharmacy.id, self.steady.id, self.poor.id, self.lone.id])
+
+        # the rebuild finds the same volume in the order lines
+        ranking.rebuild()
+        self.assertEqual(PharmacyScore.objects.get(pharmacy=self.pharmacy).order_volume, 6)
+
+    def test_reviews_refresh_the_score(self):
+        before = PharmacyScore.objects.get(pharmacy=self.lone).rating
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/pharmacy/add_edit_review", {"Pharmacy_id": self.lone.id,
+                             "rating": 0.5, "description": "late"},
+                             content_type="application/json", **self.headers)
+
+        score = PharmacyScore.objects.get(pharmacy=self.lone)
+        self.assertEqual(score.review_count, 2)
+        self.assertAlmostEqual(score.rating, ranking.bayesian(5.5, 2, ranking.prior()))
+        self.assertLess(score.rating, before)
@@ -0,0 +1,154 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core import response_cache
+from core.models import Drug, Pharmacy, Review
+from core.tests.fixtures import create_drugs, create_pharmacy, create_profile
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile("cache@example.com")
+        cls.pharmacy = create_pharmacy()
+        cls.drugs = create_drugs(cls.pharmacy, 2)
+
+    def setUp(self):
+        cache.clear()
+        self.url = f"/api/pharmacy/get_by_id/{self.pharmacy.id}"
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_changes_invalidate_the_pharmacy_pages(self):
+        etag = self.client.get(self.url)["ETag"]
+        listing = self.client.get("/api/pharmacy/get_all/1").json()
+
+        drug = self.drugs[0]
+        drug.name = "Ibuprofen"
+        with self.captureOnCommitCallbacks(execute=True):
+            drug.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Ibuprofen", response.content.decode())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.profile, pharmacy=self.pharmacy, rating=4,
+                                  description="good")
+            Pharmacy.update_rating(self.pharmacy.id, new_rating=4)
+        self.assertNotEqual(self.client.get("/api/pharmacy/get_all/1").json(), listing)
+
+    def test_other_pharmacies_stay_cached(self):
+        other = create_pharmacy("life")
+        self.client.get(self.url)
+        Drug.objects.create(name="Aspirin", description="Pain relief", price=1,
+                            is_active=True, pharmacy=other)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+
+# run the on_commit invalidations and document renders inline
+@override_settings(BACKGROUND_WORKERS=0)
+class ResponseCacheInvalidationTests(TestCase):
+    """
+    a change bumps the version of the pages showing it, the next GET is a miss
+    rendering the change.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = create_profile("invalidation@example.com")
+        cls.pharmacy = create_pharmacy()
+        [cls.drug] = create_drugs(cls.pharmacy, 1)
+        cls.review = Review.objects.create(user=cls.profile, pharmacy=cls.pharmacy, rating=4,
+                                           description="good")
+
+    def setUp(self):
+        cache.clear()
+        self.pharmacy_id = self.pharmacy.id
+        self.url = f"/api/pharmacy/get_by_id/{self.pharmacy.id}"
+
+    def counters(self):
+        return response_cache.stats.hits, response_cache.stats.misses
+
+    def versions(self):
+        # the deleted pharmacy has no id anymore
+        return [cache.get(key) for key in (response_cache.pharmacy_version(self.pharmacy_id),
+                                           response_cache.CATALOG_VERSION)]
+
+    def after(self, change, url=None):
+        """
+        the response to url once `change` committed, checking that it is a miss.
+        """
+        url = url or self.url
+        self.client.get(url)
+        hits, misses = self.counters()
+        cached = self.client.get(url)
+        self.assertEqual(self.counters(), (hits + 1, misses))
+
+        versions = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        # both the pharmacy pages and the listings
+        for old, new in zip(versions, self.versions()):
+            self.assertNotEqual(new, old)
+
+        response = self.client.get(url)
+        self.assertEqual(self.counters(), (hits + 1, misses + 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.content, cached.content)
+        return response.json()
+
+    def test_non_canonical_ids_are_invalidated(self):
+        for padded in (f"0{self.pharmacy.id}", f"+{self.pharmacy.id}"):
+            def rename():
+                self.pharmacy.name = f"renamed {padded}"
+                self.pharmacy.save()
+            with self.subTest(padded):
+                pharmacy = self.after(rename, f"/api/pharmacy/get_by_id/{padded}")
+                self.assertEqual(pharmacy["name"], f"renamed {padded}")
+
+    def test_drug_save(self):
+        def rename():
+            self.drug.name = "Ibuprofen"
+            self.drug.save()
+        pharmacy = self.after(rename)
+        self.assertEqual([drug["name"] for drug in pharmacy["drugs"]], ["Ibuprofen"])
+
+    def test_drug_delete(self):
+        pharmacy = self.after(self.drug.delete)
+        self.assertEqual(pharmacy["drugs"], [])
+
+    def test_pharmacy_save(self):
+        def rename():
+            self.pharmacy.name = "renamed"
+            self.pharmacy.save()
+        self.assertEqual(self.after(rename)["name"], "renamed")
+
+    def test_pharmacy_delete(self):
+        listing = self.after(self.pharmacy.delete, "/api/pharmacy/get_all/1")
+        self.assertEqual(listing, [])
+
+    def test_review_save(self):
+        def edit():
+            self.review.description = "great"
+            self.review.save()
+        pharmacy = self.after(edit)
+        self.assertEqual([review["description"] for review in pharmacy["reviews"]], ["great"])
+
+    def test_review_delete(self):
+        pharmacy = self.after(self.review.delete)
+        self.assertEqual(pharmacy["reviews"], [])
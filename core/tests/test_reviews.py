@@ -0,0 +1,125 @@
+import json
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from ninja.responses import NinjaJSONEncoder
+from core.schemas import ReviewOut
+from core.models import Pharmacy, Review, rating_bucket
+from core.tests.fixtures import auth_headers, create_pharmacy, create_profile
+from pharmace.utlize.constant import REVIEW_PER_PAGE
+from auth_profile.authentication import auth_cache
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class ReviewListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = create_pharmacy()
+        for i in range(12):
+            profile = create_profile(f"reviewer{i}@example.com", f"reviewer {i}",
+                                     img="seed_img/profile.png" if i % 2 else None)
+            Review.objects.create(user=profile, pharmacy=cls.pharmacy, rating=3.25 + i / 10,
+                                  description=f"review {i}")
+
+    def setUp(self):
+        cache.clear()
+        self.url = f"/api/pharmacy/get_reviews/{self.pharmacy.id}"
+
+    def test_page_is_one_query_with_the_schema_json(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        expected = [ReviewOut.from_orm(review).dict() for review in
+                    Review.objects.filter(pharmacy=self.pharmacy).order_by("-id")[:REVIEW_PER_PAGE]]
+        self.assertEqual(response.json(), json.loads(json.dumps(expected, cls=NinjaJSONEncoder)))
+
+        second = self.client.get(f"{self.url}?page_number=2").json()
+        self.assertEqual(len(second), 12 - REVIEW_PER_PAGE)
+
+    def test_empty_and_missing_pharmacies(self):
+        other = create_pharmacy("empty", location="Karrada")
+        self.assertEqual(self.client.get(f"/api/pharmacy/get_reviews/{other.id}").json(), [])
+        self.assertEqual(self.client.get("/api/pharmacy/get_reviews/0").status_code, 400)
+
+    def test_keyset_pages_join_the_reviewer(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/pharmacy/reviews/{self.pharmacy.id}")
+        self.assertEqual(len(response.json()["items"]), REVIEW_PER_PAGE)
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class ReviewAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = create_pharmacy()
+        cls.reviewers = [create_profile(f"aggregate{i}@example.com") for i in range(4)]
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    def review(self, reviewer, rating):
+        return self.client.post("/api/pharmacy/add_edit_review",
+                                {"Pharmacy_id": self.pharmacy.id, "rating": rating,
+                                 "description": "review"},
+                                content_type="application/json", **auth_headers(reviewer))
+
+    def aggregates(self):
+        """
+        the stored aggregates and the ones computed from the reviews.
+        """
+        pharmacy = Pharmacy.objects.get(id=self.pharmacy.id)
+        stored = {field: getattr(pharmacy, field)
+                  for field in ["review_count", "rating_sum", *Pharmacy.STAR_FIELDS]}
+        ratings = list(Review.objects.filter(pharmacy=self.pharmacy)
+                       .values_list("rating", flat=True))
+        fresh = {"review_count": len(ratings), "rating_sum": sum(ratings),
+                 **{f"stars_{stars}": [rating_bucket(rating) for rating in ratings].count(stars)
+                    for stars in range(1, 6)}}
+        return stored, fresh
+
+    def test_review_changes_maintain_the_aggregates(self):
+        for reviewer, rating in zip(self.reviewers, [5, 4.4, 1, 3]):
+            self.assertEqual(self.review(reviewer, rating).status_code, 200)
+        stored, fresh = self.aggregates()
+        self.assertEqual(stored, fresh)
+        self.assertEqual((stored["review_count"], stored["rating_sum"]), (4, 13.4))
+        self.assertEqual([stored[field] for field in Pharmacy.STAR_FIELDS], [1, 0, 1, 1, 1])
+
+        # an edit moves the rating to another bucket
+        self.assertEqual(self.review(self.reviewers[1], 2).status_code, 200)
+        stored, fresh = self.aggregates()
+        self.assertEqual(stored, fresh)
+        self.assertEqual([stored[field] for field in Pharmacy.STAR_FIELDS], [1, 1, 1, 0, 1])
+
+        response = self.client.delete(f"/api/pharmacy/delet_review/{self.pharmacy.id}",
+                                      **auth_headers(self.reviewers[0]))
+        self.assertEqual(response.status_code, 200)
+        stored, fresh = self.aggregates()
+        self.assertEqual(stored, fresh)
+        self.assertEqual((stored["review_count"], stored["rating_sum"], stored["stars_5"]), (3, 6, 0))
+
+    def test_rebuild_agrees_with_the_reviews(self):
+        for reviewer, rating in zip(self.reviewers, [0.5, 2.6, 4.5, 4.9]):
+            self.review(reviewer, rating)
+        Pharmacy.objects.filter(id=self.pharmacy.id).update(review_count=0, rating_sum=0, stars_5=7)
+
+        self.assertEqual(Pharmacy.rebuild_ratings(), 1)
+        stored, fresh = self.aggregates()
+        self.assertEqual(stored, fresh)
+
+    def test_concurrent_first_reviews_are_refused(self):
+        self.assertEqual(self.review(self.reviewers[0], 4).status_code, 200)
+        # the other request created the review after this one looked for it
+        with mock.patch.object(Review.objects, "select_for_update",
+                               return_value=Review.objects.none()):
+            response = self.review(self.reviewers[0], 1)
+
+        self.assertEqual(response.status_code, 400)
+        stored, fresh = self.aggregates()
+        self.assertEqual(stored, fresh)
+        self.assertEqual(stored["rating_sum"], 4)
@@ -0,0 +1,80 @@
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+# local models
+from core import search
+from core.models import Drug, Pharmacy
+from core.tests.fixtures import auth_headers, create_pharmacy, create_profile
+from auth_profile.authentication import auth_cache
+
+
+def stock(pharmacy, name, description="Pain relief"):
+    return Drug.objects.create(name=name, description=description, price=1, is_active=True,
+                               pharmacy=pharmacy)
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # the drug name weighs more than its description, see FTS_RANK
+        cls.named = create_pharmacy("named", location="Karrada")
+        stock(cls.named, "Aspirin 100mg")
+        cls.described = create_pharmacy("described", location="Karrada")
+        stock(cls.described, "Cardio", "aspirin for the heart")
+        cls.other = create_pharmacy("other", location="Karrada")
+        stock(cls.other, "Ibuprofen 200mg")
+
+    def setUp(self):
+        cache.clear()
+        auth_cache.clear()
+
+    def test_search_index_is_fts5_on_sqlite(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("the FTS5 index is SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} "
+                           "MATCH %s", ['"aspirin"*'])
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(search.search_pharmacy_ids("aspirin"), [self.named.id, self.described.id])
+        # a pharmacy name is a match too
+        self.assertEqual(search.search_pharmacy_ids("other"), [self.other.id])
+
+    def test_every_word_is_a_prefix(self):
+        self.assertEqual(search.search_pharmacy_ids("asp"), [self.named.id, self.described.id])
+        self.assertEqual(search.search_pharmacy_ids("ibu 200"), [self.other.id])
+        self.assertEqual(search.search_pharmacy_ids("ibu 400"), [])
+        self.assertEqual(search.search_pharmacy_ids("!!"), [])
+
+    def test_drug_changes_are_indexed(self):
+        drug = stock(self.other, "Paracetamol")
+        self.assertEqual(search.search_pharmacy_ids("paracet"), [self.other.id])
+        drug.delete()
+        self.assertEqual(search.search_pharmacy_ids("paracet"), [])
+
+    def test_scope_applies_before_the_limit(self):
+        # better matches outside of the scope don't take its place in the limit
+        for i in range(5):
+            stock(create_pharmacy(f"mansour {i}"), "Aspirin")
+        karrada = Pharmacy.objects.filter(location="Karrada")
+
+        self.assertNotIn(self.described.id, search.search_pharmacy_ids("aspirin", limit=5))
+        self.assertEqual(search.search_pharmacy_ids("aspirin", limit=2, within=karrada),
+                         [self.named.id, self.described.id])
+        self.assertEqual([pharmacy.id for pharmacy in
+                          search.search_pharmacies("aspirin", karrada, limit=2)],
+                         [self.named.id, self.described.id])
+
+    def test_search_by_profile_address(self):
+        for i in range(5):
+            stock(create_pharmacy(f"mansour {i}", location="Mansour"), "Aspirin")
+        profile = create_profile("search@example.com", city="Karrada", province="Karrada")
+
+        response = self.client.get("/api/pharmacy/search_by_location/aspirin",
+                                   **auth_headers(profile))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([pharmacy["id"] for pharmacy in response.json()],
+                         [self.named.id, self.described.id])
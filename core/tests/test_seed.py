@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+# local models
+from auth_profile.models import Profile
+from core.models import Cart, Drug, OpeningHours, Pharmacy, Review
+from core.seed import seed_database
+
+User = get_user_model()
+
+
+# render the image renditions in the request, not in the background
+@override_settings(BACKGROUND_WORKERS=0)
+class SeedTests(TestCase):
+    # the renditions of the seed images go to a temporary MEDIA_ROOT
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(settings.MEDIA_ROOT, "seed_img"),
+                        os.path.join(cls.media, "seed_img"))
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media)
+        cls.media_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return {model.__name__: model.objects.count()
+                for model in (Profile, Cart, Pharmacy, OpeningHours, Drug, Review)}
+
+    def rows(self):
+        return {
+            "profiles": list(Profile.objects.order_by("user_id")
+                             .values_list("user_id", "province", "latitude", "longitude")),
+            "pharmacies": list(Pharmacy.objects.order_by("name")
+                               .values_list("name", "location", "shipping", "latitude", "longitude")),
+            "drugs": sorted(Drug.objects.values_list("pharmacy__name", "name", "price", "is_active")),
+            "reviews": sorted(Review.objects.values_list("pharmacy__name", "user__user_id", "rating")),
+        }
+
+    def seed(self, **options):
+        call_command("seed", pharmacies=3, drugs=12, reviews=6, users=4, stdout=StringIO(), **options)
+
+    def test_seeding_twice_adds_nothing(self):
+        self.seed()
+        counts = self.counts()
+        self.assertEqual(counts, {"Profile": 4, "Cart": 4, "Pharmacy": 3, "OpeningHours": 21,
+                                  "Drug": 12, "Review": 6})
+
+        # another seed gives other rows, not more of them
+        self.seed(seed=1)
+        self.assertEqual(self.counts(), counts)
+
+    def test_missing_pharmacies_are_added(self):
+        first = seed_database(pharmacies=2, drugs=4, reviews=2, users=2)
+        second = seed_database(pharmacies=3, drugs=6, reviews=3, users=2)
+
+        self.assertEqual(second.pharmacies[:2], first.pharmacies)
+        self.assertEqual(second.created, second.pharmacies[2:])
+        self.assertEqual((second.users, second.drugs, second.reviews), (0, 2, 1))
+        self.assertEqual(self.counts(), {"Profile": 2, "Cart": 2, "Pharmacy": 3, "OpeningHours": 21,
+                                         "Drug": 6, "Review": 3})
+        # the aggregates of the added pharmacy are built, the others kept
+        for pharmacy in Pharmacy.objects.all():
+            self.assertEqual(pharmacy.review_count, pharmacy.review_set.count())
+
+    def test_same_seed_gives_the_same_rows(self):
+        self.seed(seed=7)
+        rows = self.rows()
+        User.objects.all().delete()
+        Pharmacy.objects.all().delete()
+
+        # the existing rows are looked up a few names per query too
+        with mock.patch("core.seed.LOOKUP_BATCH", 2):
+            self.seed(seed=7)
+        self.assertEqual(self.rows(), rows)
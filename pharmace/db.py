@@ -0,0 +1,225 @@
+"""
+Database routing and connection setup.
+
+ReplicaRouter (settings.DATABASE_ROUTERS) sends the reads of the catalog
+models to the read replicas of settings.DATABASES (the "replica_*" aliases),
+everything else, and every write, goes to "default". Without replicas it
+routes everything to "default".
+
+Replicas lag behind the primary, so a client that just wrote reads its own
+writes from the primary: ReadYourWritesMiddleware pins the rest of a request
+to the primary once it writes, and the client's next requests for
+settings.REPLICA_PIN_SECONDS, remembered in a cookie and, for the API clients
+without cookies, in a cache key of their Authorization header.
+
+SQLite connections are switched to WAL on connect so readers don't wait for
+the writer and the writer doesn't fsync on every commit.
+"""
+import time
+import random
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+
+# the read-only catalog the public end-points show
+CATALOG_MODELS = {"pharmacy", "drug", "review", "openinghours", "pharmacydocument",
+                  "pharmacyscore", "product"}
+
+PIN_COOKIE = "pin_primary"
+PIN_CACHE_PREFIX = "pin-primary"
+
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    # durable at the checkpoints, safe against corruption with WAL
+    "PRAGMA synchronous = NORMAL",
+    # wait for the write lock instead of failing with "database is locked"
+    "PRAGMA busy_timeout = 5000",
+    # 20 MB page cache, temporary tables in memory, 128 MB memory map
+    "PRAGMA cache_size = -20000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 134217728",
+]
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return
+    # on the driver connection: not a query of the request being measured
+    for pragma in SQLITE_PRAGMAS:
+        connection.connection.execute(pragma)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+
+class Pin:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# the pin of the current request, None outside of requests
+_pin: ContextVar[Optional[Pin]] = ContextVar("pin", default=None)
+# in an unpinned_writes() block
+_unpinned: ContextVar[bool] = ContextVar("unpinned", default=False)
+
+
+def pinned() -> bool:
+    """
+    whether the reads of the current request go to the primary.
+    """
+    pin = _pin.get()
+    return pin is not None and pin.pinned
+
+
+@contextmanager
+def primary():
+    """
+    read from the primary in the block, for the work that renders what was just written.
+    """
+    pin = _pin.get()
+    if pin is None:
+        token = _pin.set(Pin(pinned=True))
+        try:
+            yield
+        finally:
+            _pin.reset(token)
+        return
+
+    previous, pin.pinned = pin.pinned, True
+    try:
+        yield
+    finally:
+        pin.pinned = previous or pin.wrote
+
+
+@contextmanager
+def unpinned_writes():
+    """
+    writes in the block don't pin the client to the primary, for the rows a read
+    fills in (a missing pharmacy document) the client doesn't need to read back.
+    """
+    token = _unpinned.set(True)
+    try:
+        yield
+    finally:
+        _unpinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or model._meta.model_name not in CATALOG_MODELS or pinned():
+            return "default"
+        # reads inside a transaction must see its writes
+        if connections["default"].in_atomic_block:
+            return "default"
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        pin = _pin.get()
+        if pin is not None and not _unpinned.get():
+            # the rest of the request, and the client's next ones, read their writes
+            pin.pinned = pin.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the schema from the primary through replication
+        return not db.startswith("replica_")
+
+
+class ReadYourWritesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+
+        pin = Pin(pinned=self.recently_wrote(request))
+        token = _pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin.reset(token)
+        self.remember(request, response, pin)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+
+        pin = Pin(pinned=await self.arecently_wrote(request))
+        token = _pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin.reset(token)
+        await self.aremember(request, response, pin)
+        return response
+
+    @staticmethod
+    def cache_key(request) -> Optional[str]:
+        authorization = request.headers.get("Authorization")
+        if not authorization:
+            return None
+        return f"{PIN_CACHE_PREFIX}:{hashlib.md5(authorization.encode()).hexdigest()}"
+
+    @staticmethod
+    def cookie_pinned(request) -> bool:
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def recently_wrote(self, request) -> bool:
+        key = self.cache_key(request)
+        return self.cookie_pinned(request) or bool(key and cache.get(key))
+
+    async def arecently_wrote(self, request) -> bool:
+        key = self.cache_key(request)
+        return self.cookie_pinned(request) or bool(key and await cache.aget(key))
+
+    @staticmethod
+    def set_cookie(response):
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+                            httponly=True, samesite="Lax")
+
+    def remember(self, request, response, pin):
+        if pin.wrote:
+            self.set_cookie(response)
+            key = self.cache_key(request)
+            if key:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+    async def aremember(self, request, response, pin):
+        if pin.wrote:
+            self.set_cookie(response)
+            key = self.cache_key(request)
+            if key:
+                await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
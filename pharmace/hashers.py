@@ -0,0 +1,26 @@
+"""
+Password hashers, see PASSWORD_HASHERS in settings.py.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with the costs of settings.ARGON2_*, Django's defaults (100 MB,
+    8 lanes per hash) are more than a burst of sign ins can afford.
+    The hashes keep the "argon2" prefix and carry their costs, the ones made
+    with other costs are re-hashed on the next sign in.
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with settings.PBKDF2_ITERATIONS rounds, the hasher when
+    argon2-cffi is not installed. The hashes carry their rounds, the ones
+    made with others are re-hashed on the next sign in.
+    """
+    iterations = settings.PBKDF2_ITERATIONS
@@ -0,0 +1,281 @@
+"""
+Per-route request metrics exported in the Prometheus text format.
+
+MetricsMiddleware times every request and counts its database queries
+(through an execute wrapper on every connection) and response size, labelled by
+the route pattern. Schema resolvers decorated with @instrumented get
+their own calls, time and queries so N+1 resolvers show up per route.
+"""
+import hmac
+import time
+import logging
+import threading
+from contextvars import ContextVar
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.dispatch import receiver
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        # resolver name -> [calls, seconds, queries]
+        self.resolvers = defaultdict(lambda: [0, 0.0, 0])
+        self.resolver = None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+class Registry:
+    """
+    Thread-safe counters of the process, labelled by (route, method).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = defaultdict(lambda: {
+                "requests": 0, "seconds": 0.0, "queries": 0, "query_seconds": 0.0,
+                "bytes": 0, "n_plus_one": 0, "buckets": [0] * len(DURATION_BUCKETS),
+            })
+            self.resolvers = defaultdict(lambda: [0, 0.0, 0])
+
+    def record(self, route, method, seconds, stats, size, n_plus_one):
+        with self._lock:
+            entry = self.routes[(route, method)]
+            entry["requests"] += 1
+            entry["seconds"] += seconds
+            entry["queries"] += stats.queries
+            entry["query_seconds"] += stats.query_time
+            entry["bytes"] += size
+            entry["n_plus_one"] += n_plus_one
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+
+            for name, (calls, spent, queries) in stats.resolvers.items():
+                resolver = self.resolvers[(route, name)]
+                resolver[0] += calls
+                resolver[1] += spent
+                resolver[2] += queries
+
+    def render(self) -> str:
+        """
+        the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            resolvers = sorted(self.resolvers.items())
+
+            def route_samples(key):
+                return [({"route": route, "method": method}, entry[key])
+                        for (route, method), entry in routes]
+
+            metric("pharmace_requests_total", "counter", "Requests handled.",
+                   route_samples("requests"))
+
+            name = "pharmace_request_duration_seconds"
+            lines.append(f"# HELP {name} Request wall time.")
+            lines.append(f"# TYPE {name} histogram")
+            for (route, method), entry in routes:
+                labels = {"route": route, "method": method}
+                for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {entry['requests']}")
+                lines.append(f"{name}_sum{_labels(labels)} {entry['seconds']}")
+                lines.append(f"{name}_count{_labels(labels)} {entry['requests']}")
+
+            metric("pharmace_db_queries_total", "counter", "Database queries run by requests.",
+                   route_samples("queries"))
+            metric("pharmace_db_query_seconds_total", "counter", "Time spent in database queries.",
+                   route_samples("query_seconds"))
+            metric("pharmace_response_bytes_total", "counter", "Response body bytes.",
+                   route_samples("bytes"))
+            metric("pharmace_n_plus_one_total", "counter",
+                   "Requests over the METRICS_QUERY_WARNING query threshold.",
+                   route_samples("n_plus_one"))
+
+            metric("pharmace_resolver_calls_total", "counter", "Schema resolver calls.",
+                   [({"route": route, "resolver": name}, values[0])
+                    for (route, name), values in resolvers])
+            metric("pharmace_resolver_seconds_total", "counter", "Time spent in schema resolvers.",
+                   [({"route": route, "resolver": name}, values[1])
+                    for (route, name), values in resolvers])
+            metric("pharmace_resolver_db_queries_total", "counter",
+                   "Database queries run by schema resolvers.",
+                   [({"route": route, "resolver": name}, values[2])
+                    for (route, name), values in resolvers])
+
+        for name, cache in _caches.items():
+            stats = cache.stats()
+            metric(f"pharmace_{name}_cache_hits_total", "counter", f"{name} cache hits.",
+                   [({}, stats["hits"])])
+            metric(f"pharmace_{name}_cache_misses_total", "counter", f"{name} cache misses.",
+                   [({}, stats["misses"])])
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return f"{{{text}}}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+# in-process caches with hit/miss counters exported with the metrics
+_caches = {}
+
+
+def register_cache(name, cache):
+    _caches[name] = cache
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+        if stats.resolver:
+            stats.resolvers[stats.resolver][2] += 1
+
+
+def instrumented(func):
+    """
+    Count the calls, time and queries of a schema resolver in the request metrics,
+    a returned queryset is evaluated here so its queries count for the resolver.
+    """
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return func(*args, **kwargs)
+
+        outer, stats.resolver = stats.resolver, name
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, QuerySet):
+                result = list(result)
+            return result
+        finally:
+            entry = stats.resolvers[name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+            stats.resolver = outer
+
+    return wrapper
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # on every connection rather than per request, the async views
+    # run their queries on connections of the sync_to_async threads
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, "METRICS_QUERY_WARNING", 0)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, seconds):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "<unmatched>"
+        if response.streaming:
+            size = int(response.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+
+        n_plus_one = bool(self.threshold) and stats.queries > self.threshold
+        if n_plus_one:
+            breakdown = ", ".join(f"{name}={queries}"
+                                  for name, (_, _, queries) in stats.resolvers.items())
+            logger.warning("%s %s ran %d queries (threshold %d) resolvers: %s",
+                           request.method, route, stats.queries, self.threshold,
+                           breakdown or "-")
+
+        registry.record(route, request.method, seconds, stats, size, int(n_plus_one))
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape end-point, only served to the requests with settings.METRICS_TOKEN,
+    behind a proxy every request comes from a local address.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not token or not hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+        raise Http404()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
@@ -5,8 +5,10 @@ from django.conf import settings
 from django.contrib import admin
 from django.conf.urls.static import static
 # local models
+from pharmace.metrics import metrics_view
 from pharmace.utlize.constant import DESCRIPTION
-from core.controllers import pharmacy_router, cart_router, draft_router
+from core.controllers import pharmacy_router, product_router, cart_router, draft_router
+from core.async_controllers import async_pharmacy_router, async_cart_router
 from auth_profile.controllers import auth_controller, profile_controller
 
 api = NinjaAPI(title="pharmace Backend", 
@@ -15,11 +17,16 @@ api.add_router("auth", auth_controller, tags=["Auth"])
 api.add_router("profile", profile_controller, tags=["Profile"])
 # 
 api.add_router("pharmacy", pharmacy_router, tags=["Pharmacy"])
+api.add_router("products", product_router, tags=["Products"])
 api.add_router("cart", cart_router, tags=["Cart"])
 api.add_router("draft", draft_router, tags=["Draft"])
+# async variants of the read end-points, for ASGI servers
+api.add_router("async/pharmacy", async_pharmacy_router, tags=["Pharmacy (async)"])
+api.add_router("async/cart", async_cart_router, tags=["Cart (async)"])
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', api.urls),
+    path('internal/metrics', metrics_view),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
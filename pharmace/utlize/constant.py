@@ -15,5 +15,22 @@ related to authentication, user profiles, pharmacies, drugs, and shopping cart m
 PHARMACY_PER_PAGE = 6
 DRUG_PER_PAGE = 15
 REVIEW_PER_PAGE = 10
+ORDER_PER_PAGE = 10
 REVIEW_DESCRIPTION="Lorem ipsum dolor sit amet consectetur adipiscing, elit morbi nostra\
 torquent eu accumsan, scelerisque ornare cum penatibus varius."
+SEARCH_LIMIT = 60
+# authentication cache: token -> profile
+AUTH_CACHE_SIZE = 4096
+AUTH_CACHE_TTL = 300
+# nearby pharmacies, km
+NEARBY_RADIUS_KM = 10
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_LIMIT = 30
+# pharmacy rankings
+RANKING_LIMIT = 20
+# search matches ranked by score
+RANKING_CANDIDATES = 1000
+# phantom reviews at the mean rating added to every pharmacy
+RATING_PRIOR_WEIGHT = 10
+# price comparison
+OFFER_LIMIT = 50
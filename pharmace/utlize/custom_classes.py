@@ -1,4 +1,16 @@
 # import libraries
+import json
+import time
+import binascii
+import threading
+from collections import OrderedDict
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial, wraps
+from typing import Any, List, Optional
+from ninja import Schema
+from ninja.errors import HttpError
+from ninja.pagination import PaginationBase, make_response_paginated
+from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 # import files
 from dataclasses import dataclass
@@ -12,3 +24,160 @@ class Error:
     def __str__(self) -> str:
         return f"{self.status}: {self.message}"
 
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache,
+    holds at most `maxsize` entries, each one expires `ttl` seconds after it was set.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate) -> int:
+        """
+        remove every entry where predicate(key, value) is true,
+        returns the number of removed entries.
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class CursorPagination(PaginationBase):
+    """
+    Keyset pagination on a single unique field (`id` or `-id`),
+    each page filters past the last seen key instead of using an offset,
+    so deep pages cost the same as the first one.
+    """
+    class Input(Schema):
+        cursor: str = None
+
+    class Output(Schema):
+        items: List[Any]
+        next: Optional[str] = None
+
+    def __init__(self, ordering: str = "id", page_size: int = 20, **kwargs: Any) -> None:
+        self.ordering = ordering
+        self.field = ordering.lstrip("-")
+        self.descending = ordering.startswith("-")
+        self.page_size = page_size
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def encode_cursor(value: Any) -> str:
+        raw = json.dumps({"k": value}).encode()
+        return urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Any:
+        try:
+            raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            return json.loads(raw)["k"]
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise HttpError(400, "Invalid cursor")
+
+    def cursor_value(self, queryset, cursor: str) -> Any:
+        """
+        the key of the cursor, it has to be a value of the ordering field
+        as encoded in the `next` link (an int for `id`, not "1" or [1]).
+        """
+        value = self.decode_cursor(cursor)
+        field = queryset.model._meta.get_field(self.field)
+        try:
+            if value is None or isinstance(value, (bool, list, dict)) \
+                    or field.to_python(value) != value:
+                raise ValidationError("wrong type")
+        except ValidationError:
+            raise HttpError(400, "Invalid cursor")
+        return value
+
+    def paginate_queryset(self, queryset, pagination: Input, request=None, **params):
+        queryset = queryset.order_by(self.ordering)
+        if pagination.cursor:
+            lookup = "lt" if self.descending else "gt"
+            last = self.cursor_value(queryset, pagination.cursor)
+            queryset = queryset.filter(**{f"{self.field}__{lookup}": last})
+
+        # fetch one extra row to know if there is a next page
+        items = list(queryset[:self.page_size + 1])
+        next_link = None
+        if len(items) > self.page_size:
+            items = items[:self.page_size]
+            cursor = self.encode_cursor(getattr(items[-1], self.field))
+            next_link = self.next_link(request, cursor)
+
+        return {"items": items, "next": next_link}
+
+    @staticmethod
+    def next_link(request, cursor: str) -> str:
+        if request is None:
+            return f"?cursor={cursor}"
+        query = request.GET.copy()
+        query["cursor"] = cursor
+        return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+
+def cursor_paginate(ordering: str = "id", page_size: int = 20):
+    """
+    @router.get(..., response={200: List[SomeSchema], 400: MessageOut})
+    @cursor_paginate("-id", page_size=10)
+    def my_view(request):
+        return queryset
+
+    like ninja's @paginate, but the paginator gets the request to build
+    the `next` link and (status, message) error tuples are returned untouched.
+    """
+    paginator = CursorPagination(ordering=ordering, page_size=page_size)
+
+    def decorator(func):
+        @wraps(func)
+        def view_with_pagination(request, **kwargs):
+            pagination = kwargs.pop("ninja_pagination")
+            result = func(request, **kwargs)
+            if isinstance(result, tuple):
+                return result
+            return paginator.paginate_queryset(result, pagination, request=request)
+
+        view_with_pagination._ninja_contribute_args = [
+            ("ninja_pagination", paginator.Input, paginator.InputSource),
+        ]
+        view_with_pagination._ninja_contribute_to_operation = partial(
+            make_response_paginated, paginator)
+        return view_with_pagination
+
+    return decorator
@@ -0,0 +1,129 @@
+"""
+Geohash bucketing of latitude/longitude without PostGIS.
+
+Located models store a geohash of their coordinates in an indexed column,
+`nearby` reads the cells covering the search circle with prefix range scans
+on that index and keeps the rows inside the radius by haversine distance.
+"""
+# import libraries
+import math
+from typing import List, Optional
+from django.db import models
+from django.db.models import Q
+from django.core.validators import MaxValueValidator, MinValueValidator
+# local, registers the __prefix lookup
+from pharmace.utlize import lookups  # noqa: F401
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, char, even = [], 0, 0, True
+    while len(geohash) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        char <<= 1
+        if value >= mid:
+            char |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[char])
+            bits, char = 0, 0
+    return "".join(geohash)
+
+
+def cell_size(precision: int):
+    """
+    (height, width) of a geohash cell in degrees.
+    """
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def cover(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """
+    geohash prefixes of the cells covering the circle: the center cell and its
+    8 neighbours at the longest precision whose cells are at least radius_km wide.
+    """
+    # a degree of longitude shrinks towards the poles, size for the widest case
+    max_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.9)
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(candidate)
+        if (height * KM_PER_DEGREE >= radius_km
+                and width * KM_PER_DEGREE * math.cos(math.radians(max_lat)) >= radius_km):
+            precision = candidate
+            break
+
+    height, width = cell_size(precision)
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            lat = max(min(latitude + d_lat * height, 89.999999), -89.999999)
+            lon = (longitude + d_lon * width + 180) % 360 - 180
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+class Located(models.Model):
+    """
+    latitude/longitude with the geohash column `nearby` searches,
+    the geohash is set by save(), set it yourself with bulk_create.
+    """
+    latitude = models.FloatField(null=True, blank=True,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=GEOHASH_PRECISION, blank=True, default="",
+                               db_index=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def has_location(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+    def save(self, *args, **kwargs):
+        self.geohash = encode(self.latitude, self.longitude) if self.has_location else ""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
+
+
+def nearby(queryset, latitude: float, longitude: float, radius_km: float,
+           limit: Optional[int] = None) -> list:
+    """
+    rows of a Located queryset within radius_km of the point, nearest first,
+    each one with its `distance` in km.
+    """
+    cells = Q()
+    for prefix in cover(latitude, longitude, radius_km):
+        # a read of the geohash index, see pharmace/utlize/lookups.py
+        cells |= Q(geohash__prefix=prefix)
+
+    found = []
+    for row in queryset.filter(cells):
+        row.distance = round(haversine_km(latitude, longitude, row.latitude, row.longitude), 3)
+        if row.distance <= radius_km:
+            found.append(row)
+    found.sort(key=lambda row: row.distance)
+    return found[:limit] if limit else found
+
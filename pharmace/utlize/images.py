@@ -0,0 +1,197 @@
+"""
+Resized renditions of the uploaded images.
+
+Every image is rendered at each size of settings.IMAGE_RENDITIONS, as WebP and
+as JPEG for the clients without WebP, and stored under MEDIA_ROOT/renditions/
+by the sha256 of its content: an image used by many rows is rendered once and
+a rendition file never changes, it can be cached forever in front of /media/.
+
+Saved uploads are rendered by the background task queue (core.signals),
+`renditions` gives the URLs the schemas expose and schedules the images it
+has not seen rendered yet, it returns None until they are.
+"""
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from typing import Callable, Dict, Iterable, Optional
+
+from PIL import Image, ImageOps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+# local
+from pharmace.utlize import tasks
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = "renditions"
+# format -> (extension, Pillow format, save options)
+FORMATS = {
+    "webp": ("webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+CACHE_PREFIX = "image-rendition"
+# image names kept in the in-process map of rendered images
+MEMO_SIZE = 10000
+
+# image name -> digest of its content, for the images already rendered
+_rendered: Dict[str, str] = {}
+_pending = set()
+_failed = set()
+_lock = threading.Lock()
+
+
+def rendition_name(digest: str, size: str, fmt: str) -> str:
+    extension = FORMATS[fmt][0]
+    return f"{DIRECTORY}/{digest[:2]}/{digest}-{size}.{extension}"
+
+
+def _cache_key(name: str) -> str:
+    return f"{CACHE_PREFIX}:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def _remember(name: str, digest: str):
+    with _lock:
+        if len(_rendered) >= MEMO_SIZE:
+            _rendered.clear()
+        _rendered[name] = digest
+
+
+def rendered_digest(name: str) -> Optional[str]:
+    """
+    the content digest of a rendered image, None if it was not rendered yet.
+    """
+    digest = _rendered.get(name)
+    if digest is None:
+        digest = cache.get(_cache_key(name))
+        if digest is not None:
+            _remember(name, digest)
+    return digest
+
+
+async def aprefetch(images: Iterable):
+    """
+    look the images (ImageField values or names) up with the async cache API,
+    the async views call it before returning so the schemas' `renditions`
+    find them rendered without a blocking cache read in the event loop.
+    """
+    names = {getattr(image, "name", image) for image in images} - {None, ""}
+    missing = [name for name in names if name not in _rendered]
+    if not missing:
+        return
+    found = await cache.aget_many([_cache_key(name) for name in missing])
+    for name in missing:
+        digest = found.get(_cache_key(name))
+        if digest is not None:
+            _remember(name, digest)
+        else:
+            await sync_to_async(schedule)(name)
+
+
+def content_digest(name: str) -> Optional[str]:
+    """
+    the sha256 of the image, None if it can't be read.
+    """
+    digest = rendered_digest(name)
+    if digest is None:
+        try:
+            with default_storage.open(name, "rb") as source:
+                digest = hashlib.sha256(source.read()).hexdigest()
+        except OSError:
+            return None
+    return digest
+
+
+def _save(image: Image.Image, edge: int, fmt: str, path: str):
+    _, pillow_format, options = FORMATS[fmt]
+    resized = image.copy()
+    # keeps the aspect ratio and never upscales
+    resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+    if fmt == "jpeg" and resized.mode != "RGB":
+        # flatten the transparency on white
+        rgba = resized.convert("RGBA")
+        resized = Image.new("RGB", rgba.size, "white")
+        resized.paste(rgba, mask=rgba.getchannel("A"))
+    elif resized.mode not in ("RGB", "RGBA"):
+        resized = resized.convert("RGBA")
+
+    buffer = BytesIO()
+    resized.save(buffer, pillow_format, **options)
+    saved = default_storage.save(path, ContentFile(buffer.getvalue()))
+    if saved != path:
+        # another worker rendered the same content meanwhile
+        default_storage.delete(saved)
+
+
+def render(name: str) -> Optional[str]:
+    """
+    render the missing renditions of the image stored under `name`,
+    returns the digest of its content or None if it can't be read.
+    """
+    try:
+        with default_storage.open(name, "rb") as source:
+            data = source.read()
+        digest = hashlib.sha256(data).hexdigest()
+        missing = [(size, edge, fmt)
+                   for size, edge in settings.IMAGE_RENDITIONS.items() for fmt in FORMATS
+                   if not default_storage.exists(rendition_name(digest, size, fmt))]
+        if missing:
+            image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+            for size, edge, fmt in missing:
+                _save(image, edge, fmt, rendition_name(digest, size, fmt))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("cannot render the image %s: %s", name, e)
+        with _lock:
+            _failed.add(name)
+        return None
+
+    cache.set(_cache_key(name), digest, None)
+    _remember(name, digest)
+    return digest
+
+
+def schedule(name: str, on_ready: Callable = None):
+    """
+    render the image in the background, `on_ready` is called
+    from the worker once it is rendered.
+    """
+    if not name or rendered_digest(name) is not None:
+        return
+    with _lock:
+        if name in _pending or name in _failed:
+            return
+        _pending.add(name)
+
+    def run():
+        try:
+            if render(name) and on_ready:
+                on_ready()
+        finally:
+            with _lock:
+                _pending.discard(name)
+
+    tasks.submit(run)
+
+
+def urls(digest: str) -> dict:
+    return {size: {fmt: default_storage.url(rendition_name(digest, size, fmt)) for fmt in FORMATS}
+            for size in settings.IMAGE_RENDITIONS}
+
+
+def renditions(image) -> Optional[dict]:
+    """
+    {size: {"webp": url, "jpeg": url}} of an ImageField value or image name,
+    None while the image is not rendered yet.
+    """
+    name = getattr(image, "name", image)
+    if not name:
+        return None
+    digest = rendered_digest(name)
+    if digest is None:
+        schedule(name)
+        # rendered already when BACKGROUND_WORKERS is 0
+        digest = _rendered.get(name)
+    return urls(digest) if digest else None
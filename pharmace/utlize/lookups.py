@@ -0,0 +1,50 @@
+"""
+Query helpers.
+
+`field__prefix=value` matches the values starting with a prefix with a read
+of the field's index, unlike `startswith` on SQLite, whose LIKE can't use a
+plain index: there it is the range [prefix, successor), exact since SQLite
+compares text by code point (the BINARY collation). Elsewhere it is
+`startswith`, Postgres compares by the column's collation, where a range
+bound by code point isn't a prefix match (under a linguistic collation "{"
+doesn't sort after the letters), and LIKE 'prefix%' reads the
+varchar_pattern_ops index Django adds to the indexed CharFields.
+"""
+import sys
+from typing import Optional
+
+from django.db.models import CharField, Lookup
+from django.db.models.lookups import StartsWith
+
+# the code points a str can hold but UTF-8 can't encode
+SURROGATES = range(0xD800, 0xE000)
+
+
+def prefix_successor(prefix: str) -> Optional[str]:
+    """
+    the smallest string sorting after every string that starts with `prefix`
+    (in code point order): the prefix with its last character incremented,
+    None when there is none (an empty prefix, or only the last code point).
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if code in SURROGATES:
+        code = SURROGATES.stop
+    return prefix[:-1] + chr(code)
+
+
+@CharField.register_lookup
+class Prefix(Lookup):
+    lookup_name = "prefix"
+
+    def as_sql(self, compiler, connection):
+        return StartsWith(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        successor = prefix_successor(self.rhs)
+        if successor is None:
+            return f"{lhs} >= %s", [*lhs_params, self.rhs]
+        return f"{lhs} >= %s AND {lhs} < %s", [*lhs_params, self.rhs, *lhs_params, successor]
@@ -0,0 +1,74 @@
+"""
+Token bucket rate limits kept in the cache (settings.CACHES).
+
+Every key of a scope (a client address, an account) has a bucket of `burst`
+tokens refilled at settings.RATE_LIMITS[scope] requests per minute, a request
+takes a token or is answered 429 with a Retry-After, before the view runs.
+A bucket is one cache entry, shared by the workers when the cache is (Redis,
+CACHE_DIR). Reading and writing it is not atomic: concurrent requests of one
+key may take the same token, a burst overshoots by at most its concurrency.
+"""
+import time
+import hashlib
+from math import ceil
+from functools import wraps
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+PREFIX = "rate-limit"
+
+
+def client_ip(request, **kwargs) -> str:
+    header = settings.CLIENT_IP_HEADER
+    if header and request.META.get(header):
+        # the last address is the one our proxy appended, the others are the client's word
+        return request.META[header].split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def take(key: str, per_minute: float, burst: int) -> float:
+    """
+    take a token of the bucket, returns 0 or the seconds until the next token.
+    """
+    rate = per_minute / 60
+    now = time.time()
+    tokens, stamp = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+
+    # a bucket left alone until it is full is the same as no bucket
+    cache.set(key, (tokens - 1, now), ceil(burst / rate) + 1)
+    return 0
+
+
+def rate_limit(scope: str, key: Callable[..., Optional[str]] = client_ip):
+    """
+    @router.post("signin", response={200: AuthOut, 429: MessageOut})
+    @rate_limit("auth")
+    def signin(request, acount_in: SigninIn):
+        ...
+
+    limit the view to settings.RATE_LIMITS[scope] = (requests per minute, burst)
+    per `key(request, **view_kwargs)`, the client address by default.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            per_minute, burst = settings.RATE_LIMITS[scope]
+            ident = key(request, **kwargs)
+            if ident is not None:
+                digest = hashlib.md5(ident.encode()).hexdigest()
+                wait = take(f"{PREFIX}:{scope}:{digest}", per_minute, burst)
+                if wait:
+                    response = JsonResponse({"detail": "Too many requests, try again later"},
+                                            status=429)
+                    response["Retry-After"] = str(ceil(wait))
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+    return decorator
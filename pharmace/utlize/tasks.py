@@ -0,0 +1,48 @@
+"""
+Local background task queue.
+
+`submit` runs a function on a pool of settings.BACKGROUND_WORKERS threads,
+for the work that should not hold a request: image renditions and the
+re-encoding of uploaded pictures. With BACKGROUND_WORKERS = 0 the function
+runs right away in the caller, the tests rely on that.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS,
+                                           thread_name_prefix="background")
+        return _executor
+
+
+def submit(func: Callable, *args):
+    inline = settings.BACKGROUND_WORKERS <= 0
+
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("background task %s failed", getattr(func, "__name__", func))
+        finally:
+            if not inline:
+                # the worker threads outlive the requests, don't keep their connections
+                connections.close_all()
+
+    if inline:
+        run()
+    else:
+        _pool().submit(run)
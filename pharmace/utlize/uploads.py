@@ -0,0 +1,63 @@
+"""
+Streamed, size-limited uploads.
+
+LimitedUploadHandler (settings.FILE_UPLOAD_HANDLERS) writes every uploaded
+file to a temporary file chunk by chunk, so a large photo never sits in the
+worker's memory, and drops a file as soon as it grows over
+settings.MAX_UPLOAD_SIZE instead of after the whole body was read. The views
+see a dropped file as missing, `rejected` tells them why.
+
+`stage` moves an accepted upload out of the request's temporary file into
+settings.UPLOAD_STAGING_DIR for its background processing.
+"""
+import os
+import uuid
+import shutil
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            self.file.close()
+            if not hasattr(self.request, "rejected_uploads"):
+                self.request.rejected_uploads = set()
+            self.request.rejected_uploads.add(self.field_name)
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def rejected(request, field_name: str) -> bool:
+    """
+    whether the file of `field_name` was dropped for being over MAX_UPLOAD_SIZE.
+    """
+    return field_name in getattr(request, "rejected_uploads", ())
+
+
+def max_size_mb() -> float:
+    return round(settings.MAX_UPLOAD_SIZE / 1024 / 1024, 1)
+
+
+def stage(upload) -> str:
+    """
+    move the uploaded file to the staging directory, returns its new path,
+    the caller removes it once processed.
+    """
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    path = os.path.join(settings.UPLOAD_STAGING_DIR, uuid.uuid4().hex)
+    if hasattr(upload, "temporary_file_path"):
+        # a rename when both are on the same file system
+        file_move_safe(upload.temporary_file_path(), path)
+    else:
+        upload.seek(0)
+        with open(path, "wb") as staged:
+            shutil.copyfileobj(upload, staged)
+    return path
@@ -81,5 +81,17 @@ def get_user_profile(email: str) -> Union[Profile, Error]:
         return Error(status.HTTP_400_BAD_REQUEST, MessageOut(detail=e.args[0]))
     return user_profile
 
+async def aget_user_profile(email: str) -> Union[Profile, Error]:
+    """
+    get_user_profile for the async views, with the async ORM.
+    """
+    user = await User.objects.filter(email=email).select_related('profile_user').afirst()
+    if user is None:
+        return Error(status.HTTP_404_NOT_FOUND, MessageOut(detail="User not found"))
+    try:
+        return user.profile_user
+    except Profile.DoesNotExist:
+        return Error(status.HTTP_404_NOT_FOUND, MessageOut(detail="Profile not found"))
+
 def normalize_email(email: str) -> str:
     return email.strip().lower().replace(" ", "")